@@ -8,8 +8,6 @@ from subset import SubsetOperation
 import os
 import shutil
 
-## TODO: add method to estimate request size
-
 class Interpreter(object):
     '''Superclass for custom interpreter frameworks.
     
@@ -99,7 +97,20 @@ class OcgInterpreter(Interpreter):
             if self.ops.output_format == 'nc':
                 ocgis_lh('"vector_wrap" set to False for netCDF output',
                          interpreter_log,level=logging.WARN)
+                ## vector wrapping does not change the estimate of a computed plan
+                plan = self.ops._plan
                 self.ops.vector_wrap = False
+                self.ops._plan = plan
+    
+            ## check the request size against the memory limit if the caller computed
+            ## a plan. requests are not planned here as planning repeats metadata
+            ## reads and geometry selection.
+            if env.MEMORY_LIMIT is not None and self.ops._plan is not None and self.ops.output_format != 'meta':
+                peak_memory = self.ops._plan.peak_memory
+                limit = env.MEMORY_LIMIT*1024**2
+                if peak_memory > limit:
+                    msg = 'estimated peak memory ({0} bytes) exceeds env.MEMORY_LIMIT ({1} bytes). consider ocgis.util.large_array.compute for calculations.'
+                    ocgis_lh(msg.format(peak_memory,int(limit)),interpreter_log,level=logging.WARN)
     
             ## if the requested output format is "meta" then no operations are run
             ## and only the operations dictionary is required to generate output.
@@ -6,6 +6,7 @@ from ocgis.conv.meta import MetaConverter
 from ocgis.calc.base import AbstractMultivariateFunction,\
     AbstractKeyedOutputFunction
 from ocgis.interface.base.crs import CFRotatedPole, WGS84
+from ocgis.api.plan import OcgPlan
 
 
 class OcgOperations(object):
@@ -109,6 +110,8 @@ class OcgOperations(object):
         
         ## these values are left in to perhaps be added back in at a later date.
         self.output_grouping = None
+        ## the last plan returned by "get_plan"
+        self._plan = None
         
         # # Initial values have been set and global validation should now occur
         # # when any parameters are updated.
@@ -144,6 +147,19 @@ class OcgOperations(object):
                 object.__setattr__(self, name, value)
         if self._is_init is False:
             self._validate_()
+            ## parameter changes invalidate a computed plan
+            if name != '_plan':
+                object.__setattr__(self, '_plan', None)
+    
+    def get_plan(self):
+        """Estimate the cost of executing the operation without loading any
+        variable values. The plan is reused by :meth:`execute` to check
+        :attr:`ocgis.env.MEMORY_LIMIT` unless a parameter is changed.
+        
+        :rtype: :class:`ocgis.api.plan.OcgPlan`
+        """
+        self._plan = OcgPlan(self)
+        return(self._plan)
     
     def get_meta(self):
         meta_converter = MetaConverter(self)
@@ -0,0 +1,208 @@
+from collections import OrderedDict
+import numpy as np
+from ocgis import constants
+from ocgis.exc import EmptySubsetError
+from ocgis.util.helpers import get_contiguous_runs
+from ocgis.calc.base import AbstractMultivariateFunction
+from ocgis.api.subset import get_is_selection_aggregated,\
+ get_aggregated_selection_geometry, get_prepared_selection_geometry
+
+
+class OcgPlan(object):
+    '''
+    An execution plan estimated for an operation. Only source metadata and
+    coordinate variables are read. Variable values are never loaded.
+
+    Each processing unit (a request dataset and selection geometry pair) is
+    described by an ordered dictionary in :attr:`units` with keys:
+
+    ============ ==================================================================
+    Key          Description
+    ============ ==================================================================
+    alias        The request dataset alias.
+    ugid         The selection geometry unique identifier.
+    empty        True if the subset is empty.
+    shape        The five-dimensional shape of the source subset.
+    hyperslabs   Per-axis lists of ``[start,stop]`` source index ranges to read.
+    bytes_in     Bytes read from the source.
+    bytes_out    Estimated bytes of output values.
+    rows         Number of output values (i.e. rows in tabular formats).
+    geometries   Number of cell geometries constructed.
+    memory       Ordered dictionary of estimated peak memory in bytes by stage.
+    ============ ==================================================================
+
+    >>> plan = ops.get_plan()
+    >>> plan.peak_memory
+
+    :param ops: The operations to plan.
+    :type ops: :class:`ocgis.OcgOperations`
+    '''
+
+    def __init__(self,ops):
+        self.ops = ops
+        self.units = self._get_units_()
+
+    def __str__(self):
+        msg = ['{0}('.format(self.__class__.__name__)]
+        for key in ['bytes_in','bytes_out','rows','geometries','peak_memory']:
+            msg.append('  {0}={1},'.format(key,getattr(self,key)))
+        msg.append('  )')
+        return('\n'.join(msg))
+
+    @property
+    def bytes_in(self):
+        return(self._get_sum_('bytes_in'))
+
+    @property
+    def bytes_out(self):
+        return(self._get_sum_('bytes_out'))
+
+    @property
+    def geometries(self):
+        return(self._get_sum_('geometries'))
+
+    @property
+    def peak_memory(self):
+        '''
+        The largest memory estimate for any processing unit. Units are processed
+        independently.
+        '''
+        ret = max([max(unit['memory'].values()) for unit in self.units] or [0])
+        return(ret)
+
+    @property
+    def rows(self):
+        return(self._get_sum_('rows'))
+
+    def _get_sum_(self,key):
+        return(sum([unit[key] for unit in self.units]))
+
+    def _get_geometries_(self):
+        ops = self.ops
+        if ops.slice is not None or ops.geom is None:
+            ret = [{}]
+        ## selection geometries are unioned for netCDF output or if requested
+        elif get_is_selection_aggregated(ops):
+            ret = get_aggregated_selection_geometry(ops.geom)
+        else:
+            ret = ops.geom
+        return(ret)
+
+    def _get_units_(self):
+        ops = self.ops
+
+        if ops.calc is None:
+            noutputs = 1
+        else:
+            if any([issubclass(f['ref'],AbstractMultivariateFunction) for f in ops.calc]):
+                noutputs = len(ops.calc)
+            else:
+                noutputs = len(ops.calc)*len(ops.dataset)
+            if ops.calc_sample_size:
+                noutputs *= 2
+
+        ## cell geometries are constructed for spatial operations, aggregation,
+        ## and vector outputs
+        build_geometries = ops.aggregate or ops.output_format in ('shp','csv+','geojson')
+
+        ret = []
+        for rd in ops.dataset:
+            ## time and level subsets may be empty
+            try:
+                field = rd.get(format_time=ops.format_time)
+            except EmptySubsetError:
+                field = None
+            itemsize = np.dtype(rd._source_metadata['variables'][rd.variable]['dtype']).itemsize
+            for gd in self._get_geometries_():
+                unit = OrderedDict()
+                unit['alias'] = rd.alias
+                properties = gd.get('properties',{})
+                unit['ugid'] = properties.get('UGID',properties.get('ugid',1))
+                try:
+                    sfield = None if field is None else self._get_subset_field_(field,gd)
+                except EmptySubsetError:
+                    sfield = None
+                unit['empty'] = sfield is None
+
+                if sfield is None:
+                    unit['shape'] = (0,0,0,0,0)
+                    unit['hyperslabs'] = OrderedDict()
+                else:
+                    unit['shape'] = sfield.shape
+                    unit['hyperslabs'] = OrderedDict([(k,get_contiguous_runs(v)) for k,v in get_source_indices(sfield).iteritems()])
+                nreal,ntime,nlevel,nrow,ncol = unit['shape']
+                nelements = nreal*ntime*nlevel*nrow*ncol
+                unit['bytes_in'] = nelements*itemsize
+
+                ## number of output values
+                nspatial = 1 if ops.aggregate else nrow*ncol
+                if ops.calc is None:
+                    out_itemsize = itemsize
+                    out_ntime = ntime
+                else:
+                    out_itemsize = np.dtype(constants.np_float).itemsize
+                    if ops.calc_grouping is None or sfield is None:
+                        out_ntime = ntime
+                    else:
+                        out_ntime = len(sfield.temporal.get_grouping(ops.calc_grouping).value)
+                unit['rows'] = nreal*out_ntime*nlevel*nspatial*noutputs
+                unit['bytes_out'] = unit['rows']*out_itemsize
+
+                if sfield is not None and (build_geometries or 'geom' in gd):
+                    unit['geometries'] = nrow*ncol
+                else:
+                    unit['geometries'] = 0
+
+                ## memory estimates are cumulative with values carrying a one
+                ## byte mask
+                memory = OrderedDict()
+                memory['read'] = nelements*(itemsize+1)
+                memory['spatial'] = memory['read'] + unit['geometries']*constants.plan_geometry_bytes
+                if ops.calc is None:
+                    memory['calculation'] = 0
+                else:
+                    memory['calculation'] = memory['spatial'] + unit['rows']*(out_itemsize+1)
+                unit['memory'] = memory
+
+                ret.append(unit)
+        return(ret)
+
+    def _get_subset_field_(self,field,gd):
+        ops = self.ops
+        if ops.snippet:
+            field = field[0,0,0,:,:]
+        elif ops.slice is not None:
+            field = field.__getitem__(ops.slice)
+        geom = gd.get('geom')
+        if geom is not None:
+            ## the selection geometry is prepared as it is for the subset operation
+            geom,_ = get_prepared_selection_geometry(geom,gd.get('crs'),field,ops.search_radius_mult)
+            ## only the bounding box subset is used. this is the data read from
+            ## source.
+            minx,miny,maxx,maxy = geom.bounds
+            _,slc = field.spatial.grid.get_subset_bbox(minx,miny,maxx,maxy,return_indices=True)
+            field = field[:,:,:,slc[0],slc[1]]
+        return(field)
+
+
+def get_source_indices(field):
+    '''
+    :param field: The target field.
+    :type field: :class:`ocgis.interface.nc.field.NcField`
+    :returns: An ordered dictionary mapping axis names to source index arrays.
+    :rtype: OrderedDict
+    '''
+    ret = OrderedDict()
+    if field.realization is not None:
+        ret['R'] = field.realization._src_idx
+    ret['T'] = field.temporal._src_idx
+    if field.level is not None:
+        ret['Z'] = field.level._src_idx
+    try:
+        ret['Y'] = field.spatial.grid.row._src_idx
+        ret['X'] = field.spatial.grid.col._src_idx
+    except AttributeError:
+        ret['Y'] = field.spatial.grid._row_src_idx
+        ret['X'] = field.spatial.grid._col_src_idx
+    return(ret)
+
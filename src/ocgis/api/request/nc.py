@@ -3,6 +3,8 @@ from ocgis.exc import DefinitionValidationError, ProjectionDoesNotMatch,\
 from copy import deepcopy, copy
 import inspect
 import os
+import hashlib
+from collections import OrderedDict
 from ocgis import env, constants
 from ocgis.util.helpers import locate, validate_time_subset, itersubclasses,\
     assert_raise
@@ -21,6 +23,16 @@ from ocgis.interface.nc.dimension import NcVectorDimension
 from ocgis.interface.nc.field import NcField
 from ocgis.interface.base.variable import Variable, VariableCollection
 from ocgis.util.inspect import Inspect
+from ocgis.interface.nc.pool import nc_pool
+from ocgis.util.cache import OcgCache, get_file_signature
+
+
+## parsed source metadata and dimension maps
+_metadata_cache = OcgCache('nc_metadata')
+## geographic coordinates of rotated pole grids. the in-process cache is used
+## whether or not a cache directory is set.
+_rotated_pole_cache = OcgCache('rotated_pole')
+_rotated_pole_memory = OrderedDict()
 
 
 class NcRequestDataset(object):
@@ -61,14 +73,13 @@ class NcRequestDataset(object):
         self.__source_metadata = None
         
     def _open_(self):
-        try:
-            ret = nc.Dataset(self.uri,'r')
-        except TypeError:
-            ret = nc.MFDataset(self.uri)
-        return(ret)
+        ## the returned dataset is returned to the pool when closed
+        return(nc_pool.open(self.uri))
             
     @property
     def _source_metadata(self):
+        if self.__source_metadata is None and self.dimension_map is None:
+            self.__source_metadata = self._get_cached_source_metadata_()
         if self.__source_metadata is None:
             ds = self._open_()
             try:
@@ -76,6 +87,7 @@ class NcRequestDataset(object):
                 var = ds.variables[self.variable]
                 if self.dimension_map is None:
                     self.__source_metadata['dim_map'] = get_dimension_map(ds,var,self._source_metadata)
+                    self._set_cached_source_metadata_()
                 else:
                     for k,v in self.dimension_map.iteritems():
                         try:
@@ -90,6 +102,29 @@ class NcRequestDataset(object):
                 ds.close()
         return(self.__source_metadata)
         
+    def _get_cached_source_metadata_(self):
+        ## metadata is shared by all variables in a file. the dimension map is
+        ## specific to the variable.
+        signature = get_file_signature(self.uri)
+        if signature is None:
+            return(None)
+        ret = _metadata_cache.get(('metadata',signature))
+        if ret is not None:
+            dim_map = _metadata_cache.get(('dim_map',signature,self.variable))
+            if dim_map is None:
+                ret = None
+            else:
+                ret['dim_map'] = dim_map
+        return(ret)
+
+    def _set_cached_source_metadata_(self):
+        signature = get_file_signature(self.uri)
+        if signature is not None:
+            metadata = self.__source_metadata.copy()
+            dim_map = metadata.pop('dim_map')
+            _metadata_cache.set(('metadata',signature),metadata)
+            _metadata_cache.set(('dim_map',signature,self.variable),dim_map)
+
     def get(self,format_time=True):
         
         def _get_temporal_adds_(ref_attrs):
@@ -392,59 +427,47 @@ class NcRequestDataset(object):
     
 
 def get_rotated_pole_spatial_grid_dimension(crs,grid):
-        import csv
-        import itertools
-        import subprocess
-        import tempfile
-        class ProjDialect(csv.excel):
-            lineterminator = '\n'
-            delimiter = '\t'
-        f = tempfile.NamedTemporaryFile()
-        writer = csv.writer(f,dialect=ProjDialect)
-        _row = grid.row.value
-        _col = grid.col.value
-        shp = (_row.shape[0],_col.shape[0])
-        uid = np.arange(1,(shp[0]*shp[1])+1,dtype=int).reshape(*shp)
-        uid = np.ma.array(data=uid,mask=False)
-        for row_idx,col_idx in itertools.product(range(_row.shape[0]),range(_col.shape[0])):
-            writer.writerow([_col[col_idx],_row[row_idx]])
-        f.flush()
-        cmd = crs._trans_proj.split(' ')
-        cmd.append(f.name)
-        cmd = ['proj','-f','"%.6f"','-m','57.2957795130823'] + cmd
-        capture = subprocess.check_output(cmd)
-        f.close()
-        coords = capture.split('\n')
-        new_coords = []
-        for ii,coord in enumerate(coords):
-            coord = coord.replace('"','')
-            coord = coord.split('\t')
-            try:
-                coord = map(float,coord)
-            ## likely empty string
-            except ValueError:
-                if coord[0] == '':
-                    continue
-                else:
-                    raise
-            new_coords.append(coord)
+    '''
+    :param crs: The rotated pole coordinate system of ``grid``.
+    :type crs: :class:`~ocgis.interface.base.crs.CFRotatedPole`
+    :param grid: The grid with rotated pole row and column dimensions.
+    :type grid: :class:`~ocgis.interface.base.dimension.spatial.SpatialGridDimension`
+    :returns: A grid with two-dimensional geographic coordinates. Coordinates are
+     cached by the rotated coordinates and pole location.
+    :rtype: :class:`~ocgis.interface.base.dimension.spatial.SpatialGridDimension`
+    '''
+    _row = grid.row.value
+    _col = grid.col.value
+    
+    fingerprint = hashlib.sha1()
+    for arr in [_row,_col]:
+        arr = np.ascontiguousarray(arr)
+        fingerprint.update('{0}{1}'.format(arr.dtype,arr.shape))
+        fingerprint.update(arr.tostring())
+    key = (fingerprint.hexdigest(),crs.map_parameters_values['grid_north_pole_longitude'],
+           crs.map_parameters_values['grid_north_pole_latitude'])
+    try:
+        new_value = _rotated_pole_memory.pop(key)
+    except KeyError:
+        new_value = _rotated_pole_cache.get(key)
+    if new_value is None:
+        rlon,rlat = np.meshgrid(_col,_row)
+        new_col,new_row = crs.get_geographic_coordinates(rlon,rlat)
+        new_value = np.ma.array(np.array([new_row,new_col]),mask=False)
+        _rotated_pole_cache.set(key,new_value)
+    _rotated_pole_memory[key] = new_value
+    while len(_rotated_pole_memory) > constants.rotated_pole_cache_size:
+        _rotated_pole_memory.popitem(last=False)
+    
+    new_grid = copy(grid)
+    new_grid._row_src_idx = new_grid.row._src_idx
+    new_grid._col_src_idx = new_grid.col._src_idx
+    new_grid.row = None
+    new_grid.col = None
+    ## grid values are modified in place by masking and projection
+    new_grid._value = new_value.copy()
             
-        new_coords = np.array(new_coords)
-        new_row = new_coords[:,1].reshape(*shp)
-        new_col = new_coords[:,0].reshape(*shp)
-        
-        new_grid = copy(grid)
-        new_grid._row_src_idx = new_grid.row._src_idx
-        new_grid._col_src_idx = new_grid.col._src_idx
-        new_grid.row = None
-        new_grid.col = None
-        new_value = np.zeros([2]+list(new_row.shape))
-        new_value = np.ma.array(new_value,mask=False)
-        new_value[0,:,:] = new_row
-        new_value[1,:,:] = new_col
-        new_grid._value = new_value
-                
-        return(new_grid)
+    return(new_grid)
     
 def get_axis(dimvar,dims,dim):
     try:
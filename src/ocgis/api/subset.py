@@ -12,6 +12,7 @@ from ocgis.calc.base import AbstractMultivariateFunction,\
     AbstractKeyedOutputFunction
 from ocgis.util.helpers import project_shapely_geometry
 from shapely.geometry.multipoint import MultiPoint
+from multiprocessing import Pool
 
 
 class SubsetOperation(object):
@@ -21,7 +22,11 @@ class SubsetOperation(object):
         self.serial = serial
         self.nprocs = nprocs
         
-        self._subset_log = ocgis_lh.get_logger('subset')
+        self._subset_log = ocgis_lh.get_logger('subset')
+
+        ## calculations may stream values from source if there is a memory limit.
+        ## the masked value check is then performed following the calculation.
+        self._defer_masked_check = self.ops.calc is not None and env.MEMORY_LIMIT is not None
 
         ## create the calculation engine
         if self.ops.calc is None:
@@ -37,20 +42,12 @@ class SubsetOperation(object):
         ## in the case of netcdf output, geometries must be unioned. this is
         ## also true for the case of the selection geometry being requested as
         ## aggregated.
-        if (self.ops.output_format == 'nc' or self.ops.agg_selection is True) \
-         and self.ops.geom is not None:
+        if get_is_selection_aggregated(self.ops):
             ocgis_lh('aggregating selection geometry',self._subset_log)
-            build = True
-            for element_geom in self.ops.geom:
-                if build:
-                    new_geom = element_geom['geom']
-                    new_crs = element_geom['crs']
-                    new_properties = {'UGID':1}
-                    build = False
-                else:
-                    new_geom = new_geom.union(element_geom['geom'])
-            itr = [{'geom':new_geom,'properties':new_properties,'crs':new_crs}]
-            self.ops.geom = itr
+            ## a computed plan already accounts for the unioned selection geometry
+            plan = self.ops._plan
+            self.ops.geom = get_aggregated_selection_geometry(self.ops.geom)
+            self.ops._plan = plan
         
     def __iter__(self):
         ''':rtype: AbstractCollection'''
@@ -61,12 +58,97 @@ class SubsetOperation(object):
         if self.serial:
             for coll in self._iter_collections_():
                 yield(coll)
-        ## use a multiprocessing pool returning unordered geometries
-        ## for the parallel case
+        ## use a multiprocessing pool for the parallel case. collections are
+        ## returned in the same order as the serial iterator.
         else:
-            raise(ocgis_lh(exc=NotImplementedError('multiprocessing is not available')))
+            for coll in self._iter_collections_parallel_():
+                yield(coll)
+                
+    def _check_masked_(self,sfield,alias,ugid):
+        if env.OPTIMIZE_FOR_CALC is False and self.ops.file_only is False:
+            for variable in sfield.variables.itervalues():
+                if variable.value.mask.all():
+                    ## masked data may be okay depending on other opeartional
+                    ## conditions.
+                    if self.ops.snippet or self.ops.allow_empty or (self.ops.output_format == 'numpy' and self.ops.allow_empty):
+                        if self.ops.snippet:
+                            ocgis_lh('all masked data encountered but allowed for snippet',
+                                     self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
+                        if self.ops.allow_empty:
+                            ocgis_lh('all masked data encountered but empty returns allowed',
+                                     self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
+                        if self.ops.output_format == 'numpy':
+                            ocgis_lh('all masked data encountered but numpy data being returned allowed',
+                                     logger=self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
+                    else:
+                        ## if the geometry is also masked, it is an empty spatial
+                        ## operation.
+                        if sfield.spatial.abstraction_geometry.mask.all():
+                            ocgis_lh(exc=EmptyData,logger=self._subset_log)
+                        ## if none of the other conditions are met, raise the masked data error
+                        else:
+                            ocgis_lh(logger=self._subset_log,exc=MaskedDataError(),alias=alias,ugid=ugid)
 
-    def _process_geometries_(self,rds):
+    def _get_geometry_iterator_(self):
+        '''
+        :returns: The sequence of selection geometry dictionaries to process.
+        :rtype: list
+        '''
+        ## slice always overrides geometry.
+        if self.ops.slice is not None:
+            ret = [{}]
+        else:
+            ret = [{}] if self.ops.geom is None else self.ops.geom
+        return(ret)
+    
+    def _get_request_dataset_groups_(self):
+        '''
+        :returns: A list of request dataset lists. Multivariate calculations
+         require all request datasets to be processed together.
+        :rtype: list
+        '''
+        if self.cengine is not None and self.cengine._check_calculation_members_(self.cengine.funcs,AbstractMultivariateFunction):
+            ret = [[r for r in self.ops.dataset]]
+        else:
+            ret = [[rd] for rd in self.ops.dataset]
+        return(ret)
+    
+    def _get_work_units_(self):
+        '''
+        :returns: A list of tuples with the first element the index of the request
+         dataset group and the second element the selection geometry dictionary.
+        :rtype: list
+        '''
+        ## the geometry iterator may be a generator (i.e. a shapefile iterator)
+        geoms = list(self._get_geometry_iterator_())
+        ret = []
+        for idx_rds in range(len(self._get_request_dataset_groups_())):
+            for gd in geoms:
+                ret.append((idx_rds,gd))
+        return(ret)
+    
+    def _iter_collections_parallel_(self):
+        units = self._get_work_units_()
+        nprocs = max(min(self.nprocs,len(units)),1)
+        ## keep several units per process in flight to balance uneven geometries
+        chunksize = max(len(units)/(nprocs*4),1)
+        ocgis_lh('processing {0} work unit(s) with {1} process(es)'.format(len(units),nprocs),
+                 self._subset_log)
+        
+        pool = Pool(processes=nprocs,initializer=_init_subset_worker_,initargs=(self,))
+        try:
+            for colls in pool.imap(_execute_subset_work_unit_,units,chunksize=chunksize):
+                for coll in colls:
+                    yield(coll)
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def _process_geometries_(self,rds,itr=None):
         ocgis_lh(msg='entering _process_geometries_',logger=self._subset_log,level=logging.DEBUG)
         
         ## select headers
@@ -121,10 +203,8 @@ class SubsetOperation(object):
                 ocgis_lh(exc=ExtentError(message=str(e)),alias=rd.alias,logger=self._subset_log)
                 
         ## set iterator based on presence of slice. slice always overrides geometry.
-        if self.ops.slice is not None:
-            itr = [{}]
-        else:
-            itr = [{}] if self.ops.geom is None else self.ops.geom
+        if itr is None:
+            itr = self._get_geometry_iterator_()
                 
         ## loop over the iterator
         for gd in itr:
@@ -145,7 +225,7 @@ class SubsetOperation(object):
             crs = gd.get('crs')
             
             if 'properties' in gd and 'UGID' in gd['properties']:
-                ugid = gd['properties']['UGID']
+                ugid = gd['properties']['UGID']
             else:
                 ## try to get lowercase ugid in case the shapefile is not perfectly
                 ## formed. however, if there is no geometry accept the error and
@@ -174,26 +254,23 @@ class SubsetOperation(object):
             elif self.ops.slice is not None:
                 field = field.__getitem__(self.ops.slice)
                 
-            ## see if the selection crs matches the field's crs
-            if crs is not None and crs != field.spatial.crs:
-                geom = project_shapely_geometry(geom,crs.sr,field.spatial.crs.sr)
-                crs = field.spatial.crs
-            ## if the geometry is a point, we need to buffer it...
-            if type(geom) in [Point,MultiPoint]:
-                ocgis_lh(logger=self._subset_log,msg='buffering point geometry',level=logging.DEBUG)
-                geom = geom.buffer(self.ops.search_radius_mult*field.spatial.grid.resolution)
-            ## unwrap the data if it is geographic and 360
-            if geom is not None and crs == CFWGS84():
-                if CFWGS84.get_is_360(field.spatial):
-                    ocgis_lh('unwrapping selection geometry',self._subset_log,alias=alias,ugid=ugid)
-                    geom = Wrapper().unwrap(geom)
+            ## project, buffer, and unwrap the selection geometry to match the field
+            geom,crs = get_prepared_selection_geometry(geom,crs,field,self.ops.search_radius_mult,
+                                                       alias=alias,ugid=ugid)
             ## perform the spatial operation
+            sfield_aggregated = False
             if geom is not None:
                 try:
                     if self.ops.spatial_operation == 'intersects':
                         sfield = field.get_intersects(geom)
                     elif self.ops.spatial_operation == 'clip':
-                        sfield = field.get_clip(geom)
+                        ## clip and aggregate together to use cached overlap weights.
+                        ## raw values carry the clip mask and overlap weights.
+                        if self.ops.aggregate:
+                            sfield = field.get_clip_aggregated(geom,new_spatial_uid=ugid)
+                            sfield_aggregated = True
+                        else:
+                            sfield = field.get_clip(geom)
                     else:
                         ocgis_lh(exc=NotImplementedError(self.ops.spatial_operation))
                 except EmptySubsetError as e:
@@ -208,7 +285,7 @@ class SubsetOperation(object):
             ## if empty returns are allowed, there be an empty field
             if sfield is not None:
                 ## aggregate if requested
-                if self.ops.aggregate:
+                if self.ops.aggregate and not sfield_aggregated:
                     sfield = sfield.get_spatially_aggregated(new_spatial_uid=ugid)
                 
                 ## wrap the returned data.
@@ -218,30 +295,11 @@ class SubsetOperation(object):
                             ocgis_lh('wrapping output geometries',self._subset_log,alias=alias,ugid=ugid)
                             sfield.spatial.crs.wrap(sfield.spatial)
                             
-                ## check for all masked values
-                if env.OPTIMIZE_FOR_CALC is False and self.ops.file_only is False:
-                    for variable in sfield.variables.itervalues():
-                        if variable.value.mask.all():
-                            ## masked data may be okay depending on other opeartional
-                            ## conditions.
-                            if self.ops.snippet or self.ops.allow_empty or (self.ops.output_format == 'numpy' and self.ops.allow_empty):
-                                if self.ops.snippet:
-                                    ocgis_lh('all masked data encountered but allowed for snippet',
-                                             self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
-                                if self.ops.allow_empty:
-                                    ocgis_lh('all masked data encountered but empty returns allowed',
-                                             self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
-                                if self.ops.output_format == 'numpy':
-                                    ocgis_lh('all masked data encountered but numpy data being returned allowed',
-                                             logger=self._subset_log,alias=alias,ugid=ugid,level=logging.WARN)
-                            else:
-                                ## if the geometry is also masked, it is an empty spatial
-                                ## operation.
-                                if sfield.spatial.abstraction_geometry.value.mask.all():
-                                    ocgis_lh(exc=EmptyData,logger=self._subset_log)
-                                ## if none of the other conditions are met, raise the masked data error
-                                else:
-                                    ocgis_lh(logger=self._subset_log,exc=MaskedDataError(),alias=alias,ugid=ugid)
+                ## check for all masked values. if values may be streamed by the
+                ## calculation engine, the check is performed on the calculated
+                ## values to avoid loading the complete time series.
+                if not self._defer_masked_check:
+                    self._check_masked_(sfield,alias,ugid)
             
             ## update the coordinate system of the data output
             if self.ops.output_crs is not None:
@@ -262,20 +320,24 @@ class SubsetOperation(object):
             
             yield(coll)
     
-    def _iter_collections_(self):
+    def _iter_collections_(self,units=None):
+        '''
+        :param units: Optional sequence of work unit tuples as returned by
+         :meth:`~ocgis.api.subset.SubsetOperation._get_work_units_`. If None, all
+         request datasets and selection geometries are processed.
+        :type units: sequence
+        '''
         
         ocgis_lh('{0} request dataset(s) to process'.format(len(self.ops.dataset)),'conv._iter_collections_')
         
-        if self.cengine is None:
-            itr_rd = ([rd] for rd in self.ops.dataset)
+        rds_groups = self._get_request_dataset_groups_()
+        if units is None:
+            itr_rd = ((rds,None) for rds in rds_groups)
         else:
-            if self.cengine._check_calculation_members_(self.cengine.funcs,AbstractMultivariateFunction):
-                itr_rd = [[r for r in self.ops.dataset]]
-            else:
-                itr_rd = ([rd] for rd in self.ops.dataset)
+            itr_rd = ((rds_groups[idx_rds],[gd]) for idx_rds,gd in units)
         
-        for rds in itr_rd:
-            for coll in self._process_geometries_(rds):
+        for rds,itr_geom in itr_rd:
+            for coll in self._process_geometries_(rds,itr=itr_geom):
                 ## if there are calculations, do those now and return a new type of collection
                 if self.cengine is not None:
                     ocgis_lh('performing computations',
@@ -283,6 +345,11 @@ class SubsetOperation(object):
                              alias=coll.items()[0][1].keys()[0],
                              ugid=coll.keys()[0])
                     coll = self.cengine.execute(coll)
+                    if self._defer_masked_check:
+                        for ugid,field_dict in coll.iteritems():
+                            for alias,field in field_dict.iteritems():
+                                if field is not None:
+                                    self._check_masked_(field,alias,ugid)
                 
                 ## conversion of groups.
                 if self.ops.output_grouping is not None:
@@ -290,3 +357,98 @@ class SubsetOperation(object):
                 else:
                     ocgis_lh('subset yielding',self._subset_log,level=logging.DEBUG)
                     yield(coll)
+
+
+def get_is_selection_aggregated(ops):
+    '''
+    :param ops: The operations.
+    :type ops: :class:`ocgis.OcgOperations`
+    :returns: True if the selection geometries are unioned before subsetting. This
+     is required for netCDF output or if the selection geometry is requested as
+     aggregated.
+    :rtype: bool
+    '''
+    ret = (ops.output_format == 'nc' or ops.agg_selection is True) and ops.geom is not None
+    return(ret)
+
+
+def get_aggregated_selection_geometry(geoms):
+    '''
+    :param geoms: Sequence of selection geometry dictionaries.
+    :type geoms: sequence
+    :returns: A list containing a single selection geometry dictionary with the
+     union of the geometries.
+    :rtype: list
+    '''
+    build = True
+    for element_geom in geoms:
+        if build:
+            new_geom = element_geom['geom']
+            new_crs = element_geom['crs']
+            new_properties = {'UGID':1}
+            build = False
+        else:
+            new_geom = new_geom.union(element_geom['geom'])
+    ret = [{'geom':new_geom,'properties':new_properties,'crs':new_crs}]
+    return(ret)
+
+
+def get_prepared_selection_geometry(geom,crs,field,search_radius_mult,alias=None,ugid=None):
+    '''
+    Prepare a selection geometry for a spatial operation on a field. The geometry
+    is projected to the field's coordinate system, point geometries are buffered,
+    and the geometry is unwrapped for 360 geographic fields.
+    
+    :param geom: The selection geometry or None.
+    :type geom: :class:`shapely.geometry.base.BaseGeometry`
+    :param crs: The coordinate system of the selection geometry or None.
+    :type crs: :class:`ocgis.interface.base.crs.CoordinateReferenceSystem`
+    :param field: The target field.
+    :type field: :class:`ocgis.interface.base.field.Field`
+    :param float search_radius_mult: Multiplied by the grid resolution to buffer
+     point geometries.
+    :returns: A tuple of the prepared geometry and its coordinate system.
+    :rtype: tuple
+    '''
+    ## see if the selection crs matches the field's crs
+    if crs is not None and crs != field.spatial.crs:
+        geom = project_shapely_geometry(geom,crs.sr,field.spatial.crs.sr)
+        crs = field.spatial.crs
+    ## if the geometry is a point, we need to buffer it...
+    if type(geom) in [Point,MultiPoint]:
+        ocgis_lh(logger='subset',msg='buffering point geometry',level=logging.DEBUG)
+        geom = geom.buffer(search_radius_mult*field.spatial.grid.resolution)
+    ## unwrap the data if it is geographic and 360
+    if geom is not None and crs == CFWGS84():
+        if CFWGS84.get_is_360(field.spatial):
+            ocgis_lh('unwrapping selection geometry','subset',alias=alias,ugid=ugid)
+            geom = Wrapper().unwrap(geom)
+    return(geom,crs)
+
+
+## the subset operation used by worker processes. it is set by the pool initializer
+## and inherited through the fork.
+_WORKER_SUBSET = None
+
+
+def _init_subset_worker_(subset):
+    global _WORKER_SUBSET
+    _WORKER_SUBSET = subset
+    
+    
+def _execute_subset_work_unit_(unit):
+    '''
+    :param unit: Tuple of request dataset group index and selection geometry dictionary.
+    :type unit: tuple
+    :returns: A list of collections with values loaded so they may be returned
+     to the parent process without access to the source data.
+    :rtype: list
+    '''
+    ret = list(_WORKER_SUBSET._iter_collections_(units=[unit]))
+    for coll in ret:
+        for fields in coll.itervalues():
+            for field in fields.itervalues():
+                if field is not None:
+                    for variable in field.variables.itervalues():
+                        variable.value
+    return(ret)
@@ -4,7 +4,7 @@ import itertools
 from ocgis.interface.base.variable import DerivedVariable, VariableCollection
 from ocgis.util.helpers import get_default_or_apply
 from ocgis.util.logging_ocgis import ocgis_lh
-from ocgis import constants
+from ocgis import constants, env
 import logging
 from ocgis.exc import SampleSizeNotImplemented, DefinitionValidationError
 
@@ -197,11 +197,15 @@ class AbstractFunction(object):
         
         for ir,it,il in itertools.product(*(range(s) for s in fill.shape[0:3])):
             
-            ## reference for the current iteration group used by some computations
-            self._curr_group = self.tgd.dgroups[it]
+            ## reference for the current iteration group used by some computations.
+            ## contiguous groups are a slice so values are a view.
+            self._curr_group = self.tgd.dgroups.get_selection(it)
             
             ## subset the values by the current temporal group
-            values = value[ir,self._curr_group,il,:,:]
+            if isinstance(value,TemporalBlockValue):
+                values = value.get_group(ir,it,il)
+            else:
+                values = value[ir,self._curr_group,il,:,:]
             ## only 3-d data should be sent to the temporal aggregation method
             assert(len(values.shape) == 3)
             ## execute the temporal aggregation or calculation
@@ -320,6 +324,9 @@ class AbstractUnivariateSetFunction(AbstractUnivariateFunction):
     intput data along the time dimension.
     '''
     __metaclass__ = abc.ABCMeta
+    #: If False, the calculation requires the complete time series and values
+    #: are never read from source by blocks of temporal groups.
+    stream_values = True
     
     def aggregate_temporal(self):
         '''
@@ -335,10 +342,35 @@ class AbstractUnivariateSetFunction(AbstractUnivariateFunction):
             ## some calculations need information from the current variable iteration
             self._curr_variable = variable
             
-            value = self.get_variable_value(variable)
+            value = self._get_streamed_value_(variable)
+            if value is None:
+                value = self.get_variable_value(variable)
             fill = self._get_temporal_agg_fill_(value,shp_fill=shp_fill)
             self._add_to_collection_(value=fill,parent_variables=[variable])
             
+    def _get_streamed_value_(self,variable):
+        '''
+        :returns: A :class:`~ocgis.calc.base.TemporalBlockValue` if the variable's
+         values have not been loaded and do not fit within :attr:`ocgis.env.MEMORY_LIMIT`.
+         Otherwise, return None.
+        '''
+        if not self.stream_values or self.use_raw_values or env.MEMORY_LIMIT is None \
+         or variable._value is not None:
+            return(None)
+        
+        nreal,ntime,nlevel,nrow,ncol = self.field.shape
+        itemsize = np.dtype(self.field.meta['variables'][variable.name]['dtype']).itemsize
+        ## values carry a one byte mask
+        step_bytes = nreal*nlevel*nrow*ncol*(itemsize+1)*constants.large_array_working_set_factor
+        block_size = int((env.MEMORY_LIMIT*1024**2)/step_bytes)
+        if block_size >= ntime:
+            ret = None
+        else:
+            ocgis_lh('streaming values in blocks of {0} time step(s)'.format(block_size),
+                     logger='calc.base',level=logging.DEBUG)
+            ret = TemporalBlockValue(self.field,variable,self.tgd.dgroups,block_size)
+        return(ret)
+            
     @classmethod
     def validate(cls,ops):
         if ops.calc_grouping is None:
@@ -420,3 +452,65 @@ class AbstractKeyedOutputFunction(object):
     
     @abc.abstractproperty
     def structure_dtype(self): dict
+
+
+class TemporalBlockValue(object):
+    '''
+    Reads a variable's values from source in blocks composed of whole temporal
+    groups. Only one block is held in memory at a time.
+    
+    :param field: The field containing the variable.
+    :type field: :class:`ocgis.interface.base.field.Field`
+    :param variable: The variable with values not yet loaded.
+    :type variable: :class:`ocgis.interface.base.variable.Variable`
+    :param dgroups: The time indices of each temporal group.
+    :type dgroups: :class:`~ocgis.interface.base.dimension.temporal.TemporalGroupIndex`
+    :param int block_size: The target number of time steps per block. A block
+     always contains at least one group.
+    '''
+    
+    def __init__(self,field,variable,dgroups,block_size):
+        self.field = field
+        self.alias = variable.alias
+        self.dtype = np.dtype(field.meta['variables'][variable.name]['dtype'])
+        
+        ## assign groups to blocks in group order
+        blocks = [[]]
+        count = 0
+        for idx_group in range(len(dgroups)):
+            indices = dgroups.get_indices(idx_group)
+            if count > 0 and count + indices.shape[0] > block_size:
+                blocks.append([])
+                count = 0
+            blocks[-1].append(indices)
+            count += indices.shape[0]
+        
+        ## the time indices of each block and the block and block positions of
+        ## each group
+        self._blocks = []
+        self._groups = []
+        for idx_block,block in enumerate(blocks):
+            block_indices = np.unique(np.concatenate(block))
+            self._blocks.append(block_indices)
+            for indices in block:
+                self._groups.append((idx_block,np.searchsorted(block_indices,indices)))
+        
+        self._curr_block = None
+        self._curr_value = None
+        
+    def get_group(self,ir,it,il):
+        '''
+        :param int ir: The realization index.
+        :param int it: The temporal group index.
+        :param int il: The level index.
+        :returns: A three-dimensional array with dimensions (time,row,column).
+        :rtype: :class:`numpy.ma.MaskedArray`
+        '''
+        idx_block,positions = self._groups[it]
+        if idx_block != self._curr_block:
+            ## release the previous block before reading the next
+            self._curr_value = None
+            sub = self.field[:,self._blocks[idx_block],:,:,:]
+            self._curr_value = sub.variables[self.alias].value
+            self._curr_block = idx_block
+        return(self._curr_value[ir,positions,il,:,:])
@@ -9,6 +9,8 @@ class DynamicDailyKernelPercentileThreshold(AbstractUnivariateSetFunction,Abstra
     parms_definition = {'operation':str,'percentile':float,'daily_percentile':None,'width':int}
     dtype = np.int32
     description = 'Implementation of moving window percentile threshold calculations similar to ECA indices: http://eca.knmi.nl/documents/atbd.pdf'
+    ## the daily percentiles are computed from the entire time series
+    stream_values = False
     
     def __init__(self,*args,**kwds):
         self._daily_percentile = {}
@@ -42,6 +42,41 @@ np_int = np.int32
 #: The data type to use for NumPy floats.
 np_float = np.float32
 
+#: Multiplier applied to the size of the source data type to estimate the memory
+#: used per element by a tiled computation. One is added for each calculation.
+large_array_working_set_factor = 3
+
+#: Approximate memory in bytes of a single cell geometry. Used to estimate memory
+#: when planning an operation.
+plan_geometry_bytes = 1024
+
+#: Maximum number of hyperslab reads used to load values for non-contiguous source
+#: indices. Above this, index arrays are passed to the source variable.
+hyperslab_max_reads = 256
+
+#: Maximum number of children for each node of a spatial index.
+spatial_index_capacity = 16
+
+#: Maximum number of value elements reduced at once by spatial aggregation.
+aggregation_chunk_size = 2**24
+
+#: Name of the cache database file in :attr:`ocgis.env.DIR_CACHE`.
+cache_filename = 'ocgis_cache.sqlite'
+#: Maximum bytes of pickled cache values held in memory.
+cache_memory_size = 64*1024**2
+#: Seconds to wait for a cache database lock held by another process.
+cache_timeout = 30
+#: Number of per-file time indices held in memory by aggregated netCDF datasets.
+nc_time_index_cache_size = 1024
+#: Number of decoded time arrays held in memory by netCDF temporal dimensions.
+time_decode_cache_size = 32
+#: Number of clip overlap weight entries held in memory for clip and aggregate operations.
+clip_weights_cache_size = 256
+#: Number of coordinate transformations held in memory by the coordinate system registry.
+crs_transformation_cache_size = 64
+#: Number of rotated pole grids held in memory with their geographic coordinates.
+rotated_pole_cache_size = 32
+
 
 test_run_long_tests = True
 test_run_dev_tests = False
\ No newline at end of file
@@ -1,4 +1,4 @@
-from osgeo.osr import SpatialReference
+from osgeo.osr import SpatialReference, CoordinateTransformation
 from fiona.crs import from_string, to_string
 import numpy as np
 from ocgis.util.logging_ocgis import ocgis_lh
@@ -10,6 +10,89 @@ from shapely.geometry.multipolygon import MultiPolygon
 import abc
 import logging
 from shapely.geometry.multipoint import MultiPoint
+from shapely.affinity import translate
+from copy import copy
+import itertools
+from collections import OrderedDict
+from ocgis import constants
+
+
+class CoordinateReferenceSystemRegistry(object):
+    '''
+    Interns equivalent coordinate systems and caches their spatial references and
+    coordinate transformations. Coordinate systems are identified by PROJ.4 strings.
+    The first string registered for a set of equivalent coordinate systems (as
+    determined by :meth:`osgeo.osr.SpatialReference.IsSame`) is their key.
+    
+    Cached objects are shared and must not be modified.
+    
+    >>> registry = CoordinateReferenceSystemRegistry()
+    >>> sr = registry.get_sr('+proj=longlat +datum=WGS84 +no_defs')
+    '''
+    
+    def __init__(self):
+        self.clear()
+        
+    def clear(self):
+        self._keys = {}
+        self._srs = {}
+        self._transformations = OrderedDict()
+        
+    def get_key(self,proj4):
+        '''
+        :param str proj4: A PROJ.4 string.
+        :returns: The PROJ.4 string of the first registered equivalent coordinate system.
+        :rtype: str
+        '''
+        try:
+            ret = self._keys[proj4]
+        except KeyError:
+            sr = SpatialReference()
+            sr.ImportFromProj4(proj4)
+            ret = proj4
+            for key,other in self._srs.iteritems():
+                if sr.IsSame(other) == 1:
+                    ret = key
+                    break
+            else:
+                self._srs[proj4] = sr
+            self._keys[proj4] = ret
+        return(ret)
+    
+    def get_is_same(self,proj4,other):
+        return(self.get_key(proj4) == self.get_key(other))
+    
+    def get_sr(self,proj4):
+        '''
+        :param str proj4: A PROJ.4 string.
+        :rtype: :class:`osgeo.osr.SpatialReference`
+        '''
+        return(self._srs[self.get_key(proj4)])
+    
+    def get_transformation(self,from_sr,to_sr):
+        '''
+        :param from_sr: The source spatial reference.
+        :type from_sr: :class:`osgeo.osr.SpatialReference`
+        :param to_sr: The destination spatial reference.
+        :type to_sr: :class:`osgeo.osr.SpatialReference`
+        :rtype: :class:`osgeo.osr.CoordinateTransformation`
+        '''
+        ## transformations are keyed by spatial reference identity. references of
+        ## coordinate systems are interned so equivalent systems share an entry.
+        ## entries hold their references so identities are not reused while cached.
+        key = (id(from_sr),id(to_sr))
+        try:
+            entry = self._transformations.pop(key)
+        except KeyError:
+            entry = (from_sr,to_sr,CoordinateTransformation(from_sr,to_sr))
+        self._transformations[key] = entry
+        while len(self._transformations) > constants.crs_transformation_cache_size:
+            self._transformations.popitem(last=False)
+        return(entry[2])
+    
+    
+## the process-wide registry
+crs_registry = CoordinateReferenceSystemRegistry()
 
 
 class CoordinateReferenceSystem(object):
@@ -45,20 +128,29 @@ class CoordinateReferenceSystem(object):
             ocgis_lh(logger='crs',exc=ValueError('Empty CRS: The conversion to PROJ4 may have failed. The CRS value is: {0}'.format(crs)))
     
     def __eq__(self,other):
-        if self.sr.IsSame(other.sr) == 1:
-            ret = True
-        else:
+        try:
+            ret = self.key == other.key
+        except AttributeError:
             ret = False
         return(ret)
     
     def __ne__(self,other):
         return(not self.__eq__(other))
     
+    def __hash__(self):
+        return(hash(self.key))
+    
+    @property
+    def key(self):
+        '''
+        The registry key shared by equivalent coordinate systems. See
+        :class:`~ocgis.interface.base.crs.CoordinateReferenceSystemRegistry`.
+        '''
+        return(crs_registry.get_key(to_string(self.value)))
+    
     @property
     def sr(self):
-        sr = SpatialReference()
-        sr.ImportFromProj4(to_string(self.value))
-        return(sr)
+        return(crs_registry.get_sr(to_string(self.value)))
     
     
 class WGS84(CoordinateReferenceSystem):
@@ -70,7 +162,15 @@ class WGS84(CoordinateReferenceSystem):
     def get_is_360(cls,spatial):
         if not isinstance(spatial.crs,cls):
             return(False)
-        
+        ## the answer is cached on the spatial dimension and updated by wrapping
+        ret = getattr(spatial,'_is_360',None)
+        if ret is None:
+            ret = cls._get_is_360_(spatial)
+            spatial._is_360 = ret
+        return(ret)
+    
+    @classmethod
+    def _get_is_360_(cls,spatial):
         try:
             if spatial.grid.col.bounds is None:
                 check = spatial.grid.col.value
@@ -116,52 +216,93 @@ class WGS84(CoordinateReferenceSystem):
 
     def unwrap(self,spatial):
         if not self.get_is_360(spatial):
-            unwrap = Wrapper().unwrap
-            to_wrap = self._get_to_wrap_(spatial)
-            for tw in to_wrap:
-                if tw is not None:
-                    geom = tw.value.data
-                    for (ii,jj),to_wrap in iter_array(geom,return_value=True):
-                        geom[ii,jj] = unwrap(to_wrap)
-            if spatial._grid is not None:
-                ref = spatial.grid.value[1,:,:]
-                select = ref < 0
-                ref[select] = ref[select] + 360
-                if spatial.grid.col is not None:
-                    ref = spatial.grid.col.value
-                    select = ref < 0
-                    ref[select] = ref[select] + 360
-                    if spatial.grid.col.bounds is not None:
-                        ref = spatial.grid.col.bounds
-                        select = ref < 0
-                        ref[select] = ref[select] + 360
+            self._set_wrapped_(spatial,Wrapper().unwrap,360.)
+            spatial._is_360 = True
         else:
             ocgis_lh(exc=SpatialWrappingError('Data already has a 0 to 360 coordinate system.'))
     
     def wrap(self,spatial):
         if self.get_is_360(spatial):
-            wrap = Wrapper().wrap
-            to_wrap = self._get_to_wrap_(spatial)
-            for tw in to_wrap:
-                if tw is not None:
-                    geom = tw.value.data
-                    for (ii,jj),to_wrap in iter_array(geom,return_value=True):
-                        geom[ii,jj] = wrap(to_wrap)
-            if spatial._grid is not None:
-                ref = spatial.grid.value[1,:,:]
-                select = ref > 180
-                ref[select] = ref[select] - 360
-                if spatial.grid.col is not None:
-                    ref = spatial.grid.col.value
-                    select = ref > 180
-                    ref[select] = ref[select] - 360
-                    if spatial.grid.col.bounds is not None:
-                        ref = spatial.grid.col.bounds
-                        select = ref > 180
-                        ref[select] = ref[select] - 360
+            self._set_wrapped_(spatial,Wrapper().wrap,-360.)
+            spatial._is_360 = False
         else:
             ocgis_lh(exc=SpatialWrappingError('Data does not have a 0 to 360 coordinate system.'))
             
+    @staticmethod
+    def _get_shift_(minx,maxx,offset):
+        '''
+        :returns: Boolean arrays selecting the cells to shift by ``offset`` and the cells
+         crossing the wrapping axis. Points have equal minimum and maximum values.
+        :rtype: tuple
+        '''
+        if offset < 0:
+            ## wrapping to -180 to 180 moves cells east of 180
+            shift = minx > 180.
+            cross = np.logical_and(minx <= 180.,maxx > 180.)
+        else:
+            ## unwrapping to 0 to 360 moves cells west of 0
+            shift = np.logical_or(maxx < 0.,np.logical_and(maxx == 0.,minx < 0.))
+            cross = np.logical_and(minx < 0.,maxx > 0.)
+        return(shift,cross)
+    
+    def _get_shifted_grid_(self,grid,offset):
+        ## shift a copy of the grid so grids shared with other dimensions are not
+        ## modified. coordinates are shifted individually and bounds by cell except
+        ## for cells crossing the axis.
+        ret = copy(grid)
+        value = grid.value.copy()
+        ref = value.data[1,:,:]
+        shift,_ = self._get_shift_(ref,ref,offset)
+        ref[shift] += offset
+        ret._value = value
+        if grid.col is not None:
+            ret.col = copy(grid.col)
+            col_value = grid.col.value.copy()
+            shift,_ = self._get_shift_(col_value,col_value,offset)
+            col_value[shift] += offset
+            ret.col._value = col_value
+            if grid.col.bounds is not None:
+                col_bounds = grid.col.bounds.copy()
+                shift,cross = self._get_shift_(col_bounds.min(axis=1),col_bounds.max(axis=1),offset)
+                col_bounds[shift,:] += offset
+                ## the bounds of cells crossing the axis are shifted individually as
+                ## the split geometries are
+                if offset < 0:
+                    beyond = col_bounds > 180.
+                else:
+                    beyond = col_bounds < 0.
+                beyond[np.invert(cross),:] = False
+                col_bounds[beyond] += offset
+                ret.col._bounds = col_bounds
+        return(ret)
+    
+    def _set_wrapped_(self,spatial,wrapper,offset):
+        ## geometries are classified by their bounds. cells entirely beyond the
+        ## wrapping axis are shifted and only cells crossing the axis are split.
+        for tw in self._get_to_wrap_(spatial):
+            if tw is None:
+                continue
+            if tw._value is None:
+                bounds = tw._get_cell_bounds_()
+                shift,cross = self._get_shift_(bounds[0],bounds[2],offset)
+                ## array-backed geometries without axis crossings remain arrays
+                if not cross.any():
+                    tw.grid = self._get_shifted_grid_(tw.grid,offset)
+                    continue
+            r_value = tw.value
+            r_data = r_value.data
+            bounds = np.empty((4,)+r_data.shape,dtype=float)
+            for (ii,jj),geom in iter_array(r_data,use_mask=False,return_value=True):
+                bounds[:,ii,jj] = geom.bounds if not geom.is_empty else [np.nan]*4
+            shift,cross = self._get_shift_(bounds[0],bounds[2],offset)
+            unmasked = np.invert(np.ma.getmaskarray(r_value))
+            for ii,jj in itertools.izip(*np.nonzero(np.logical_and(shift,unmasked))):
+                r_data[ii,jj] = translate(r_data[ii,jj],xoff=offset)
+            for ii,jj in itertools.izip(*np.nonzero(np.logical_and(cross,unmasked))):
+                r_data[ii,jj] = wrapper(r_data[ii,jj])
+        if spatial._grid is not None:
+            spatial.grid = self._get_shifted_grid_(spatial.grid,offset)
+            
     def _get_to_wrap_(self,spatial):
         ret = []
         ret.append(spatial.geom.point)
@@ -376,6 +517,37 @@ class CFRotatedPole(CFCoordinateReferenceSystem):
         self._trans_proj = self._template.format(lon_pole=kwds['grid_north_pole_longitude'],
                                                  lat_pole=kwds['grid_north_pole_latitude'])
         
+    def get_geographic_coordinates(self,rlon,rlat):
+        '''
+        Transform rotated pole coordinates to geographic coordinates. This evaluates
+        the PROJ.4 ``ob_tran`` forward transformation of the rotated pole template
+        on coordinate arrays.
+        
+        :param rlon: Rotated longitudes in degrees.
+        :type rlon: :class:`numpy.ndarray`
+        :param rlat: Rotated latitudes in degrees with the shape of ``rlon``.
+        :type rlat: :class:`numpy.ndarray`
+        :returns: Longitudes and latitudes in degrees with the shape of ``rlon``.
+        :rtype: tuple
+        '''
+        
+        def _adjlon_(lon):
+            ## wrap longitudes in radians to [-pi,pi]
+            return(np.where(np.abs(lon) <= np.pi,lon,np.mod(lon+np.pi,2*np.pi)-np.pi))
+        
+        lon_pole = np.radians(float(self.map_parameters_values['grid_north_pole_longitude']))
+        lat_pole = np.radians(float(self.map_parameters_values['grid_north_pole_latitude']))
+        ## the template's central meridian is 180
+        lam = _adjlon_(np.radians(np.asarray(rlon,dtype=float))-np.pi)
+        phi = np.radians(np.asarray(rlat,dtype=float))
+        
+        cos_lam,sin_lam = np.cos(lam),np.sin(lam)
+        cos_phi,sin_phi = np.cos(phi),np.sin(phi)
+        sin_pole,cos_pole = np.sin(lat_pole),np.cos(lat_pole)
+        lon = _adjlon_(np.arctan2(cos_phi*sin_lam,sin_pole*cos_phi*cos_lam+cos_pole*sin_phi)+lon_pole)
+        lat = np.arcsin(np.clip(sin_pole*sin_phi-cos_pole*cos_phi*cos_lam,-1.0,1.0))
+        return(np.degrees(lon),np.degrees(lat))
+        
 #    @classmethod
 #    def _load_from_metadata_finalize_(cls,kwds,var,meta):
 #        import ipdb;ipdb.set_trace()
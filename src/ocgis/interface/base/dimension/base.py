@@ -135,6 +135,8 @@ class VectorDimension(AbstractSourcedVariable,AbstractUidValueDimension):
         bounds = kwds.pop('bounds',None)
         self.name_bounds = kwds.pop('name_bounds',None)
         self._axis = kwds.pop('axis',None)
+        ## the value and bounds arrays and their monotonic direction
+        self._monotonic = None
         
         AbstractSourcedVariable.__init__(self,kwds.pop('data',None),src_idx=kwds.pop('src_idx',None),value=kwds.get('value'))
         AbstractUidValueDimension.__init__(self,*args,**kwds)
@@ -200,30 +202,39 @@ class VectorDimension(AbstractSourcedVariable,AbstractUidValueDimension):
     def get_between(self,lower,upper,return_indices=False,closed=False):
         assert(lower <= upper)
         
-        if self.bounds is None:
-            if closed:
-                select = np.logical_and(self.value > lower,self.value < upper)
+        ## monotonic dimensions are binary searched for a contiguous selection
+        direction = self._get_monotonic_direction_()
+        if direction == 0:
+            if self.bounds is None:
+                if closed:
+                    select = np.logical_and(self.value > lower,self.value < upper)
+                else:
+                    select = np.logical_and(self.value >= lower,self.value <= upper)
             else:
-                select = np.logical_and(self.value >= lower,self.value <= upper)
+                bounds_min = np.min(self.bounds,axis=1)
+                bounds_max = np.max(self.bounds,axis=1)
+                if closed:
+                    select_lower = np.logical_or(bounds_min > lower,bounds_max > lower)
+                    select_upper = np.logical_or(bounds_min < upper,bounds_max < upper)
+                else:
+                    select_lower = np.logical_or(bounds_min >= lower,bounds_max >= lower)
+                    select_upper = np.logical_or(bounds_min <= upper,bounds_max <= upper)
+                select = np.logical_and(select_lower,select_upper)
+            is_empty = not select.any()
+            indices = np.arange(select.shape[0])[select]
         else:
-            bounds_min = np.min(self.bounds,axis=1)
-            bounds_max = np.max(self.bounds,axis=1)
-            if closed:
-                select_lower = np.logical_or(bounds_min > lower,bounds_max > lower)
-                select_upper = np.logical_or(bounds_min < upper,bounds_max < upper)
-            else:
-                select_lower = np.logical_or(bounds_min >= lower,bounds_max >= lower)
-                select_upper = np.logical_or(bounds_min <= upper,bounds_max <= upper)
-            select = np.logical_and(select_lower,select_upper)
+            start,stop = self._get_between_indices_(lower,upper,closed,direction)
+            is_empty = start >= stop
+            select = slice(start,stop)
+            indices = np.arange(start,stop)
         
-        if select.any() == False:
+        if is_empty:
             ocgis_lh(exc=EmptySubsetError(origin=self.name))
             
         ret = self[select]
         
         if return_indices:
-            indices = np.arange(select.shape[0])
-            ret = (ret,indices[select])
+            ret = (ret,indices)
         
         return(ret)
     
@@ -263,6 +274,51 @@ class VectorDimension(AbstractSourcedVariable,AbstractUidValueDimension):
     def _format_src_idx_(self,value):
         return(self._get_none_or_array_(value))
     
+    def _get_between_indices_(self,lower,upper,closed,direction):
+        ## the selection is the rows with an upper value at or above the lower
+        ## limit and a lower value at or below the upper limit
+        if self.bounds is None:
+            target_lower = target_upper = np.ma.getdata(self.value)
+        else:
+            target_lower = np.max(np.ma.getdata(self.bounds),axis=1)
+            target_upper = np.min(np.ma.getdata(self.bounds),axis=1)
+        if direction == -1:
+            target_lower,target_upper = target_lower[::-1],target_upper[::-1]
+        if closed:
+            start = np.searchsorted(target_lower,lower,side='right')
+            stop = np.searchsorted(target_upper,upper,side='left')
+        else:
+            start = np.searchsorted(target_lower,lower,side='left')
+            stop = np.searchsorted(target_upper,upper,side='right')
+        if direction == -1:
+            start,stop = target_lower.shape[0]-stop,target_lower.shape[0]-start
+        return(int(start),int(stop))
+    
+    def _get_monotonic_direction_(self):
+        '''
+        :returns: 1 if the value, or the lower and upper bounds, are non-decreasing.
+         -1 if non-increasing. Otherwise, 0. The result is cached until the value
+         or bounds array is replaced.
+        :rtype: int
+        '''
+        value,bounds = self.value,self.bounds
+        if self._monotonic is not None and self._monotonic[0] is value and self._monotonic[1] is bounds:
+            return(self._monotonic[2])
+        
+        ret = 0
+        if not np.ma.is_masked(value) and (bounds is None or not np.ma.is_masked(bounds)):
+            if bounds is None:
+                targets = [np.ma.getdata(value)]
+            else:
+                targets = [np.min(np.ma.getdata(bounds),axis=1),np.max(np.ma.getdata(bounds),axis=1)]
+            ## comparisons also support object arrays (i.e. datetimes)
+            if all([np.all(t[1:] >= t[:-1]) for t in targets]):
+                ret = 1
+            elif all([np.all(t[1:] <= t[:-1]) for t in targets]):
+                ret = -1
+        self._monotonic = (value,bounds,ret)
+        return(ret)
+    
     def _get_iter_value_bounds_(self):
         return(self.value,self.bounds)
     
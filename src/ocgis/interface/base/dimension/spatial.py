@@ -2,7 +2,8 @@ import base
 import numpy as np
 from ocgis.util.logging_ocgis import ocgis_lh
 from ocgis.util.helpers import iter_array, get_none_or_slice, \
-    get_formatted_slice, get_reduced_slice, make_poly
+    get_formatted_slice, get_reduced_slice, make_poly,\
+    get_transformed_coordinates, get_transformed_geometries
 from shapely.geometry.point import Point
 from ocgis import constants
 import itertools
@@ -15,19 +16,27 @@ from ocgis.exc import ImproperPolygonBoundsError, EmptySubsetError
 from osgeo.ogr import CreateGeometryFromWkb
 from shapely import wkb
 from ocgis.util.spatial.index import build_index_grid, build_index,\
-    index_intersects
+    index_intersects, SpatialIndex
+from ocgis.util.spatial.scanline import get_rectilinear_intersects
+from ocgis import env
 import fiona
+import hashlib
 from shapely.geometry.geo import mapping
 
 
 class SpatialDimension(base.AbstractUidDimension):
     _ndims = 2
     _axis = 'SPATIAL'
-    _attrs_slice = ('uid','grid','_geom')
+    _attrs_slice = ('uid','grid','_geom','_weights')
     
     def __init__(self,*args,**kwds):
         self.grid = kwds.pop('grid',None)
+        ## weights used in place of the geometry weights (i.e. cached overlap weights)
+        self._weights = None
         self.crs = kwds.pop('crs',None)
+        ## cached answer for whether a geographic coordinate system uses 0 to 360
+        ## longitudes
+        self._is_360 = None
         self.abstraction = kwds.pop('abstraction','polygon')
         self._geom = kwds.pop('geom',None)
         
@@ -70,15 +79,10 @@ class SpatialDimension(base.AbstractUidDimension):
     @property
     def grid(self):
         if self._grid is None and self._geom_to_grid:
-            ## populate the grid using the point geometry representation
-            ref_pv = self.geom.point.value
-            shp = (2,ref_pv.shape[0],ref_pv.shape[1])
-            fill = np.empty(shp,dtype=constants.np_float)
-            for (idx_row,idx_col),geom in iter_array(ref_pv.data,return_value=True):
-                fill[:,idx_row,idx_col] = geom.y,geom.x
-            mask = np.empty_like(fill,dtype=bool)
-            mask[:,:,:] = ref_pv.mask
-            self._grid = SpatialGridDimension(value=np.ma.array(fill,mask=mask),
+            ## populate the grid using the point coordinates
+            coordinates = self.geom.point.coordinates
+            fill = coordinates.data.astype(constants.np_float)
+            self._grid = SpatialGridDimension(value=np.ma.array(fill,mask=coordinates.mask.copy()),
                                               uid=self.geom.point.uid)
         return(self._grid)
     @grid.setter
@@ -97,6 +101,8 @@ class SpatialDimension(base.AbstractUidDimension):
         
     @property
     def weights(self):
+        if self._weights is not None:
+            return(self._weights)
         if self.geom is None:
             ret = self.grid.weights
         else:
@@ -113,11 +119,22 @@ class SpatialDimension(base.AbstractUidDimension):
         
         ## clipping with points is okay...
         try:
-            ref_value = ret.geom.polygon.value
+            ref_dim = ret.geom.polygon
         except ImproperPolygonBoundsError:
-            ref_value = ret.geom.point.value
-        for (row_idx,col_idx),geom in iter_array(ref_value,return_value=True):
-            ref_value[row_idx,col_idx] = geom.intersection(polygon)
+            ref_dim = ret.geom.point
+        ref_value = ref_dim.value
+        
+        ## geometries in the interior of the clip polygon are not modified
+        interior = ref_dim._interior
+        if interior is None:
+            prepared = prep(polygon)
+            interior = np.zeros(ref_value.shape,dtype=bool)
+            for (row_idx,col_idx),geom in iter_array(ref_value,return_value=True):
+                interior[row_idx,col_idx] = prepared.contains(geom)
+        boundary = np.logical_and(np.invert(np.ma.getmaskarray(ref_value)),np.invert(interior))
+        r_data = ref_value.data
+        for row_idx,col_idx in itertools.izip(*np.nonzero(boundary)):
+            r_data[row_idx,col_idx] = r_data[row_idx,col_idx].intersection(polygon)
             
 #        ## clipped geometries have no grid or point representations
 #        ret.grid._value = None
@@ -136,14 +153,8 @@ class SpatialDimension(base.AbstractUidDimension):
             ocgis_lh(exc=ValueError('Grid bounds may only be computed when a grid is present.'))
             
         if self.geom.polygon is not None:
-            shp = list(self.geom.polygon.shape) + [4]
-            fill = np.empty(shp)
-            fill_mask = np.zeros(fill.shape,dtype=bool)
-            r_mask = self.geom.polygon.value.mask
-            for (idx_row,idx_col),geom in iter_array(self.geom.polygon.value,use_mask=False,return_value=True):
-                fill[idx_row,idx_col,:] = geom.bounds
-                fill_mask[idx_row,idx_col,:] = r_mask[idx_row,idx_col]
-            fill = np.ma.array(fill,mask=fill_mask)
+            ## move the bounds axis last
+            fill = self.geom.polygon.bounds.transpose(1,2,0)
         else:
             raise(NotImplementedError)
         return(fill)
@@ -163,6 +174,7 @@ class SpatialDimension(base.AbstractUidDimension):
             else:
                 ## reset the geometries
                 ret._geom = None
+                ret._weights = None
                 ## subset the grid by its bounding box
                 ret.grid,slc = self.grid.get_subset_bbox(minx,miny,maxx,maxy,return_indices=True)
                 ## update the unique identifier to copy the grid uid
@@ -170,10 +182,10 @@ class SpatialDimension(base.AbstractUidDimension):
                 ## attempt to mask the polygons
                 try:
                     ret._geom._polygon = ret.geom.polygon.get_intersects_masked(polygon)
-                    grid_mask = ret.geom.polygon.value.mask
+                    grid_mask = ret.geom.polygon.mask
                 except ImproperPolygonBoundsError:
                     ret._geom._point = ret.geom.point.get_intersects_masked(polygon)
-                    grid_mask = ret.geom.point.value.mask
+                    grid_mask = ret.geom.point.mask
                 ## transfer the geometry mask to the grid mask
                 ret.grid.value.mask[:,:,:] = grid_mask.copy()
         else:
@@ -186,9 +198,9 @@ class SpatialDimension(base.AbstractUidDimension):
     def get_geom_iter(self,target=None,as_multipolygon=True):
         target = target or self.abstraction
         if target is None:
-            value = self.geom.get_highest_order_abstraction().value
+            dim = self.geom.get_highest_order_abstraction()
         else:
-            value = getattr(self.geom,target).value
+            dim = getattr(self.geom,target)
         
         ## no need to attempt and convert to MultiPolygon if we are working with
         ## point data.
@@ -196,19 +208,69 @@ class SpatialDimension(base.AbstractUidDimension):
             as_multipolygon = False
         
         r_uid = self.uid
-        for (row_idx,col_idx),geom in iter_array(value,return_value=True):
+        ## geometries are constructed as they are iterated if not already loaded
+        for row_idx,col_idx,geom in dim.iter_geometries():
             if as_multipolygon:
                 if isinstance(geom,Polygon):
                     geom = MultiPolygon([geom])
             uid = r_uid[row_idx,col_idx]
             yield(row_idx,col_idx,geom,uid)
     
+    def get_fingerprint(self):
+        '''
+        :returns: A hash of the coordinates, bounds, mask, and coordinate system. Spatial
+         dimensions with the same fingerprint have the same geometries.
+        :rtype: str
+        '''
+        ret = hashlib.sha1()
+        if self.grid is not None and self.grid.row is not None:
+            arrs = [self.grid.row.value,self.grid.row.bounds,self.grid.col.value,self.grid.col.bounds]
+        elif self.grid is not None:
+            arrs = [self.grid.value.data]
+        else:
+            arrs = [np.array([geom.wkb for geom in self.abstraction_geometry.value.compressed()])]
+        arrs.append(self.get_mask())
+        for arr in arrs:
+            if arr is None:
+                ret.update('None')
+            else:
+                arr = np.ascontiguousarray(arr)
+                ret.update('{0}{1}'.format(arr.dtype,arr.shape))
+                ret.update(arr.tostring())
+        crs = None if self.crs is None else sorted(self.crs.value.items())
+        ret.update(repr(crs))
+        return(ret.hexdigest())
+
+    def get_masked(self,mask,weights=None):
+        '''
+        :param mask: Boolean array with the spatial shape. True values are masked.
+        :type mask: :class:`numpy.ndarray`
+        :param weights: Overrides the weights computed from the geometries.
+        :type weights: :class:`numpy.ma.MaskedArray`
+        :returns: A shallow copy with ``mask`` added to the grid and unique identifier
+         masks. Geometries are rebuilt from the masked grid. Values loaded for a field
+         with the returned dimension are masked.
+        :rtype: :class:`~ocgis.interface.base.dimension.spatial.SpatialDimension`
+        '''
+        ret = copy(self)
+        ret.grid = copy(self.grid)
+        value = self.grid.value
+        ret.grid._value = np.ma.array(value.data,mask=np.logical_or(np.ma.getmaskarray(value),mask),
+                                      fill_value=value.fill_value)
+        uid = self.grid.uid
+        ret.grid.uid = np.ma.array(uid.data,mask=np.logical_or(np.ma.getmaskarray(uid),mask),
+                                   fill_value=uid.fill_value)
+        ret.uid = ret.grid.uid
+        ret._geom = None
+        ret._weights = weights
+        return(ret)
+    
     def get_mask(self):
         if self.grid is None:
             if self.geom.point is None:
-                ret = self.geom.polygon.value.mask
+                ret = self.geom.polygon.mask
             else:
-                ret = self.geom.point.value.mask
+                ret = self.geom.point.mask
         else:
             ret = self.grid.value.mask[0,:,:]
         return(ret.copy())
@@ -227,12 +289,7 @@ class SpatialDimension(base.AbstractUidDimension):
                 pass
             
             if self.grid is not None and self.geom.point is not None:
-                r_grid_value = self.grid.value.data
-                r_point_value = self.geom.point.value.data
-                for (idx_row,idx_col),geom in iter_array(r_point_value,return_value=True,use_mask=False):
-                    x,y = geom.x,geom.y
-                    r_grid_value[0,idx_row,idx_col] = y
-                    r_grid_value[1,idx_row,idx_col] = x
+                self.grid.value.data[:,:,:] = self.geom.point.coordinates.data
                 ## remove row and columns if they exist as this requires interpolation
                 ## to make them vectors again.
                 self.grid.row = None
@@ -243,12 +300,19 @@ class SpatialDimension(base.AbstractUidDimension):
                 self.grid.value.mask = True
             
             self.crs = to_crs
+            self._is_360 = None
                     
     def write_fiona(self,path,target='polygon',driver='ESRI Shapefile'):
         attr = getattr(self.geom,target)
         attr.write_fiona(path,self.crs.value,driver=driver)
         return(path)
     
+    def _format_slice_state_(self,state,slc):
+        ## a subset may not span the same longitudes. the 0 to 360 check is
+        ## repeated on request.
+        state._is_360 = None
+        return(state)
+    
     def _format_uid_(self,value):
         return(np.atleast_2d(value))
     
@@ -542,19 +606,62 @@ class SpatialGeometryDimension(base.AbstractUidDimension):
 class SpatialGeometryPointDimension(base.AbstractUidValueDimension):
     _axis = 'POINT'
     _ndims = 2
-    _attrs_slice = ('uid','_value','grid')
+    _attrs_slice = ('uid','_value','grid','_mask','_interior')
     _geom_type = 'Point'
     
     def __init__(self,*args,**kwds):
         self.grid = kwds.pop('grid',None)
+        ## mask used in place of the grid mask when geometries are not loaded
+        self._mask = None
+        ## cells contained by the last intersects geometry
+        self._interior = None
         
         super(SpatialGeometryPointDimension,self).__init__(*args,**kwds)
         
+    @property
+    def coordinates(self):
+        '''
+        Masked array of shape (2,nrow,ncol) holding the y and x coordinates of each
+        point. Geometries are not constructed if they are not already loaded.
+        '''
+        if self._value is None:
+            ret = self.grid.value.data
+        else:
+            ret = np.empty([2]+list(self.shape),dtype=constants.np_float)
+            for (ii,jj),geom in iter_array(self._value.data,use_mask=False,return_value=True):
+                ret[:,ii,jj] = geom.y,geom.x
+        return(self._get_masked_array_(ret))
+    
+    @property
+    def mask(self):
+        if self._value is not None:
+            ret = np.ma.getmaskarray(self._value)
+        elif self._mask is not None:
+            ret = self._mask
+        else:
+            ret = np.ma.getmaskarray(self.grid.value)[0,:,:]
+        return(ret)
+    
+    @property
+    def shape(self):
+        if self._value is None:
+            ret = self.grid.shape
+        else:
+            ret = self._value.shape
+        return(ret)
+        
     @property
     def weights(self):
-        ret = np.ones(self.value.shape,dtype=constants.np_float)
-        ret = np.ma.array(ret,mask=self.value.mask)
+        ret = np.ones(self.shape,dtype=constants.np_float)
+        ret = np.ma.array(ret,mask=self.mask.copy())
         return(ret)
+    
+    def get_geometry(self,row_idx,col_idx):
+        '''
+        :returns: The geometry at the index location. If geometries are not loaded,
+         it is constructed from the coordinate array.
+        '''
+        return(self._get_geometry_getter_()(row_idx,col_idx))
         
     def get_intersects_masked(self,polygon):
         
@@ -570,46 +677,75 @@ class SpatialGeometryPointDimension(base.AbstractUidValueDimension):
             raise(NotImplementedError)
 #            ref_intersects = _intersects_point_
 #            obj = prep(polygon)
-        elif type(polygon) in (Polygon,MultiPolygon):
-            ## construct the spatial index
-            index_grid = build_index_grid(None,polygon)
-            obj = build_index(polygon,index_grid)
-            ref_intersects = _intersects_polygon_
-        else:
+        elif type(polygon) not in (Polygon,MultiPolygon):
             raise(NotImplementedError)
         
         ret = copy(self)
-        fill = np.ma.array(self.value,mask=True)
-        ref_fill_mask = fill.mask
-        prepared = prep(polygon)
-        
-        for (ii,jj),geom in iter_array(self.value,return_value=True):
-            if prepared.intersects(geom):
-                ## the mask value is the inverse of the intersects operation
-                ref_fill_mask[ii,jj] = not ref_intersects(obj,geom)
         
-        if ref_fill_mask.all():
-            ocgis_lh(exc=EmptySubsetError(self.name))
+        if env.USE_SPATIAL_INDEX:
+            new_mask,ret._interior = self._get_intersects_mask_(polygon)
+        else:
+            ret._interior = None
+            ## construct the legacy spatial index
+            index_grid = build_index_grid(None,polygon)
+            obj = build_index(polygon,index_grid)
+            ref_intersects = _intersects_polygon_
+            new_mask = np.ones(self.shape,dtype=bool)
+            prepared = prep(polygon)
             
-        ret._value = fill
-        ret.uid.mask = fill.mask.copy()
+            ## only unmasked geometries are tested. they are not stored if not
+            ## already loaded.
+            for ii,jj,geom in self.iter_geometries():
+                if prepared.intersects(geom):
+                    ## the mask value is the inverse of the intersects operation
+                    new_mask[ii,jj] = not ref_intersects(obj,geom)
+        
+        if new_mask.all():
+            ocgis_lh(exc=EmptySubsetError(self.name))
+        
+        if self._value is None:
+            ret._mask = new_mask
+        else:
+            ret._value = np.ma.array(self._value,mask=new_mask)
+        ret.uid.mask = new_mask.copy()
                 
         return(ret)
     
+    def iter_geometries(self):
+        '''
+        :returns: An iterator over unmasked geometries yielding the row index, column
+         index, and geometry. Geometries not loaded are constructed as needed.
+        :rtype: tuple
+        '''
+        get_geometry = self._get_geometry_getter_()
+        for ii,jj in itertools.izip(*np.nonzero(np.invert(self.mask))):
+            ii,jj = int(ii),int(jj)
+            yield(ii,jj,get_geometry(ii,jj))
+    
     def update_crs(self,to_sr,from_sr):
-        ## we are modifying the original source data and need to copy the new
-        ## values.
-        new_value = self.value.copy()
-        ## be sure and project masked geometries to maintain underlying geometries
-        ## for masked values.
-        r_value = new_value.data
-        r_loads = wkb.loads
-        for (idx_row,idx_col),geom in iter_array(r_value,return_value=True,use_mask=False):
-            ogr_geom = CreateGeometryFromWkb(geom.wkb)
-            ogr_geom.AssignSpatialReference(from_sr)
-            ogr_geom.TransformTo(to_sr)
-            r_value[idx_row,idx_col] = r_loads(ogr_geom.ExportToWkb())
-        self._value = new_value
+        ## coordinates are transformed with a single batched transformation. be
+        ## sure and project masked geometries to maintain underlying geometries for
+        ## masked values.
+        if self._value is None:
+            self._update_crs_array_(to_sr,from_sr)
+        else:
+            ## we are modifying the original source data and need to copy the new
+            ## values.
+            new_value = self._value.copy()
+            r_value = new_value.data
+            geoms = get_transformed_geometries(r_value.flat,from_sr,to_sr)
+            for (idx_row,idx_col),geom in itertools.izip(np.ndindex(*r_value.shape),geoms):
+                r_value[idx_row,idx_col] = geom
+            self._value = new_value
+            
+    def _update_crs_array_(self,to_sr,from_sr):
+        ## points are kept as arrays. the transformed coordinates are stored in a new
+        ## grid so a grid shared with other dimensions is not modified.
+        coordinates = self.coordinates
+        uid = self.uid
+        x,y = get_transformed_coordinates(coordinates.data[1],coordinates.data[0],from_sr,to_sr)
+        value = np.ma.array(np.array([y,x]),mask=coordinates.mask.copy())
+        self.grid = SpatialGridDimension(value=value,uid=uid)
             
     def write_fiona(self,path,crs,driver='ESRI Shapefile'):
         schema = {'geometry':self._geom_type,
@@ -618,12 +754,11 @@ class SpatialGeometryPointDimension(base.AbstractUidValueDimension):
         ref_uid = self.uid
         
         with fiona.open(path,'w',driver=driver,crs=crs,schema=schema) as f:
-            for (ii,jj),geom in iter_array(self.value,return_value=True):
+            for ii,jj,geom in self.iter_geometries():
                 geom = ref_prep(geom)
                 uid = ref_uid[ii,jj]
                 feature = {'properties':{'UGID':uid},'geometry':mapping(geom)}
                 f.write(feature)
-                feature = {'UGID'}
         
         return(path)
         
@@ -642,28 +777,105 @@ class SpatialGeometryPointDimension(base.AbstractUidValueDimension):
         ret = self._get_none_or_array_(ret,masked=True)
         return(ret)
     
+    def _get_cell_bounds_(self):
+        ## points are degenerate boxes
+        coordinates = self.coordinates.data
+        return(coordinates[[1,0,1,0],:,:])
+    
+    def _get_geometry_array_(self):
+        return(self.coordinates.data)
+    
+    def _get_geometry_getter_(self):
+        if self._value is None:
+            arr = self._get_geometry_array_()
+            ref_get = self._get_geometry_from_array_
+            ret = lambda ii,jj: ref_get(arr,ii,jj)
+        else:
+            r_data = self._value.data
+            ret = lambda ii,jj: r_data[ii,jj]
+        return(ret)
+    
     def _get_geometry_fill_(self,shape=None):
         if shape is None:
-            shape = (self.grid.shape[0],self.grid.shape[1])
-            mask = self.grid.value[0].mask
+            shape = self.shape
+            mask = self.mask.copy()
         else:
             mask = False
         fill = np.ma.array(np.zeros(shape),mask=mask,dtype=object)
 
         return(fill)
     
+    def _get_geometry_from_array_(self,arr,row_idx,col_idx):
+        return(Point(arr[1,row_idx,col_idx],arr[0,row_idx,col_idx]))
+    
+    def _get_intersects_mask_(self,polygon):
+        unmasked = np.invert(self.mask)
+        ret = np.ones(self.shape,dtype=bool)
+        interior = np.zeros(self.shape,dtype=bool)
+        
+        ## cells of rectilinear grids are classified using the polygon edges
+        rectilinear = None
+        if self._value is None and self.grid.row is not None:
+            try:
+                rectilinear = get_rectilinear_intersects(*self._get_rectilinear_bounds_(),polygon=polygon)
+            ## bounds are not monotonic
+            except ValueError:
+                pass
+        
+        if rectilinear is None:
+            ## index the bounding boxes of the unmasked cells
+            rows,cols = np.nonzero(unmasked)
+            cell_bounds = self._get_cell_bounds_()[:,rows,cols].T
+            index = SpatialIndex(cell_bounds)
+            
+            ## query the index with each part of the selection geometry
+            try:
+                parts = polygon.geoms
+            except AttributeError:
+                parts = [polygon]
+            candidates = [index.query(part.bounds) for part in parts]
+            candidates = np.unique(np.concatenate(candidates))
+            candidates = zip(rows[candidates],cols[candidates])
+        else:
+            inside,boundary = rectilinear
+            interior = np.logical_and(inside,unmasked)
+            ret[interior] = False
+            candidates = zip(*np.nonzero(np.logical_and(boundary,unmasked)))
+        
+        ## exact tests are performed for candidate cells only. cells contained by
+        ## the selection geometry do not require the boundary test.
+        prepared = prep(polygon)
+        get_geometry = self._get_geometry_getter_()
+        for ii,jj in candidates:
+            geom = get_geometry(ii,jj)
+            if prepared.contains(geom):
+                ret[ii,jj] = False
+                interior[ii,jj] = True
+            elif prepared.intersects(geom):
+                ret[ii,jj] = polygon.touches(geom)
+        return(ret,interior)
+    
+    def _get_rectilinear_bounds_(self):
+        ## points have zero width
+        row = self.grid.row.value
+        col = self.grid.col.value
+        return(np.column_stack((row,row)),np.column_stack((col,col)))
+    
+    def _get_masked_array_(self,arr):
+        ## broadcast the two-dimensional mask to the leading axis of the array
+        mask = np.empty(arr.shape,dtype=bool)
+        mask[:,:,:] = self.mask
+        return(np.ma.array(arr,mask=mask))
+    
     def _get_value_(self):
         ## we are interested in creating geometries for all the underly coordinates
         ## regardless if the data is masked
-        ref_grid = self.grid.value.data
-        
+        arr = self._get_geometry_array_()
         fill = self._get_geometry_fill_()
         r_data = fill.data
-        for idx_row,idx_col in iter_array(ref_grid[0],use_mask=False):
-            y = ref_grid[0,idx_row,idx_col]
-            x = ref_grid[1,idx_row,idx_col]
-            pt = Point(x,y)
-            r_data[idx_row,idx_col] = pt
+        r_get = self._get_geometry_from_array_
+        for idx_row,idx_col in itertools.product(range(fill.shape[0]),range(fill.shape[1])):
+            r_data[idx_row,idx_col] = r_get(arr,idx_row,idx_col)
         return(fill)
     
     
@@ -683,24 +895,66 @@ class SpatialGeometryPolygonDimension(SpatialGeometryPointDimension):
     
     @property
     def area(self):
-        r_value = self.value
-        fill = np.ones(r_value.shape,dtype=constants.np_float)
-        fill = np.ma.array(fill,mask=r_value.mask)
-        for (ii,jj),geom in iter_array(r_value,return_value=True):
-            fill[ii,jj] = geom.area
+        if self._value is None:
+            bounds = self._get_geometry_array_()
+            fill = (bounds[2]-bounds[0])*(bounds[3]-bounds[1])
+            fill = np.ma.array(fill.astype(constants.np_float),mask=self.mask.copy())
+        else:
+            r_value = self.value
+            fill = np.ones(r_value.shape,dtype=constants.np_float)
+            fill = np.ma.array(fill,mask=r_value.mask)
+            for (ii,jj),geom in iter_array(r_value,return_value=True):
+                fill[ii,jj] = geom.area
         return(fill)
     
     @property
-    def weights(self):
-        return(self.area/self.area.max())
+    def bounds(self):
+        '''
+        Masked array of shape (4,nrow,ncol) holding the minimum x, minimum y, maximum x,
+        and maximum y of each polygon. Geometries are not constructed if they are
+        not already loaded.
+        '''
+        if self._value is None:
+            row_bounds = self.grid.row.bounds
+            col_bounds = self.grid.col.bounds
+            ret = np.empty([4,row_bounds.shape[0],col_bounds.shape[0]],dtype=row_bounds.dtype)
+            ret[0,:,:] = col_bounds.min(axis=1)[np.newaxis,:]
+            ret[1,:,:] = row_bounds.min(axis=1)[:,np.newaxis]
+            ret[2,:,:] = col_bounds.max(axis=1)[np.newaxis,:]
+            ret[3,:,:] = row_bounds.max(axis=1)[:,np.newaxis]
+        else:
+            ret = np.empty([4]+list(self.shape),dtype=constants.np_float)
+            for (ii,jj),geom in iter_array(self._value.data,use_mask=False,return_value=True):
+                ret[:,ii,jj] = geom.bounds
+        return(self._get_masked_array_(ret))
     
-    def _get_value_(self):
-        ref_row_bounds = self.grid.row.bounds
-        ref_col_bounds = self.grid.col.bounds
+    @property
+    def weights(self):
+        area = self.area
+        return(area/area.max())
+    
+    def _get_cell_bounds_(self):
+        return(self.bounds.data)
+    
+    def _update_crs_array_(self,to_sr,from_sr):
+        ## projected cells are not rectangles and are loaded as polygons built from
+        ## their transformed corners.
+        minx,miny,maxx,maxy = self.bounds.data
+        x,y = get_transformed_coordinates(np.array([minx,minx,maxx,maxx]),
+                                          np.array([miny,maxy,maxy,miny]),
+                                          from_sr,to_sr)
         fill = self._get_geometry_fill_()
         r_data = fill.data
-        for idx_row,idx_col in itertools.product(range(ref_row_bounds.shape[0]),range(ref_col_bounds.shape[0])):
-            row_min,row_max = ref_row_bounds[idx_row,:].min(),ref_row_bounds[idx_row,:].max()
-            col_min,col_max = ref_col_bounds[idx_col,:].min(),ref_col_bounds[idx_col,:].max()
-            r_data[idx_row,idx_col] = Polygon([(col_min,row_min),(col_min,row_max),(col_max,row_max),(col_max,row_min)])
-        return(fill)
+        for idx_row,idx_col in np.ndindex(*r_data.shape):
+            r_data[idx_row,idx_col] = Polygon(zip(x[:,idx_row,idx_col],y[:,idx_row,idx_col]))
+        self._value = fill
+    
+    def _get_geometry_array_(self):
+        return(self.bounds.data)
+    
+    def _get_rectilinear_bounds_(self):
+        return(self.grid.row.bounds,self.grid.col.bounds)
+    
+    def _get_geometry_from_array_(self,arr,row_idx,col_idx):
+        col_min,row_min,col_max,row_max = arr[:,row_idx,col_idx]
+        return(Polygon([(col_min,row_min),(col_min,row_max),(col_max,row_max),(col_max,row_min)]))
@@ -1,17 +1,241 @@
 import base
 import numpy as np
-from collections import deque
-import itertools
 import datetime
 from ocgis import constants
 from ocgis.util.logging_ocgis import ocgis_lh
 from ocgis.exc import EmptySubsetError
-from ocgis.util.helpers import get_is_date_between
+from ocgis.util.helpers import get_contiguous_runs
+
+
+def get_date_parts(value):
+    '''
+    :param value: One-dimensional array of datetime objects.
+    :type value: :class:`numpy.ndarray`
+    :returns: Integer array of shape (n,7) holding the year, month, day, hour, minute,
+     second, and microsecond of each datetime. Standard datetimes are converted in
+     bulk through :class:`numpy.datetime64`.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    value = np.asarray(value).reshape(-1)
+    ret = np.empty((value.shape[0],7),dtype=np.int64)
+    try:
+        dt = value.astype('datetime64[us]')
+    ## datetimes for non-standard calendars are not convertible
+    except (TypeError,ValueError):
+        dt = None
+    if dt is None:
+        for ii,element in enumerate(value.flat):
+            ret[ii,:] = [element.year,element.month,element.day,element.hour,element.minute,
+                         element.second,element.microsecond]
+    else:
+        years = dt.astype('datetime64[Y]')
+        months = dt.astype('datetime64[M]')
+        days = dt.astype('datetime64[D]')
+        ret[:,0] = years.astype(np.int64)+1970
+        ret[:,1] = months.astype(np.int64)-years.astype('datetime64[M]').astype(np.int64)+1
+        ret[:,2] = days.astype(np.int64)-months.astype('datetime64[D]').astype(np.int64)+1
+        microseconds = dt.astype(np.int64)-days.astype('datetime64[us]').astype(np.int64)
+        ret[:,3] = microseconds//3600000000
+        ret[:,4] = (microseconds//60000000)%60
+        ret[:,5] = (microseconds//1000000)%60
+        ret[:,6] = microseconds%1000000
+    return(ret)
+
+
+def get_date_parts_key(parts):
+    '''
+    :param parts: Date parts as returned by :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`.
+    :type parts: :class:`numpy.ndarray`
+    :returns: An integer for each row ordered as the datetimes are ordered.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    ret = parts[:,0].astype(np.int64)
+    for idx,size in zip(range(1,7),[13,32,24,60,60,1000000]):
+        ret = ret*size+parts[:,idx]
+    return(ret)
+
+
+def get_datetime_from_parts(parts):
+    '''
+    :param parts: Date parts as returned by :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`.
+    :type parts: :class:`numpy.ndarray`
+    :returns: An object array of :class:`datetime.datetime` with microsecond precision
+     or None if any date does not exist in the gregorian calendar (i.e. February 30).
+    :rtype: :class:`numpy.ndarray`
+    '''
+    ## datetime objects are limited to years 1 through 9999
+    if (parts[:,0] < 1).any() or (parts[:,0] > 9999).any():
+        return(None)
+    dt = (parts[:,0]-1970).astype('datetime64[Y]').astype('datetime64[M]')
+    dt = (dt+(parts[:,1]-1).astype('timedelta64[M]')).astype('datetime64[D]')
+    dt = (dt+(parts[:,2]-1).astype('timedelta64[D]')).astype('datetime64[us]')
+    microseconds = ((parts[:,3]*60+parts[:,4])*60+parts[:,5])*1000000+parts[:,6]
+    dt = dt+microseconds.astype('timedelta64[us]')
+    if not (get_date_parts(dt) == parts).all():
+        return(None)
+    return(dt.astype(object))
+
+
+def get_labels(keys):
+    '''
+    :param keys: Integer array of shape (n,m).
+    :type keys: :class:`numpy.ndarray`
+    :returns: A group label for each row and the unique rows of ``keys`` in
+     lexicographic order. Labels index the unique rows.
+    :rtype: tuple
+    '''
+    order = np.lexsort(keys.T[::-1])
+    sorted_keys = keys[order]
+    change = np.ones(keys.shape[0],dtype=bool)
+    change[1:] = np.any(sorted_keys[1:] != sorted_keys[:-1],axis=1)
+    labels = np.empty(keys.shape[0],dtype=int)
+    labels[order] = np.cumsum(change)-1
+    return(labels,sorted_keys[change])
+
+
+def get_season_labels(months,grouping):
+    '''
+    :param months: The month of each time step.
+    :type months: :class:`numpy.ndarray`
+    :param grouping: A sequence of month sequences.
+    :type grouping: sequence
+    :returns: The index of each time step's season in ``grouping`` with -1 for months
+     in no season. None is returned if seasons share months.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    lookup = np.empty(13,dtype=int)
+    lookup.fill(-1)
+    for idx,group in enumerate(grouping):
+        group = np.array(group,dtype=int)
+        if np.any(lookup[group] != -1):
+            return(None)
+        lookup[group] = idx
+    return(lookup[months])
+
+
+class TemporalGroupIndex(object):
+    '''
+    The time indices of each temporal group stored as a permutation ordering time
+    steps by group and the offset of each group within the permutation. Indices
+    within a group are in time order. Memory is proportional to the number of time
+    steps and not the number of groups.
+    
+    For compatibility with sequences of boolean masks, indexing the object returns
+    a boolean mask selecting the time steps of a group.
+    
+    >>> gidx = TemporalGroupIndex.from_labels(np.array([0,1,0,1]),2)
+    >>> gidx.get_indices(1)
+    array([1, 3])
+    >>> gidx[1]
+    array([False,  True, False,  True], dtype=bool)
+    
+    :param order: The time indices ordered by group.
+    :type order: :class:`numpy.ndarray`
+    :param offsets: The start position of each group in ``order`` followed by the
+     length of ``order``.
+    :type offsets: :class:`numpy.ndarray`
+    :param int size: The length of the time dimension.
+    '''
+    
+    def __init__(self,order,offsets,size):
+        self.order = np.asarray(order,dtype=int)
+        self.offsets = np.asarray(offsets,dtype=int)
+        self.size = size
+        
+    def __getitem__(self,idx):
+        ret = np.zeros(self.size,dtype=bool)
+        ret[self.get_indices(idx)] = True
+        return(ret)
+    
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield(self[idx])
+    
+    def __len__(self):
+        return(self.offsets.shape[0]-1)
+    
+    @classmethod
+    def from_labels(cls,labels,ngroups):
+        '''
+        :param labels: The group label of each time step. Time steps with negative
+         labels are in no group.
+        :type labels: :class:`numpy.ndarray`
+        :param int ngroups: The number of groups.
+        :rtype: :class:`~ocgis.interface.base.dimension.temporal.TemporalGroupIndex`
+        '''
+        ## a stable sort keeps time order within groups
+        order = np.argsort(labels,kind='mergesort')
+        offsets = np.searchsorted(labels[order],np.arange(ngroups+1))
+        return(cls(order[offsets[0]:],offsets-offsets[0],labels.shape[0]))
+    
+    @classmethod
+    def from_members(cls,members,size):
+        '''
+        :param members: Sorted time index arrays for each group.
+        :type members: sequence
+        :param int size: The length of the time dimension.
+        :rtype: :class:`~ocgis.interface.base.dimension.temporal.TemporalGroupIndex`
+        '''
+        members = [np.asarray(m,dtype=int) for m in members]
+        offsets = np.cumsum([0]+[m.shape[0] for m in members])
+        order = np.concatenate(members) if len(members) > 0 else np.array([],dtype=int)
+        return(cls(order,offsets,size))
+    
+    @classmethod
+    def from_masks(cls,masks):
+        '''
+        :param masks: Boolean arrays selecting the time steps of each group.
+        :type masks: sequence
+        :rtype: :class:`~ocgis.interface.base.dimension.temporal.TemporalGroupIndex`
+        '''
+        masks = [np.asarray(m,dtype=bool) for m in masks]
+        size = masks[0].shape[0] if len(masks) > 0 else 0
+        return(cls.from_members([np.nonzero(m)[0] for m in masks],size))
+    
+    def get_indices(self,idx):
+        '''
+        :param int idx: The group index.
+        :returns: The sorted time indices of the group.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        return(self.order[self.offsets[idx]:self.offsets[idx+1]])
+    
+    def get_selection(self,idx):
+        '''
+        :param int idx: The group index.
+        :returns: A slice if the group's time steps are contiguous. Otherwise, the
+         time indices. Indexing with a slice returns a view.
+        :rtype: slice or :class:`numpy.ndarray`
+        '''
+        ret = self.get_indices(idx)
+        if ret.shape[0] > 0 and ret[-1]-ret[0] == ret.shape[0]-1:
+            ret = slice(int(ret[0]),int(ret[-1])+1)
+        return(ret)
 
 
 class TemporalDimension(base.VectorDimension):
     _date_parts = ('year','month','day','hour','minute','second','microsecond')
     _axis = 'T'
+    
+    @property
+    def bounds_date_parts(self):
+        '''
+        :returns: Integer array of shape (n,2,7) holding the date parts of the lower and
+         upper bounds or None if there are no bounds. See :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        bounds = self._get_datetime_bounds_()
+        if bounds is None:
+            return(None)
+        return(get_date_parts(bounds).reshape(-1,2,7))
+    
+    @property
+    def value_date_parts(self):
+        '''
+        :returns: Integer array of shape (n,7). See :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        return(get_date_parts(self._get_datetime_value_()))
         
     def get_grouping(self,grouping):
         ## map date parts to index positions in date part storage array and flip
@@ -19,86 +243,64 @@ class TemporalDimension(base.VectorDimension):
         group_map = dict(zip(range(0,7),self._date_parts,))
         group_map_rev = dict(zip(self._date_parts,range(0,7),))
         
-        ## this array will hold the value data constructed differently depending
-        ## on if temporal bounds are present
-        value = np.empty((self.value.shape[0],3),dtype=object)
-        
-        ## reference the value and bounds datetime object arrays
-        value_datetime = self._get_datetime_value_()
-        value_datetime_bounds = self._get_datetime_bounds_()
-        
-        ## populate the value array depending on the presence of bounds
-        if self.bounds is None:
-            value[:,:] = value_datetime.reshape(-1,1)
-        else:
-            value[:,0] = value_datetime_bounds[:,0]
-            value[:,1] = value_datetime
-            value[:,2] = value_datetime_bounds[:,1]
-        
-        def _get_attrs_(dt):
-            return([dt.year,dt.month,dt.day,dt.hour,dt.minute,dt.second,dt.microsecond])
-        
         ## extract the date parts
-        parts = np.empty((len(self.value),len(self._date_parts)),dtype=int)
-        for row in range(parts.shape[0]):
-            parts[row,:] = _get_attrs_(value[row,1])
+        parts = self.value_date_parts
         
         ## grouping is different for date part combinations v. seasonal
         ## aggregation.
         if isinstance(grouping[0],basestring):
-            unique = deque()
-            for idx in range(parts.shape[1]):
-                if group_map[idx] in grouping:
-                    fill = np.unique(parts[:,idx])
-                else:
-    #                fill = np.array([0])
-                    fill = [None]
-                unique.append(fill)
-    
-            select = deque()
-            idx2_seq = range(len(self._date_parts))
-            for idx in itertools.product(*[range(len(u)) for u in unique]):
-                select.append([unique[idx2][idx[idx2]] for idx2 in idx2_seq])
-            select = np.array(select)
-            dgroups = deque()
-            
-            idx_cmp = [group_map_rev[group] for group in grouping]
-                
-            keep_select = []
-            for idx in range(select.shape[0]):
-                match = select[idx,idx_cmp] == parts[:,idx_cmp]
-                dgrp = match.all(axis=1)
-                if dgrp.any():
-                    keep_select.append(idx)
-                    dgroups.append(dgrp)
-            select = select[keep_select,:]
-            assert(len(dgroups) == select.shape[0])
-            
+            ## groups are labeled by their unique date part combinations ordered by
+            ## date part position
+            idx_cmp = sorted([group_map_rev[group] for group in grouping])
+            labels,unique = get_labels(parts[:,idx_cmp])
+            select = np.empty((unique.shape[0],len(self._date_parts)),dtype=object)
+            for ii,idx in enumerate(idx_cmp):
+                select[:,idx] = unique[:,ii].tolist()
             dtype = [(dp,object) for dp in self._date_parts]
+            ngroups = unique.shape[0]
         ## this is for seasonal aggregations
         else:
-            dgroups = deque()
-            for group in grouping:
-                subgroup = np.zeros(value.shape[0],dtype=bool)
-                for idx in range(value.shape[0]):
-                    if parts[idx,1] in group:
-                        subgroup[idx] = True
-                dgroups.append(subgroup)
+            labels = get_season_labels(parts[:,1],grouping)
             dtype = [('months',object)]
+            ngroups = len(grouping)
         
-        ## init arrays to hold values and bounds for the grouped data
+        ## the time indices of each group. seasons sharing months are not labeled.
+        if labels is None:
+            members = [np.nonzero(np.in1d(parts[:,1],group))[0] for group in grouping]
+            dgroups = TemporalGroupIndex.from_members(members,parts.shape[0])
+        else:
+            dgroups = TemporalGroupIndex.from_labels(labels,ngroups)
+        
+        ## the bounds of each group are the minimum and maximum of the lower and
+        ## upper datetimes of its members
+        bounds_date_parts = self.bounds_date_parts
+        if bounds_date_parts is None:
+            bounds_parts = [parts,parts]
+        else:
+            bounds_parts = [bounds_date_parts[:,0,:],bounds_date_parts[:,1,:]]
+        bounds_keys = [get_date_parts_key(bp) for bp in bounds_parts]
+        
+        ## init arrays to hold values and bounds indices for the grouped data
         new_value = np.empty((len(dgroups),),dtype=dtype)
-        new_bounds = np.empty((len(dgroups),2),dtype=object)
+        bounds_idx = np.empty((len(dgroups),2),dtype=np.int64)
         
-        for idx,dgrp in enumerate(dgroups):
+        for idx in range(len(dgroups)):
+            member = dgroups.get_indices(idx)
             ## tuple conversion is required for structure arrays: http://docs.scipy.org/doc/numpy/user/basics.rec.html#filling-structured-arrays
             try:
                 new_value[idx] = tuple(select[idx])
             ## likely a seasonal aggregation with a different group representation
             except UnboundLocalError:
                 new_value[idx] = (grouping[idx],)
-            sel = value[dgrp][:,(0,2)]
-            new_bounds[idx,:] = [sel.min(),sel.max()]
+            if member.shape[0] == 0:
+                ocgis_lh(logger='interface.temporal',exc=ValueError('No time steps found for group: {0}'.format(new_value[idx])))
+            bounds_idx[idx,0] = member[np.argmin(bounds_keys[0][member])]
+            bounds_idx[idx,1] = member[np.argmax(bounds_keys[1][member])]
+        
+        ## datetimes are only created for the selected bounds
+        new_bounds = np.empty((len(dgroups),2),dtype=object)
+        for ii in range(2):
+            new_bounds[:,ii] = self._get_grouping_bounds_datetime_(bounds_parts[ii],bounds_idx[:,ii],ii)
         
         new_bounds = np.atleast_2d(new_bounds).reshape(-1,2)
         date_parts = np.atleast_1d(new_value)
@@ -123,12 +325,8 @@ class TemporalDimension(base.VectorDimension):
     def get_time_region(self,time_region,return_indices=False):
         assert(isinstance(time_region,dict))
         
-        ## return the values to use for the temporal region subsetting.
-        value = self._get_datetime_value_()
-        bounds = self._get_datetime_bounds_()
-        
         ## switch to indicate if bounds or centroid datetimes are to be used.
-        use_bounds = False if bounds is None else True
+        use_bounds = False if self.bounds is None else True
         
         ## remove any none values in the time_region dictionary. this will save
         ## time in iteration.
@@ -136,40 +334,43 @@ class TemporalDimension(base.VectorDimension):
         time_region = {k:v for k,v in time_region.iteritems() if v is not None}
         assert(len(time_region) > 0)
         
-        ## this is the boolean selection array.
-        select = np.zeros(self.shape[0],dtype=bool)
-        
-        ## for each row, determine if the date criterion are met updating the
-        ## select matrix accordingly.
-        row_check = np.zeros(len(time_region),dtype=bool)
+        ## extract the date parts once for all rows
+        if use_bounds:
+            bounds_date_parts = self.bounds_date_parts
+            parts_lower = bounds_date_parts[:,0,:]
+            parts_upper = bounds_date_parts[:,1,:]
+        else:
+            parts = self.value_date_parts
         
-        for idx_row in range(select.shape[0]):
-            ## do the comparison for each time_region element.
+        ## this is the boolean selection array. rows must meet each date criterion.
+        select = np.ones(self.shape[0],dtype=bool)
+        for k,v in time_region.iteritems():
+            idx = self._date_parts.index(k)
             if use_bounds:
-                row = bounds[idx_row,:]
+                ## a row is included if any element falls within its bounds. the
+                ## upper bound is exclusive unless the bounds share the date part.
+                lower,upper = parts_lower[:,idx],parts_upper[:,idx]
+                elements = np.array(v).reshape(-1,1)
+                fill = np.logical_and(elements >= lower,
+                                      np.where(lower != upper,elements < upper,elements <= upper))
+                fill = fill.any(axis=0)
             else:
-                row = value[idx_row]
-            for ii,(k,v) in enumerate(time_region.iteritems()):
-                if use_bounds:
-                    to_include = []
-                    for element in v:
-                        kwds = {k:element}
-                        to_include.append(get_is_date_between(row[0],row[1],**kwds))
-                    fill = any(to_include)
-                else:
-                    part = getattr(row,k)
-                    fill = True if part in v else False
-                row_check[ii] = fill
-            if row_check.all():
-                select[idx_row] = True
+                fill = np.in1d(parts[:,idx],v)
+            select = np.logical_and(select,fill)
                 
         if not select.any():
             ocgis_lh(logger='nc.temporal',exc=EmptySubsetError(origin='temporal'))
 
-        ret = self[select]
+        ## a single contiguous run is selected with a slice. otherwise, source reads
+        ## group the selected indices into contiguous runs.
+        raw_idx = np.nonzero(select)[0]
+        runs = get_contiguous_runs(raw_idx)
+        if len(runs) == 1:
+            ret = self[slice(*runs[0])]
+        else:
+            ret = self[raw_idx]
         
         if return_indices:
-            raw_idx = np.arange(0,self.shape[0])[select]
             ret = (ret,raw_idx)
         
         return(ret)
@@ -184,6 +385,25 @@ class TemporalDimension(base.VectorDimension):
         value. For example, netCDF times are floats that must be converted.'''
         return(self.value)
     
+    def _get_grouping_bounds_datetime_(self,parts,idx,column):
+        '''
+        :param parts: Date parts of the lower or upper bounds.
+        :type parts: :class:`numpy.ndarray`
+        :param idx: Row indices of the group bounds.
+        :type idx: :class:`numpy.ndarray`
+        :param int column: The bounds column (0 for lower, 1 for upper).
+        :returns: An object array of datetimes for the selected rows.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        ret = get_datetime_from_parts(parts[idx])
+        ## dates not in the gregorian calendar are taken from the datetime arrays
+        if ret is None:
+            if self.bounds is None:
+                ret = self._get_datetime_value_()[idx]
+            else:
+                ret = self._get_datetime_bounds_()[idx,column]
+        return(ret)
+    
     def _get_grouping_representative_datetime_(self,grouping,bounds,value):
         ref_value = value
         ref_bounds = bounds
@@ -259,6 +479,9 @@ class TemporalGroupDimension(TemporalDimension):
     def __init__(self,*args,**kwds):
         self.grouping = kwds.pop('grouping')
         self.dgroups = kwds.pop('dgroups')
+        ## sequences of boolean masks are converted to an index
+        if not isinstance(self.dgroups,TemporalGroupIndex):
+            self.dgroups = TemporalGroupIndex.from_masks(self.dgroups)
         self.date_parts = kwds.pop('date_parts')
                 
         TemporalDimension.__init__(self,*args,**kwds)
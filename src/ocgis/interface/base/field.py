@@ -1,8 +1,8 @@
 from ocgis.util.helpers import get_default_or_apply, get_none_or_slice,\
-    get_formatted_slice, get_reduced_slice, assert_raise
+    get_formatted_slice, get_contiguous_runs, assert_raise, get_weighted_average
 import numpy as np
 from copy import copy, deepcopy
-from collections import deque
+from collections import deque, OrderedDict
 import itertools
 from shapely.ops import cascaded_union
 from shapely.geometry.multipoint import MultiPoint
@@ -13,6 +13,15 @@ from shapely.geometry.point import Point
 from ocgis.exc import ImproperPolygonBoundsError
 import logging
 from ocgis.util.logging_ocgis import ocgis_lh
+from ocgis.util.cache import OcgCache
+from shapely import wkb
+import hashlib
+
+
+## overlap weights and aggregated geometries for clip and aggregate operations. the
+## in-process cache is used whether or not a cache directory is set.
+_weights_cache = OcgCache('clip_weights')
+_weights_memory = OrderedDict()
         
 
 class Field(object):
@@ -74,14 +83,73 @@ class Field(object):
         ref = getattr(self,dim)
         ## TODO: minor redundancy in slicing and returning dimension
         new_dim,indices = ref.get_between(lower,upper,return_indices=True)
-        slc = get_reduced_slice(indices)
+        ## monotonic dimensions return a contiguous selection read from source as a
+        ## single hyperslab
+        runs = get_contiguous_runs(indices)
+        if len(runs) == 1:
+            slc = slice(*runs[0])
+        else:
+            slc = indices
         slc_field = [slice(None)]*5
         slc_field[pos] = slc
         ret = self[slc_field]
         return(ret)
     
-    def get_clip(self,polygon):
-        return(self._get_spatial_operation_('get_clip',polygon))
+    def get_clip(self,polygon,return_indices=False):
+        return(self._get_spatial_operation_('get_clip',polygon,return_indices=return_indices))
+    
+    def get_clip_aggregated(self,polygon,new_spatial_uid=None):
+        '''
+        Clip the field by ``polygon`` and spatially aggregate the result. The cell
+        selection, overlap weights, and aggregated geometries are cached in memory
+        and, if :attr:`ocgis.env.DIR_CACHE` is set, on disk. The cache is keyed by
+        the spatial dimension's fingerprint and the polygon. Repeated requests against
+        the same grid skip clipping. For cached requests, the clip mask and overlap
+        weights are set on the spatial dimension of the raw field so values loaded
+        later are masked and weighted as for a clip.
+        
+        :param polygon: The selection geometry.
+        :type polygon: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+        :param int new_spatial_uid: See :meth:`~ocgis.interface.base.field.Field.get_spatially_aggregated`.
+        :rtype: :class:`~ocgis.interface.base.field.Field`
+        :raises: EmptySubsetError
+        '''
+        key = (self.spatial.get_fingerprint(),hashlib.sha1(polygon.wkb).hexdigest())
+        try:
+            entry = _weights_memory.pop(key)
+        except KeyError:
+            entry = _weights_cache.get(key)
+        if entry is None:
+            clipped,slc = self.get_clip(polygon,return_indices=True)
+            ret = clipped.get_spatially_aggregated(new_spatial_uid=new_spatial_uid)
+            ## store only the weights of selected cells
+            weights = clipped.spatial.weights
+            rows,cols = np.nonzero(np.invert(np.ma.getmaskarray(weights)))
+            geoms = {}
+            for attr in ['point','polygon']:
+                try:
+                    geoms[attr] = getattr(ret.spatial.geom,attr).value[0,0].wkb
+                except (AttributeError,ImproperPolygonBoundsError):
+                    geoms[attr] = None
+            entry = {'slc':[(s.start,s.stop,s.step) for s in slc],'shape':weights.shape,'rows':rows,
+                     'cols':cols,'weights':weights.data[rows,cols],'geoms':geoms}
+            _weights_cache.set(key,entry)
+        else:
+            ocgis_lh(msg='using cached clip weights',logger='field',level=logging.DEBUG)
+            sub = self[:,:,:,slice(*entry['slc'][0]),slice(*entry['slc'][1])]
+            mask = np.ones(entry['shape'],dtype=bool)
+            mask[entry['rows'],entry['cols']] = False
+            weights = np.ma.array(np.zeros(entry['shape'],dtype=entry['weights'].dtype),mask=mask)
+            weights[entry['rows'],entry['cols']] = entry['weights']
+            ## values are masked when loaded using the spatial dimension's mask
+            sub.spatial = sub.spatial.get_masked(mask,weights=weights)
+            self._set_new_value_mask_(sub,mask)
+            geoms = dict([(k,None if v is None else wkb.loads(v)) for k,v in entry['geoms'].iteritems()])
+            ret = sub.get_spatially_aggregated(new_spatial_uid=new_spatial_uid,geoms=geoms)
+        _weights_memory[key] = entry
+        while len(_weights_memory) > constants.clip_weights_cache_size:
+            _weights_memory.popitem(last=False)
+        return(ret)
     
     def get_intersects(self,polygon):
         return(self._get_spatial_operation_('get_intersects',polygon))
@@ -161,21 +229,35 @@ class Field(object):
         ret.variables = variables
         return(ret)
     
-    def _get_spatial_operation_(self,attr,polygon):
+    def _get_spatial_operation_(self,attr,polygon,return_indices=False):
         ref = getattr(self.spatial,attr)
         ret = copy(self)
         ret.spatial,slc = ref(polygon,return_indices=True)
-        slc = [slice(None),slice(None),slice(None)] + list(slc)
-        ret.variables = self.variables._get_sliced_variables_(slc)
+        ret.variables = self.variables._get_sliced_variables_([slice(None),slice(None),slice(None)] + list(slc))
 
         ## we need to update the value mask with the geometry mask
         self._set_new_value_mask_(ret,ret.spatial.get_mask())
         
+        if return_indices:
+            ret = (ret,slc)
         return(ret)
     
-    def get_spatially_aggregated(self,new_spatial_uid=None):
+    def get_spatially_aggregated(self,new_spatial_uid=None,geoms=None):
+        '''
+        :param int new_spatial_uid: The unique identifier of the aggregated geometry.
+        :param dict geoms: Precomputed aggregated geometries with keys "point" and
+         "polygon". The union of the geometries is skipped.
+        :rtype: :class:`~ocgis.interface.base.field.Field`
+        '''
+        
+        geoms = geoms or {}
 
-        def _get_geometry_union_(value):
+        def _get_geometry_union_(dim,key):
+            if geoms.get(key) is not None:
+                ret = np.ma.array([[None]],mask=False,dtype=object)
+                ret[0,0] = geoms[key]
+                return(ret)
+            value = dim.value
             to_union = [geom for geom in value.compressed().flat]
             processed_to_union = deque()
             for geom in to_union:
@@ -194,23 +276,30 @@ class Field(object):
             ret[0,0] = unioned
             return(ret)
         
+        def _get_aggregated_dimension_(dim,key):
+            ret = copy(dim)
+            ret._value = _get_geometry_union_(dim,key)
+            ret._mask = None
+            ret._interior = None
+            ret.uid = new_spatial_uid
+            return(ret)
+        
         ret = copy(self)
-        ## the spatial dimension needs to be deep copied so the grid may be
-        ## dereferenced.
-        ret.spatial = deepcopy(self.spatial)
+        ## the spatial and geometry dimensions are shallow copied so the grid may be
+        ## dereferenced. the source geometry arrays are not copied.
+        ret.spatial = copy(self.spatial)
+        ret.spatial._geom = copy(self.spatial.geom)
+        ret.spatial._weights = None
+        ref_geom = ret.spatial._geom
         ## this is the new spatial identifier for the spatial dimension.
         new_spatial_uid = new_spatial_uid or 1
         ## aggregate the geometry containers if possible.
-        if ret.spatial.geom.point is not None:
-            unioned = _get_geometry_union_(ret.spatial.geom.point.value)
-            ret.spatial.geom.point._value = unioned
-            ret.spatial.geom.point.uid = new_spatial_uid
+        if ref_geom.point is not None:
+            ref_geom._point = _get_aggregated_dimension_(ref_geom.point,'point')
             
         try:
-            if ret.spatial.geom.polygon is not None:
-                unioned = _get_geometry_union_(ret.spatial.geom.polygon.value)
-                ret.spatial.geom.polygon._value = _get_geometry_union_(ret.spatial.geom.polygon.value)
-                ret.spatial.geom.polygon.uid = new_spatial_uid
+            if ref_geom.polygon is not None:
+                ref_geom._polygon = _get_aggregated_dimension_(ref_geom.polygon,'polygon')
         except ImproperPolygonBoundsError:
             msg = 'No polygon representation to aggregate.'
             ocgis_lh(msg=msg,logger='field',level=logging.WARN)
@@ -224,18 +313,15 @@ class Field(object):
         shp = list(ret.shape)
         shp[-2] = 1
         shp[-1] = 1
-        itrs = [range(dim) for dim in shp[0:3]]
         weights = self.spatial.weights
-        ref_average = np.ma.average
         
         ## old values for the variables will be stored in the _raw container, but
         ## to avoid reference issues, we need to copy the variables
         new_variables = []
         for variable in ret.variables.itervalues():
             r_value = variable.value
-            fill = np.ma.array(np.zeros(shp),mask=False,dtype=variable.value.dtype)
-            for idx_r,idx_t,idx_l in itertools.product(*itrs):
-                fill[idx_r,idx_t,idx_l] = ref_average(r_value[idx_r,idx_t,idx_l],weights=weights)
+            fill = np.ma.array(np.zeros(shp),mask=False,dtype=r_value.dtype)
+            fill[:,:,:,0,0] = get_weighted_average(r_value,weights)
             new_variable = copy(variable)
             new_variable._value = fill
             new_variables.append(new_variable)
@@ -254,18 +340,14 @@ class Field(object):
         ## TODO: remember to apply the geometry mask to fresh values!!
 
     def _set_new_value_mask_(self,field,mask):
-        ret_shp = field.shape
-        rng_realization = range(ret_shp[0])
-        rng_temporal = range(ret_shp[1])
-        rng_level = range(ret_shp[2])
-        ref_logical_or = np.logical_or
-        
+        ## the two-dimensional spatial mask is broadcast across the realization,
+        ## temporal, and level dimensions.
         for var in field.variables.itervalues():
             if var._value is not None:
                 v = var._value
-                for idx_r,idx_t,idx_l in itertools.product(rng_realization,rng_temporal,rng_level):
-                    ref = v[idx_r,idx_t,idx_l]
-                    ref.mask = ref_logical_or(ref.mask,mask)
+                if np.ma.getmask(v) is np.ma.nomask:
+                    v.mask = np.ma.make_mask_none(v.shape)
+                np.logical_or(v.mask,mask,out=v.mask)
                     
     def _get_variable_iter_yield_(self,variable):
         yld = {}
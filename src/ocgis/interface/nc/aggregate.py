@@ -0,0 +1,293 @@
+from collections import OrderedDict
+from copy import deepcopy
+import netCDF4 as nc
+import numpy as np
+from ocgis import constants
+from ocgis.util.cache import OcgCache, get_file_signature
+from ocgis.util.helpers import get_hyperslab_value
+
+
+## per-file time values and dimension lengths. the in-process cache is used
+## whether or not a cache directory is set.
+_index_cache = OcgCache('nc_time_index')
+_index_memory = OrderedDict()
+
+
+class NcAggregatedDataset(object):
+    '''
+    A read-only virtual dataset concatenating files along their time dimension.
+    This replaces :class:`netCDF4.MFDataset` and supports all netCDF formats.
+
+    * The aggregation dimension is the unlimited dimension of the first file or
+      the dimension named "time".
+    * Metadata, attributes, and variables without the aggregation dimension are
+      taken from the first file.
+    * Time coordinate and bounds values are converted to the units of the first
+      file. These are read from a per-file time index which is held in memory by
+      the process and persisted if :attr:`ocgis.env.DIR_CACHE` is set. Building
+      the index for a file not yet indexed opens it once.
+    * Files are opened when a read touches their portion of the aggregation
+      dimension. Files outside a time subset are never opened for reads.
+
+    >>> ds = NcAggregatedDataset(['/path/to/tas_2001.nc','/path/to/tas_2002.nc'])
+    >>> ds.variables['tas'][0:10,:,:]
+    >>> ds.close()
+
+    :param uris: Paths to the files in time order.
+    :type uris: sequence
+    :raises: ValueError
+    '''
+
+    def __init__(self,uris):
+        self.uris = list(uris)
+        self._files = {}
+
+        first = self._get_file_(0)
+        self.dimension = get_aggregation_dimension(first)
+        if self.dimension is None:
+            raise(ValueError('No unlimited or "time" dimension found to aggregate: {0}'.format(self.uris[0])))
+        self.index = get_time_index(self.uris,self.dimension,first=first)
+        lengths = [i['length'] for i in self.index]
+        self.offsets = np.cumsum([0]+lengths)
+
+        self.dimensions = OrderedDict()
+        for key,value in first.dimensions.iteritems():
+            if key == self.dimension:
+                value = NcAggregatedDimension(key,self.offsets[-1])
+            self.dimensions[key] = value
+
+        self.variables = OrderedDict()
+        for key,value in first.variables.iteritems():
+            if self.dimension in value.dimensions:
+                value = NcAggregatedVariable(self,value)
+            self.variables[key] = value
+
+    def __getattr__(self,name):
+        if name.startswith('_'):
+            raise(AttributeError(name))
+        ## global attributes and the file format are taken from the first file
+        return(getattr(self._get_file_(0),name))
+
+    def close(self):
+        '''
+        Close all opened files.
+        '''
+        for ds in self._files.itervalues():
+            ds.close()
+        self._files = {}
+
+    def get_file_indices(self,indices):
+        '''
+        :param indices: Indices along the aggregation dimension.
+        :type indices: :class:`numpy.ndarray`
+        :returns: The position in :attr:`uris` of the file containing each index.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        return(np.searchsorted(self.offsets[1:],indices,side='right'))
+
+    def _get_file_(self,idx):
+        try:
+            ret = self._files[idx]
+        except KeyError:
+            ret = nc.Dataset(self.uris[idx],'r')
+            self._files[idx] = ret
+        return(ret)
+
+
+class NcAggregatedDimension(object):
+
+    def __init__(self,name,length):
+        self._name = name
+        self._length = int(length)
+
+    def __len__(self):
+        return(self._length)
+
+    def isunlimited(self):
+        return(True)
+
+
+class NcAggregatedVariable(object):
+    '''
+    A variable of :class:`~ocgis.interface.nc.aggregate.NcAggregatedDataset` with the
+    aggregation dimension. Reads are routed to the files containing the requested
+    indices and concatenated.
+
+    :param dataset: The aggregated dataset.
+    :type dataset: :class:`~ocgis.interface.nc.aggregate.NcAggregatedDataset`
+    :param variable: The variable from the first file.
+    :type variable: :class:`netCDF4.Variable`
+    '''
+
+    def __init__(self,dataset,variable):
+        self._dataset = dataset
+        self._variable = variable
+        self._name = variable._name
+        self.dimensions = variable.dimensions
+        self.shape = tuple([len(dataset.dimensions[d]) for d in self.dimensions])
+        self.ndim = len(self.shape)
+        self._axis = self.dimensions.index(dataset.dimension)
+
+        ## time values are read from the converted time index
+        time_variable = dataset._get_file_(0).variables.get(dataset.dimension)
+        if self._name == dataset.dimension:
+            self._key = 'value'
+        elif time_variable is not None and self._name in [getattr(time_variable,a,None) for a in ['bounds','climatology']]:
+            self._key = 'bounds'
+        else:
+            self._key = None
+
+    def __getattr__(self,name):
+        if name.startswith('__'):
+            raise(AttributeError(name))
+        return(getattr(self.__dict__['_variable'],name))
+
+    def __getitem__(self,slc):
+        if not isinstance(slc,tuple):
+            slc = (slc,)
+        slc = list(slc)+[slice(None)]*(self.ndim-len(slc))
+        ## integer indices are read as slices and their axes removed
+        squeeze = []
+        for ii,s in enumerate(slc):
+            if isinstance(s,(int,long,np.integer)):
+                s = int(s)
+                if s < 0:
+                    s += self.shape[ii]
+                slc[ii] = slice(s,s+1)
+                squeeze.append(ii)
+            elif not isinstance(s,slice):
+                slc[ii] = np.atleast_1d(s)
+
+        tidx = slc[self._axis]
+        if isinstance(tidx,slice):
+            tidx = np.arange(*tidx.indices(self.shape[self._axis]))
+        file_idx = self._dataset.get_file_indices(tidx)
+
+        ## read runs of indices from the same file
+        pieces = []
+        breaks = np.nonzero(np.diff(file_idx) != 0)[0]+1
+        for start,stop in zip(np.concatenate(([0],breaks)),np.concatenate((breaks,[tidx.shape[0]]))):
+            if start == stop:
+                continue
+            idx = file_idx[start]
+            local = slc[:]
+            local[self._axis] = tidx[start:stop]-self._dataset.offsets[idx]
+            pieces.append(get_hyperslab_value(self._get_source_(idx),local))
+
+        if len(pieces) == 0:
+            shape = [0 if ii == self._axis else get_index_size(s,self.shape[ii])
+                     for ii,s in enumerate(slc)]
+            ret = np.empty(shape,dtype=self.dtype)
+        elif any([isinstance(p,np.ma.MaskedArray) for p in pieces]):
+            ret = np.ma.concatenate(pieces,axis=self._axis)
+        else:
+            ret = np.concatenate(pieces,axis=self._axis)
+        if len(squeeze) > 0:
+            ret = ret.reshape([n for ii,n in enumerate(ret.shape) if ii not in squeeze])
+        return(ret)
+
+    def _get_source_(self,idx):
+        if self._key is not None:
+            ret = self._dataset.index[idx][self._key]
+            if ret is not None:
+                return(ret)
+        return(self._dataset._get_file_(idx).variables[self._name])
+
+
+def get_index_size(idx,length):
+    if isinstance(idx,slice):
+        ret = len(xrange(*idx.indices(length)))
+    else:
+        ret = len(idx)
+    return(ret)
+
+
+def get_aggregation_dimension(ds):
+    '''
+    :param ds: An open dataset.
+    :type ds: :class:`netCDF4.Dataset`
+    :returns: The name of the unlimited dimension or "time" if present.
+    :rtype: str
+    '''
+    ret = None
+    for key,value in ds.dimensions.iteritems():
+        if value.isunlimited():
+            ret = key
+            break
+    if ret is None and 'time' in ds.dimensions:
+        ret = 'time'
+    return(ret)
+
+
+def get_time_index(uris,dimension,first=None):
+    '''
+    :param uris: Paths to the files in time order.
+    :type uris: sequence
+    :param str dimension: The aggregation dimension name.
+    :param first: The open first file.
+    :type first: :class:`netCDF4.Dataset`
+    :returns: A dictionary for each file with the dimension length and, if a time
+     coordinate variable exists, time values and bounds converted to the units of
+     the first file.
+    :rtype: list
+    '''
+    ret = []
+    for ii,uri in enumerate(uris):
+        signature = get_file_signature(uri)
+        key = (signature,dimension)
+        entry = None
+        if signature is not None:
+            try:
+                entry = _index_memory.pop(key)
+                _index_memory[key] = entry
+            except KeyError:
+                entry = _index_cache.get(key)
+        if entry is None:
+            ds = first if ii == 0 and first is not None else nc.Dataset(uri,'r')
+            try:
+                entry = get_file_time_index(ds,dimension)
+            finally:
+                if ds is not first:
+                    ds.close()
+            if signature is not None:
+                _index_cache.set(key,entry)
+        if signature is not None:
+            _index_memory[key] = entry
+            while len(_index_memory) > constants.nc_time_index_cache_size:
+                _index_memory.popitem(last=False)
+        ## entries are modified by the units conversion
+        ret.append(deepcopy(entry))
+
+    ## convert time values to the units of the first file
+    units,calendar = ret[0]['units'],ret[0]['calendar']
+    for entry in ret[1:]:
+        if entry['units'] is not None and units is not None and entry['units'] != units:
+            for key in ['value','bounds']:
+                if entry[key] is not None:
+                    dates = nc.num2date(entry[key],entry['units'],calendar=entry['calendar'])
+                    entry[key] = nc.date2num(dates,units,calendar=calendar)
+            entry['units'] = units
+    return(ret)
+
+
+def get_file_time_index(ds,dimension):
+    '''
+    :returns: The time index entry for a single file. See :func:`~ocgis.interface.nc.aggregate.get_time_index`.
+    :rtype: dict
+    '''
+    ret = {'length':len(ds.dimensions[dimension]),'value':None,'bounds':None,
+           'units':None,'calendar':None}
+    try:
+        var = ds.variables[dimension]
+    except KeyError:
+        return(ret)
+    ret['value'] = var[:]
+    ret['units'] = getattr(var,'units',None)
+    ret['calendar'] = getattr(var,'calendar','standard')
+    for attr in ['bounds','climatology']:
+        try:
+            ret['bounds'] = ds.variables[getattr(var,attr)][:]
+            break
+        except (AttributeError,KeyError):
+            continue
+    return(ret)
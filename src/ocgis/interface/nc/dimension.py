@@ -1,6 +1,6 @@
 from ocgis.interface.base.dimension.base import VectorDimension
 from ocgis.util.logging_ocgis import ocgis_lh
-from ocgis.util.helpers import get_reduced_slice
+from ocgis.util.helpers import get_hyperslab_value
 import logging
 
 
@@ -21,18 +21,16 @@ class NcVectorDimension(VectorDimension):
                     var = self._src_idx + 1
                 else:
                     ocgis_lh(logger='interface.nc',exc=e)
-            # format the slice
-#            slc = get_reduced_slice(self._src_idx)
-            ## set the value
-            self._value = var.__getitem__(self._src_idx)
+            ## set the value reading contiguous runs of the source indices
+            self._value = get_hyperslab_value(var,[self._src_idx])
             ## now, we should check for bounds here as the inheritance for making
             ## this process more transparent is not in place.
             bounds_name = self._data._source_metadata['dim_map'][self._axis].get('bounds')
             if bounds_name is not None:
                 try:
-                    self.bounds = ds.variables[bounds_name][self._src_idx,:]
+                    self.bounds = get_hyperslab_value(ds.variables[bounds_name],[self._src_idx,slice(None)])
                 except ValueError as e:
-                    shape = ds.variables[bounds_name]
+                    shape = ds.variables[bounds_name].shape
                     if len(shape) != 2 or shape[1] != 2:
                         msg = 'The bounds variable "{0}" has an improper shape "{1}". Bounds variables should have dimensions (m,2).'.format(bounds_name,shape)
                         ocgis_lh(msg=msg,logger='interface.nc',level=logging.WARN)
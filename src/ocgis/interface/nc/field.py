@@ -2,6 +2,7 @@ from ocgis.interface.base.field import Field
 import numpy as np
 from copy import deepcopy
 from ocgis.util.logging_ocgis import ocgis_lh
+from ocgis.util.helpers import get_hyperslab_value
 
 
 class NcField(Field):
@@ -42,7 +43,8 @@ class NcField(Field):
         ds = data._open_()
         try:
             try:
-                raw = ds.variables[variable_name].__getitem__(slc)
+                ## non-contiguous source indices are read as hyperslabs
+                raw = get_hyperslab_value(ds.variables[variable_name],slc)
             except IndexError:
                 ocgis_lh(logger='nc.field',exc=IndexError('variable: {0}'.format(variable_name)))
             if not isinstance(raw,np.ma.MaskedArray):
@@ -0,0 +1,236 @@
+import os
+from collections import OrderedDict
+import netCDF4 as nc
+from ocgis import env
+from ocgis.interface.nc.aggregate import NcAggregatedDataset
+
+
+class NcDatasetPool(object):
+    '''
+    A bounded least-recently-used pool of open :class:`netCDF4.Dataset` and
+    :class:`~ocgis.interface.nc.aggregate.NcAggregatedDataset` objects keyed by URI.
+
+    * Handles are never shared across processes. If the pool is accessed from a
+      different process (i.e. following a fork), inherited handles are discarded
+      without being closed.
+    * A handle is reopened if the size, modification time, or inode of its
+      source file(s) changes.
+    * Handles in use are never closed by eviction. Only idle handles count
+      against the pool size.
+
+    >>> ds = nc_pool.open('/path/to/file.nc')
+    >>> ds.variables['tas']
+    >>> ## return the handle to the pool
+    >>> ds.close()
+
+    :param size: The maximum number of idle handles to keep open. If None, use
+     :attr:`ocgis.env.NC_POOL_SIZE`. If less than one, handles are not pooled.
+    :type size: int
+    '''
+
+    def __init__(self,size=None):
+        self._size = size
+        #: Callables called with the event name ("hit", "miss", "evict", or
+        #: "invalidate") and the pool key.
+        self.hooks = []
+        self.reset()
+
+    def __len__(self):
+        self._check_process_()
+        return(len(self._storage))
+
+    @property
+    def size(self):
+        return(env.NC_POOL_SIZE if self._size is None else self._size)
+
+    def clear(self):
+        '''
+        Close all idle handles and remove all handles from the pool. Handles in
+        use are closed when they are released.
+        '''
+        self._check_process_()
+        for key in self._storage.keys():
+            self._remove_(key,'evict')
+
+    def evict(self,uri=None):
+        '''
+        Close idle handles.
+
+        :param uri: If provided, only close the handle for this URI.
+        :type uri: str or sequence
+        :returns: The number of closed handles.
+        :rtype: int
+        '''
+        self._check_process_()
+        if uri is None:
+            keys = self._storage.keys()
+        else:
+            keys = [get_pool_key(uri)]
+        ret = 0
+        for key in keys:
+            entry = self._storage.get(key)
+            if entry is not None and entry['count'] == 0:
+                self._remove_(key,'evict')
+                ret += 1
+        return(ret)
+
+    def get_stats(self):
+        '''
+        :returns: A dictionary of hit, miss, eviction, and invalidation counts
+         with the hit rate and the number of open handles.
+        :rtype: dict
+        '''
+        self._check_process_()
+        ret = self.stats.copy()
+        total = ret['hits'] + ret['misses']
+        ret['hit_rate'] = 0.0 if total == 0 else float(ret['hits'])/total
+        ret['open'] = len(self._storage)
+        return(ret)
+
+    def open(self,uri):
+        '''
+        :param uri: The path or URL to the dataset. Sequences are opened as a
+         :class:`~ocgis.interface.nc.aggregate.NcAggregatedDataset`.
+        :type uri: str or sequence
+        :returns: A dataset. Calling its ``close`` method returns the handle to
+         the pool.
+        :rtype: :class:`~ocgis.interface.nc.pool.PooledDataset`
+        '''
+        self._check_process_()
+
+        ## pooling is disabled
+        if self.size < 1:
+            return(open_dataset(uri))
+
+        key = get_pool_key(uri)
+        signature = get_signature(uri)
+        entry = self._storage.get(key)
+        if entry is not None and entry['signature'] != signature:
+            self._remove_(key,'invalidate')
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            self._notify_('miss',key)
+            entry = {'dataset':open_dataset(uri),'signature':signature,'count':0,
+                     'orphaned':False,'pid':self._pid}
+            self._storage[key] = entry
+        else:
+            self.stats['hits'] += 1
+            self._notify_('hit',key)
+            ## move to the most recently used position
+            self._storage[key] = self._storage.pop(key)
+        entry['count'] += 1
+
+        self._evict_excess_()
+
+        return(PooledDataset(self,entry))
+
+    def release(self,entry):
+        '''
+        Return a handle to the pool. This is called by :meth:`~ocgis.interface.nc.pool.PooledDataset.close`.
+        '''
+        ## the handle was opened in a different process
+        if entry['pid'] != os.getpid():
+            return
+        entry['count'] -= 1
+        if entry['orphaned'] and entry['count'] == 0:
+            entry['dataset'].close()
+        else:
+            self._evict_excess_()
+
+    def reset(self):
+        '''
+        Discard all handles without closing them and reset the statistics.
+        '''
+        self._pid = os.getpid()
+        self._storage = OrderedDict()
+        self.stats = {'hits':0,'misses':0,'evictions':0,'invalidations':0}
+
+    def _check_process_(self):
+        ## handles inherited from a parent process are not usable. they belong to
+        ## the parent and are not closed here.
+        if os.getpid() != self._pid:
+            self.reset()
+
+    def _evict_excess_(self):
+        idle = [k for k,v in self._storage.iteritems() if v['count'] == 0]
+        ## the least recently used handles are first
+        for key in idle[0:max(len(idle)-self.size,0)]:
+            self._remove_(key,'evict')
+
+    def _notify_(self,event,key):
+        for hook in self.hooks:
+            hook(event,key)
+
+    def _remove_(self,key,event):
+        entry = self._storage.pop(key)
+        if entry['count'] == 0:
+            entry['dataset'].close()
+        else:
+            entry['orphaned'] = True
+        if event == 'evict':
+            self.stats['evictions'] += 1
+        else:
+            self.stats['invalidations'] += 1
+        self._notify_(event,key)
+
+
+class PooledDataset(object):
+    '''
+    Proxy for a pooled dataset handle. Attribute access is passed to the
+    underlying dataset.
+    '''
+
+    def __init__(self,pool,entry):
+        self._pool = pool
+        self._entry = entry
+        self._closed = False
+
+    def __getattr__(self,name):
+        return(getattr(self._entry['dataset'],name))
+
+    def close(self):
+        '''
+        Release the handle to the pool. The dataset is not closed.
+        '''
+        if not self._closed:
+            self._closed = True
+            self._pool.release(self._entry)
+
+
+def get_pool_key(uri):
+    if isinstance(uri,basestring):
+        ret = uri
+    else:
+        ret = tuple(uri)
+    return(ret)
+
+
+def get_signature(uri):
+    '''
+    :returns: A tuple identifying the state of the source file(s). Remote sources
+     have no signature.
+    :rtype: tuple
+    '''
+    uris = [uri] if isinstance(uri,basestring) else uri
+    ret = []
+    for u in uris:
+        try:
+            st = os.stat(u)
+            ret.append((st.st_size,st.st_mtime,st.st_ino))
+        except OSError:
+            ret.append(None)
+    return(tuple(ret))
+
+
+def open_dataset(uri):
+    if isinstance(uri,basestring):
+        ret = nc.Dataset(uri,'r')
+    else:
+        ret = NcAggregatedDataset(uri)
+    return(ret)
+
+
+#: The process-wide dataset pool.
+nc_pool = NcDatasetPool()
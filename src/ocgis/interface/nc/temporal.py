@@ -1,25 +1,66 @@
-from ocgis.interface.base.dimension.temporal import TemporalDimension
+from ocgis.interface.base.dimension.temporal import TemporalDimension,\
+ TemporalGroupIndex, get_date_parts, get_datetime_from_parts
 from ocgis.interface.nc.dimension import NcVectorDimension
 import numpy as np
 import netCDF4 as nc
 import datetime
+import hashlib
+import re
+from collections import OrderedDict
+from ocgis import constants
 from ocgis.util.helpers import iter_array, get_none_or_slice
 
 
+## decoded date part arrays keyed by units, calendar, and a values fingerprint
+_decode_cache = OrderedDict()
+
+## microseconds in each time unit
+_unit_factors = {'microseconds':1,'microsecond':1,'us':1,
+                 'milliseconds':10**3,'millisecond':10**3,'ms':10**3,
+                 'seconds':10**6,'second':10**6,'secs':10**6,'sec':10**6,'s':10**6,
+                 'minutes':6*10**7,'minute':6*10**7,'mins':6*10**7,'min':6*10**7,
+                 'hours':36*10**8,'hour':36*10**8,'hrs':36*10**8,'hr':36*10**8,'h':36*10**8,
+                 'days':864*10**8,'day':864*10**8,'d':864*10**8}
+
+## cumulative days at the start of each month for calendars with fixed year lengths
+_month_starts = {'noleap':np.array([0,31,59,90,120,151,181,212,243,273,304,334,365]),
+                 'all_leap':np.array([0,31,60,91,121,152,182,213,244,274,305,335,366]),
+                 '360_day':np.arange(0,361,30)}
+_month_starts['365_day'] = _month_starts['noleap']
+_month_starts['366_day'] = _month_starts['all_leap']
+
+_units_regex = re.compile(r'^\s*(\w+)\s+since\s+(\d+)-(\d+)-(\d+)'
+                          r'(?:[ T]+(\d+):(\d+)(?::(\d+(?:\.\d*)?))?)?'
+                          r'\s*(?:Z|UTC|GMT|[+-]0+(?::?0+)?)?\s*$')
+
+## the start of the gregorian calendar in days since 1970-1-1
+_gregorian_start = datetime.date(1582,10,15).toordinal()-datetime.date(1970,1,1).toordinal()
+
+
 class NcTemporalDimension(NcVectorDimension,TemporalDimension):
-    _attrs_slice = ('uid','_value','_src_idx','_value_datetime')
+    _attrs_slice = ('uid','_value','_src_idx','_value_datetime','_value_date_parts')
     
     def __init__(self,*args,**kwds):
         self.calendar = kwds.pop('calendar')
         self.format_time = kwds.pop('format_time',True)
         self._value_datetime = kwds.pop('value_datetime',None)
         self._bounds_datetime = kwds.pop('bounds_datetime',None)
+        self._value_date_parts = None
+        self._bounds_date_parts = None
         
         NcVectorDimension.__init__(self,*args,**kwds)
         
         assert(self.units != None)
         assert(self.calendar != None)
         
+    @property
+    def bounds_date_parts(self):
+        if self.bounds is None:
+            return(None)
+        if self._bounds_date_parts is None:
+            self._bounds_date_parts = get_date_parts_cached(self.bounds,self.units,self.calendar)
+        return(self._bounds_date_parts)
+    
     @property
     def bounds_datetime(self):
         if self.bounds is not None:
@@ -38,6 +79,12 @@ class NcTemporalDimension(NcVectorDimension,TemporalDimension):
     def extent_datetime(self):
         return(tuple(self.get_datetime(self.extent)))
         
+    @property
+    def value_date_parts(self):
+        if self._value_date_parts is None:
+            self._value_date_parts = get_date_parts_cached(self.value,self.units,self.calendar)
+        return(self._value_date_parts)
+        
     @property
     def value_datetime(self):
         if self._value_datetime is None:
@@ -49,12 +96,7 @@ class NcTemporalDimension(NcVectorDimension,TemporalDimension):
         return(NcVectorDimension.get_between(self,lower,upper,return_indices=return_indices))
         
     def get_datetime(self,arr):
-        arr = np.atleast_1d(nc.num2date(arr,self.units,calendar=self.calendar))
-        dt = datetime.datetime
-        for idx,t in iter_array(arr,return_value=True):
-            arr[idx] = dt(t.year,t.month,t.day,
-                          t.hour,t.minute,t.second)
-        return(arr)
+        return(get_datetime_from_num(arr,self.units,self.calendar))
     
     def get_nc_time(self,values):
         ret = np.atleast_1d(nc.date2num(values,self.units,calendar=self.calendar))
@@ -63,6 +105,7 @@ class NcTemporalDimension(NcVectorDimension,TemporalDimension):
     def _format_slice_state_(self,state,slc):
         state = NcVectorDimension._format_slice_state_(self,state,slc)
         state.bounds_datetime = get_none_or_slice(state._bounds_datetime,(slc,slice(None)))
+        state._bounds_date_parts = get_none_or_slice(state._bounds_date_parts,(slc,slice(None),slice(None)))
         return(state)
     
     def _get_datetime_bounds_(self):
@@ -102,6 +145,138 @@ class NcTemporalGroupDimension(NcTemporalDimension):
     def __init__(self,*args,**kwds):
         self.grouping = kwds.pop('grouping')
         self.dgroups = kwds.pop('dgroups')
+        ## sequences of boolean masks are converted to an index
+        if not isinstance(self.dgroups,TemporalGroupIndex):
+            self.dgroups = TemporalGroupIndex.from_masks(self.dgroups)
         self.date_parts = kwds.pop('date_parts')
                 
         NcTemporalDimension.__init__(self,*args,**kwds)
+
+
+def get_datetime_from_num(arr,units,calendar):
+    '''
+    Convert numeric time values to :class:`datetime.datetime` objects truncated to
+    whole seconds. Objects are created from the date parts returned by :func:`~ocgis.interface.nc.temporal.get_date_parts_cached`
+    through :class:`numpy.datetime64`. Dates with no gregorian equivalent (i.e.
+    February 30) are converted with :func:`netCDF4.num2date`.
+    
+    :param arr: The numeric time values.
+    :type arr: :class:`numpy.ndarray`
+    :param str units: The CF time units (i.e. "days since 1900-1-1").
+    :param str calendar: The CF calendar name.
+    :returns: An object array with the shape of ``arr``.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    arr = np.atleast_1d(arr)
+    ret = None
+    if not np.ma.getmaskarray(arr).any():
+        ret = get_datetime_from_parts(get_date_parts_cached(arr,units,calendar).reshape(-1,7))
+    if ret is None:
+        ret = _get_datetime_num2date_(arr,units,calendar)
+    return(ret.reshape(arr.shape))
+
+
+def get_date_parts_cached(arr,units,calendar):
+    '''
+    Decode numeric time values to integer date parts. Common CF calendars are decoded
+    without creating objects (see :func:`~ocgis.interface.nc.temporal.get_date_parts_from_num`).
+    Other calendars and units are converted with :func:`netCDF4.num2date`. Results
+    are cached by units, calendar, and value fingerprint.
+    
+    :param arr: The numeric time values.
+    :type arr: :class:`numpy.ndarray`
+    :param str units: The CF time units.
+    :param str calendar: The CF calendar name.
+    :returns: Integer array with the shape of ``arr`` and a last dimension of seven
+     date parts (see :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`).
+     Microseconds are truncated and always zero.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    arr = np.atleast_1d(arr)
+    ## masked values are converted without caching
+    if np.ma.getmaskarray(arr).any():
+        dates = _get_datetime_num2date_(arr,units,calendar)
+        return(get_date_parts(dates.reshape(-1)).reshape(arr.shape+(7,)))
+    data = np.ascontiguousarray(np.ma.getdata(arr))
+    key = (units,calendar,data.dtype.str,data.shape,hashlib.sha1(data.view(np.uint8)).hexdigest())
+    
+    try:
+        ret = _decode_cache.pop(key)
+        _decode_cache[key] = ret
+    except KeyError:
+        ret = get_date_parts_from_num(data.reshape(-1),units,calendar)
+        if ret is None:
+            dates = np.atleast_1d(nc.num2date(data.reshape(-1),units,calendar=calendar))
+            ret = get_date_parts(dates)
+        ## datetimes have always been truncated to whole seconds
+        ret[:,6] = 0
+        ret = ret.reshape(data.shape+(7,))
+        _decode_cache[key] = ret
+        while len(_decode_cache) > constants.time_decode_cache_size:
+            _decode_cache.popitem(last=False)
+    
+    ## copies are returned as the arrays may be modified in place
+    return(ret.copy())
+
+
+def get_date_parts_from_num(values,units,calendar):
+    '''
+    :param values: One-dimensional array of numeric time values.
+    :type values: :class:`numpy.ndarray`
+    :param str units: The CF time units.
+    :param str calendar: The CF calendar name.
+    :returns: Integer date parts as returned by :func:`~ocgis.interface.base.dimension.temporal.get_date_parts`
+     or None if the units or calendar are not supported. Gregorian dates must be
+     after 1582-10-15 for the "standard" and "gregorian" calendars.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    match = _units_regex.match(units)
+    if match is None:
+        return(None)
+    try:
+        factor = _unit_factors[match.group(1).lower()]
+    except KeyError:
+        return(None)
+    ry,rm,rd,rh,rmin = [int(g or 0) for g in match.groups()[1:6]]
+    rs = float(match.group(7) or 0)
+    
+    ## microseconds since the start of the reference day
+    total = np.round(np.asarray(values,dtype=float)*factor).astype(np.int64)
+    total += int(round(((rh*60+rmin)*60+rs)*10**6))
+    days = total//_unit_factors['days']
+    microseconds = total-days*_unit_factors['days']
+    
+    if calendar in ['standard','gregorian','proleptic_gregorian']:
+        try:
+            ref_days = datetime.date(ry,rm,rd).toordinal()-datetime.date(1970,1,1).toordinal()
+        except ValueError:
+            return(None)
+        days += ref_days
+        if calendar != 'proleptic_gregorian' and (ref_days < _gregorian_start or (days < _gregorian_start).any()):
+            return(None)
+        ret = get_date_parts((days*_unit_factors['days']+microseconds).astype('datetime64[us]'))
+    elif calendar in _month_starts:
+        month_starts = _month_starts[calendar]
+        year_length = month_starts[-1]
+        days += ry*year_length+month_starts[rm-1]+rd-1
+        ret = np.empty((days.shape[0],7),dtype=np.int64)
+        ret[:,0] = days//year_length
+        day_of_year = days-ret[:,0]*year_length
+        ret[:,1] = np.searchsorted(month_starts,day_of_year,side='right')
+        ret[:,2] = day_of_year-month_starts[ret[:,1]-1]+1
+        ret[:,3] = microseconds//3600000000
+        ret[:,4] = (microseconds//60000000)%60
+        ret[:,5] = (microseconds//1000000)%60
+        ret[:,6] = microseconds%1000000
+    else:
+        ret = None
+    return(ret)
+
+
+def _get_datetime_num2date_(arr,units,calendar):
+    arr = np.atleast_1d(nc.num2date(arr,units,calendar=calendar))
+    dt = datetime.datetime
+    for idx,t in iter_array(arr,return_value=True):
+        arr[idx] = dt(t.year,t.month,t.day,
+                      t.hour,t.minute,t.second)
+    return(arr)
@@ -13,6 +13,7 @@ from subprocess import CalledProcessError
 import numpy as np
 from ocgis.api.request.base import RequestDataset
 import netCDF4 as nc
+from ocgis.interface.nc.pool import nc_pool
 
 
 class TestBase(unittest.TestCase):
@@ -116,6 +117,8 @@ class TestBase(unittest.TestCase):
         
     def tearDown(self):
         try:
+            ## close any pooled handles to test files
+            nc_pool.clear()
             if self._create_dir: shutil.rmtree(self._test_dir)
         finally:
             if self._reset_env: env.reset()
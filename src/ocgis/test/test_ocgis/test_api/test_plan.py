@@ -0,0 +1,80 @@
+from ocgis.test.base import TestBase
+from ocgis.api.operations import OcgOperations
+from ocgis.api.plan import OcgPlan
+from ocgis.interface.nc.field import NcField
+import numpy as np
+import datetime
+
+
+class TestOcgPlan(TestBase):
+    
+    def get_plan_without_values(self,ops):
+        ## planning fails if any values are read from source
+        def _get_value_from_source_(*args,**kwds):
+            raise(AssertionError('values were loaded'))
+        original = NcField.__dict__['_get_value_from_source_']
+        NcField._get_value_from_source_ = _get_value_from_source_
+        try:
+            ret = ops.get_plan()
+        finally:
+            NcField._get_value_from_source_ = original
+        return(ret)
+    
+    def test_no_subset(self):
+        rd = self.test_data.get_rd('cancm4_tas')
+        ops = OcgOperations(dataset=rd)
+        ## no values are loaded
+        plan = self.get_plan_without_values(ops)
+        self.assertIsInstance(plan,OcgPlan)
+        self.assertEqual(len(plan.units),1)
+        unit = plan.units[0]
+        self.assertEqual(unit['shape'],(1,3650,1,64,128))
+        self.assertEqual(unit['hyperslabs']['T'],[[0,3650]])
+        self.assertEqual(unit['hyperslabs']['X'],[[0,128]])
+        self.assertEqual(plan.bytes_in,3650*64*128*4)
+        self.assertEqual(plan.rows,3650*64*128)
+        self.assertEqual(plan.geometries,0)
+        self.assertEqual(plan.peak_memory,3650*64*128*5)
+        
+    def test_reuse(self):
+        rd = self.test_data.get_rd('cancm4_tas')
+        ops = OcgOperations(dataset=rd,geom=[-104,36,-95,42])
+        plan = ops.get_plan()
+        self.assertIs(ops._plan,plan)
+        ## changing a parameter invalidates the plan
+        ops.snippet = True
+        self.assertIsNone(ops._plan)
+        ## settings changed during execution keep the caller's plan
+        ops = OcgOperations(dataset=rd,geom=[-104,36,-95,42],snippet=True,output_format='nc')
+        plan = ops.get_plan()
+        ops.execute()
+        self.assertIs(ops._plan,plan)
+        
+    def test_geometry_subset(self):
+        rd = self.test_data.get_rd('cancm4_tas')
+        ops = OcgOperations(dataset=rd,geom=[-104,36,-95,42],snippet=True)
+        plan = self.get_plan_without_values(ops)
+        unit = plan.units[0]
+        ret = ops.execute()
+        self.assertEqual(unit['shape'],ret[1]['tas'].shape)
+        self.assertEqual(unit['geometries'],np.prod(unit['shape'][-2:]))
+        self.assertEqual(len(unit['hyperslabs']['Y']),1)
+        
+    def test_calculation(self):
+        rd = self.test_data.get_rd('cancm4_tas')
+        calc = [{'func':'mean','name':'mean'},{'func':'max','name':'max'}]
+        ops = OcgOperations(dataset=rd,calc=calc,calc_grouping=['month'],
+                            aggregate=True,geom=[-104,36,-95,42])
+        plan = ops.get_plan()
+        self.assertEqual(plan.rows,12*2)
+        unit = plan.units[0]
+        self.assertTrue(unit['memory']['calculation'] > unit['memory']['spatial'] > unit['memory']['read'])
+        self.assertEqual(plan.peak_memory,unit['memory']['calculation'])
+        
+    def test_empty(self):
+        rd = self.test_data.get_rd('cancm4_tas',kwds={'time_range':[datetime.datetime(1900,1,1),
+                                                                   datetime.datetime(1900,12,31)]})
+        ops = OcgOperations(dataset=rd,allow_empty=True)
+        plan = ops.get_plan()
+        self.assertTrue(plan.units[0]['empty'])
+        self.assertEqual(plan.bytes_in,0)
@@ -4,6 +4,8 @@ from ocgis.interface.base.variable import DerivedVariable, Variable
 import numpy as np
 import itertools
 from ocgis.test.test_ocgis.test_interface.test_base.test_field import AbstractTestField
+from ocgis import env
+from ocgis.calc.base import TemporalBlockValue
 
 
 class Test(AbstractTestField):
@@ -57,6 +59,28 @@ class Test(AbstractTestField):
         dvc = mu.execute()
         self.assertNotIn('n_my_mean_tmax',dvc.keys())
         
+    def test_Mean_streamed(self):
+        rd = self.test_data.get_rd('cancm4_tas')
+        grouping = ['month']
+        
+        field = rd.get()[:,:,:,10:14,20:24]
+        tgd = field.temporal.get_grouping(grouping)
+        ## the limit (in megabytes) allows only a few months per block
+        env.MEMORY_LIMIT = 0.02
+        mu = Mean(field=field,tgd=tgd,alias='my_mean',calc_sample_size=True)
+        self.assertIsInstance(mu._get_streamed_value_(field.variables['tas']),TemporalBlockValue)
+        streamed = mu.execute()
+        ## the source values are never loaded on the field
+        self.assertIsNone(field.variables['tas']._value)
+        
+        env.MEMORY_LIMIT = None
+        field = rd.get()[:,:,:,10:14,20:24]
+        mu = Mean(field=field,tgd=tgd,alias='my_mean',calc_sample_size=True)
+        self.assertIsNone(mu._get_streamed_value_(field.variables['tas']))
+        loaded = mu.execute()
+        for key in ['my_mean_tas','n_my_mean_tas']:
+            self.assertNumpyAll(streamed[key].value,loaded[key].value)
+        
     def test_Mean_two_variables(self):
         field = self.get_field(with_value=True,month_count=2)
         field.variables.add_variable(Variable(value=field.variables['tmax'].value+5,
@@ -1,6 +1,6 @@
 import unittest
 from ocgis.interface.base.crs import CoordinateReferenceSystem, WGS84,\
-    CFAlbersEqualArea, CFLambertConformal
+    CFAlbersEqualArea, CFLambertConformal, CFRotatedPole, crs_registry
 from ocgis.interface.base.dimension.base import VectorDimension
 from ocgis.interface.base.dimension.spatial import SpatialGridDimension,\
     SpatialDimension
@@ -13,6 +13,11 @@ from ocgis.util.helpers import get_temp_path
 import netCDF4 as nc
 from ocgis.interface.metadata import NcMetadata
 from ocgis.test.test_simple.test_simple import ToTest
+from ocgis.api.request.nc import get_rotated_pole_spatial_grid_dimension,\
+ _rotated_pole_memory
+from ocgis import env
+from fiona.crs import to_string
+from osgeo.osr import SpatialReference
 
 
 class TestCoordinateReferenceSystem(TestBase):
@@ -24,6 +29,24 @@ class TestCoordinateReferenceSystem(TestBase):
         crs2 = CoordinateReferenceSystem(prjs='+proj=longlat +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +no_defs ')
         self.assertTrue(crs == crs2)
         self.assertFalse(crs != crs2)
+        
+    def test_registry(self):
+        crs = CoordinateReferenceSystem(epsg=4326)
+        crs2 = CoordinateReferenceSystem(prjs='+proj=longlat +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +no_defs ')
+        crs3 = CoordinateReferenceSystem(epsg=2163)
+        ## equivalent coordinate systems share a key and may be used as dictionary keys
+        self.assertEqual(crs.key,crs2.key)
+        self.assertEqual(len(set([crs,crs2,crs3])),2)
+        self.assertFalse(crs == None)
+        ## spatial references and transformations are cached
+        self.assertIs(crs.sr,crs2.sr)
+        transformation = crs_registry.get_transformation(crs.sr,crs3.sr)
+        self.assertIs(crs_registry.get_transformation(crs2.sr,crs3.sr),transformation)
+        self.assertTrue(crs_registry.get_is_same(to_string(crs.value),to_string(crs2.value)))
+        ## references not from the registry are compared as given
+        sr = SpatialReference()
+        sr.ImportFromEPSG(2163)
+        self.assertIsNot(crs_registry.get_transformation(crs.sr,sr),transformation)
 
 
 class TestWGS84(TestBase):
@@ -77,6 +100,39 @@ class TestWGS84(TestBase):
             path = get_temp_path(name=target,suffix='.shp',wd=self._test_dir)
             sdim.write_fiona(path,target)
             
+
+    def test_wrap_360_arrays(self):
+        row = VectorDimension(value=[40.],bounds=[[38.,42.]])
+        col = VectorDimension(value=[90.,180.,270.],bounds=[[45.,135.],[135.,225.],[225.,315.]])
+        sdim = SpatialDimension(grid=SpatialGridDimension(row=row,col=col),crs=WGS84())
+        self.assertTrue(WGS84.get_is_360(sdim))
+        self.assertTrue(sdim._is_360)
+        sdim.crs.wrap(sdim)
+        self.assertFalse(WGS84.get_is_360(sdim))
+        ## points do not cross the axis and are not loaded
+        self.assertIsNone(sdim.geom.point._value)
+        self.assertEqual(sdim.geom.point.coordinates[1,0,:].tolist(),[90.,180.,-90.])
+        ## only the crossing polygon is split
+        polygons = sdim.geom.polygon.value[0,:]
+        self.assertEqual(polygons[0].bounds,(45.,38.,135.,42.))
+        self.assertIsInstance(polygons[1],MultiPolygon)
+        self.assertEqual(polygons[1].bounds,(-180.,38.,180.,42.))
+        self.assertEqual(polygons[2].bounds,(-135.,38.,-45.,42.))
+        self.assertEqual(sdim.grid.col.bounds.tolist(),[[45.,135.],[135.,-135.],[-135.,-45.]])
+        ## the wrapped grid agrees with the cached answer
+        self.assertFalse(WGS84._get_is_360_(sdim))
+        fresh = SpatialDimension(grid=sdim.grid,crs=WGS84())
+        self.assertFalse(WGS84.get_is_360(fresh))
+        ## slices do not keep the cached answer
+        self.assertIsNone(sdim[:,0:2]._is_360)
+        
+        sdim.crs.unwrap(sdim)
+        self.assertTrue(WGS84.get_is_360(sdim))
+        self.assertTrue(WGS84._get_is_360_(sdim))
+        self.assertEqual(sdim.grid.col.bounds.tolist(),[[45.,135.],[135.,225.],[225.,315.]])
+        polygons = sdim.geom.polygon.value[0,:]
+        self.assertEqual([p.bounds for p in polygons],[(45.,38.,135.,42.),(135.,38.,225.,42.),(225.,38.,315.,42.)])
+        self.assertEqual(sdim.geom.point.coordinates[1,0,:].tolist(),[90.,180.,270.])
             
 class TestCFAlbersEqualArea(TestBase):
     
@@ -112,6 +168,50 @@ class TestCFLambertConformalConic(TestBase):
         ds.close()
         
 
+class TestCFRotatedPole(TestBase):
+    
+    def test_get_geographic_coordinates(self):
+        ## the euro-cordex rotated pole centered at 18E, 50.75N
+        crs = CFRotatedPole(grid_north_pole_longitude=-162.,grid_north_pole_latitude=39.25)
+        lon,lat = crs.get_geographic_coordinates(np.array([[0.,0.],[0.,0.]]),np.array([[0.,0.],[0.,90.]]))
+        self.assertEqual(lon.shape,(2,2))
+        self.assertAlmostEqual(lon[0,0],18.)
+        self.assertAlmostEqual(lat[0,0],50.75)
+        ## the rotated north pole is the grid north pole
+        self.assertAlmostEqual(lat[1,1],39.25)
+        
+    def test_get_rotated_pole_spatial_grid_dimension(self):
+        env.DIR_CACHE = self._test_dir
+        crs = CFRotatedPole(grid_north_pole_longitude=-162.,grid_north_pole_latitude=39.25)
+        row = VectorDimension(value=[-1.,0.,1.])
+        col = VectorDimension(value=[-2.,-1.,0.,1.])
+        for _ in range(2):
+            grid = get_rotated_pole_spatial_grid_dimension(crs,SpatialGridDimension(row=row,col=col))
+            self.assertIsNone(grid.row)
+            self.assertEqual(grid.value.shape,(2,3,4))
+            self.assertAlmostEqual(grid.value[1,1,2],18.)
+            self.assertAlmostEqual(grid.value[0,1,2],50.75)
+        
+        ## without a cache directory coordinates are cached in memory
+        _rotated_pole_memory.clear()
+        env.DIR_CACHE = None
+        calls = []
+        original = CFRotatedPole.__dict__['get_geographic_coordinates']
+        def get_geographic_coordinates(*args,**kwds):
+            calls.append(None)
+            return(original(*args,**kwds))
+        CFRotatedPole.get_geographic_coordinates = get_geographic_coordinates
+        try:
+            for _ in range(2):
+                grid = get_rotated_pole_spatial_grid_dimension(crs,SpatialGridDimension(row=row,col=col))
+                self.assertAlmostEqual(grid.value[1,1,2],18.)
+                ## returned values are not the cached values
+                grid.value[:] = 0
+        finally:
+            CFRotatedPole.get_geographic_coordinates = original
+        self.assertEqual(len(calls),1)
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -118,6 +118,36 @@ class TestVectorDimension(unittest.TestCase):
         vdim_between = vdim.get_between(2.5,2.5)
         self.assertEqual(len(vdim_between),2)
         
+    def test_get_between_monotonic(self):
+        value = np.array([0.,5.,10.,15.])
+        bounds = np.array([[-2.5,2.5],[2.5,7.5],[7.5,12.5],[12.5,17.5]])
+        for rev in [False,True]:
+            v,b = (value[::-1],bounds[::-1,::-1]) if rev else (value,bounds)
+            for kwds in [dict(value=v),dict(value=v,bounds=b)]:
+                vdim = VectorDimension(**kwds)
+                self.assertEqual(vdim._get_monotonic_direction_(),-1 if rev else 1)
+                for lower,upper in [(1,3),(2.5,10),(5,5),(-10,100)]:
+                    for closed in [False,True]:
+                        ## compare against the selection for an unsorted dimension
+                        vdim._monotonic = (vdim.value,vdim.bounds,0)
+                        try:
+                            desired = vdim.get_between(lower,upper,return_indices=True,closed=closed)[1]
+                        except EmptySubsetError:
+                            desired = None
+                        vdim._monotonic = None
+                        try:
+                            ret,indices = vdim.get_between(lower,upper,return_indices=True,closed=closed)
+                        except EmptySubsetError:
+                            self.assertIsNone(desired)
+                            continue
+                        self.assertEqual(indices.tolist(),desired.tolist())
+                        self.assertEqual(ret.value.tolist(),v[desired].tolist())
+        
+        ## unsorted values are selected by comparison
+        vdim = VectorDimension(value=[10.,0.,5.])
+        self.assertEqual(vdim._get_monotonic_direction_(),0)
+        self.assertEqual(vdim.get_between(4,11,return_indices=True)[1].tolist(),[0,2])
+        
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
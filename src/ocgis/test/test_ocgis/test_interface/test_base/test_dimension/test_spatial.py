@@ -3,7 +3,7 @@ import numpy as np
 from ocgis.interface.base.dimension.spatial import SpatialDimension,\
     SpatialGeometryDimension, SpatialGeometryPolygonDimension,\
     SpatialGridDimension, SpatialGeometryPointDimension
-from ocgis.util.helpers import iter_array, make_poly
+from ocgis.util.helpers import iter_array, make_poly, project_shapely_geometry
 import fiona
 from fiona.crs import from_epsg
 from shapely.geometry import shape, mapping
@@ -12,6 +12,7 @@ from ocgis.exc import EmptySubsetError, ImproperPolygonBoundsError
 from ocgis.test.base import TestBase
 from ocgis.interface.base.crs import CoordinateReferenceSystem
 from ocgis.interface.base.dimension.base import VectorDimension
+from ocgis import env
 
 
 class TestSpatialBase(TestBase):
@@ -95,6 +96,19 @@ class TestSpatialDimension(TestSpatialBase):
         ref_poly = ret.geom.polygon.value[0,0]
         self.assertTrue(ref_poly.intersects(ref_pt))
         
+    def test_get_clip_interior(self):
+        for use in [True,False]:
+            env.USE_SPATIAL_INDEX = use
+            sdim = self.get_sdim(bounds=True)
+            ## fully contains the cells centered at (39,-99) and (39,-98)
+            poly = make_poly((38.25,39.75),(-99.75,-97.25))
+            ret = sdim.get_clip(poly)
+            if use:
+                self.assertEqual(ret.geom.polygon._interior.sum(),2)
+            areas = [g.area for g in ret.geom.polygon.value.compressed()]
+            self.assertEqual(sorted(areas),[0.0625]*4+[0.25]*6+[1.0]*2)
+            self.assertAlmostEqual(sum(areas),poly.area)
+        
     def test_get_geom_iter(self):
         sdim = self.get_sdim(bounds=True)
         tt = list(sdim.get_geom_iter())
@@ -207,6 +221,36 @@ class TestSpatialDimension(TestSpatialBase):
             self.assertNumpyNotAll(sdim.grid.value,orig)
             self.assertEqual(sdim.grid.row,None)
 
+    def test_update_crs_bulk(self):
+        from_crs = CoordinateReferenceSystem(epsg=4326)
+        to_crs = CoordinateReferenceSystem(epsg=2163)
+        for b in [True,False]:
+            attrs = ['point','polygon'] if b else ['point']
+            ## the expected geometries are constructed from a separate spatial
+            ## dimension so no geometries are loaded on the transformed dimension
+            ref = self.get_sdim(bounds=b)
+            actual = {}
+            for attr in attrs:
+                actual[attr] = [project_shapely_geometry(geom,from_crs.sr,to_crs.sr) for geom in getattr(ref.geom,attr).value.flat]
+            sdim = self.get_sdim(bounds=b)
+            sdim.crs = from_crs
+            self.assertIsNone(sdim.geom.point._value)
+            sdim.update_crs(to_crs)
+            ## points are transformed without constructing geometries
+            self.assertIsNone(sdim.geom.point._value)
+            for attr in attrs:
+                for geom,actual_geom in zip(getattr(sdim.geom,attr).value.flat,actual[attr]):
+                    self.assertTrue(geom.almost_equals(actual_geom,decimal=4))
+            self.assertNumpyAllClose(sdim.grid.value.data[1],np.array([[g.x for g in actual['point'][ii*4:(ii+1)*4]] for ii in range(3)]))
+            
+            ## loaded geometries are transformed in bulk
+            sdim = self.get_sdim(bounds=b)
+            sdim.crs = from_crs
+            sdim.geom.point.value
+            sdim.update_crs(to_crs)
+            for geom,actual_geom in zip(sdim.geom.point.value.flat,actual['point']):
+                self.assertTrue(geom.almost_equals(actual_geom,decimal=4))
+
     def test_grid_value(self):
         for b in [True,False]:
             row = self.get_row(bounds=b)
@@ -263,6 +307,32 @@ class TestSpatialDimension(TestSpatialBase):
             fill[1,idx_row,idx_col] = pt[idx_row,idx_col].x
         self.assertNumpyAll(fill,sdim.grid.value)
         
+    def test_geom_arrays(self):
+        sdim = self.get_sdim(bounds=True)
+        point = sdim.geom.point
+        polygon = sdim.geom.polygon
+        self.assertNumpyAll(point.coordinates,sdim.grid.value)
+        bounds = polygon.bounds
+        self.assertEqual(bounds.shape,(4,3,4))
+        self.assertEqual(bounds[:,0,0].tolist(),[-100.5,39.5,-99.5,40.5])
+        self.assertNumpyAll(polygon.area,np.ma.array(np.ones((3,4),dtype=np.float32),mask=False))
+        
+        ## geometries are constructed only as needed
+        sdim.weights
+        poly = make_poly((38.75,40.25),(-100.25,-99.25))
+        ret = sdim.get_intersects(poly)
+        self.assertIsNone(polygon._value)
+        self.assertIsNone(ret.geom.polygon._value)
+        self.assertEqual(ret.geom.polygon.mask.sum(),0)
+        geoms = list(ret.geom.polygon.iter_geometries())
+        self.assertEqual(len(geoms),4)
+        self.assertIsNone(ret.geom.polygon._value)
+        
+        ## constructed geometries match loaded geometries
+        self.assertTrue(polygon.get_geometry(1,2).almost_equals(polygon.value[1,2]))
+        self.assertNumpyAll(polygon.bounds,bounds)
+        self.assertTrue(point.get_geometry(2,3).almost_equals(Point(-97.,38.)))
+        
     def test_geom_polygon_no_bounds(self):
         sdim = self.get_sdim(bounds=False)
         with self.assertRaises(ImproperPolygonBoundsError):
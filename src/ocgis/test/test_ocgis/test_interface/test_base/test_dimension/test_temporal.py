@@ -1,9 +1,11 @@
 from ocgis.test.base import TestBase
 from datetime import datetime as dt
-from ocgis.interface.base.dimension.temporal import TemporalDimension
+from ocgis.interface.base.dimension.temporal import TemporalDimension, get_date_parts,\
+ TemporalGroupIndex, TemporalGroupDimension, get_datetime_from_parts
 import numpy as np
 from ocgis.util.helpers import get_date_list
 import datetime
+import netCDF4 as nc
 
 
 class TestTemporalDimension(TestBase):
@@ -57,6 +59,51 @@ class TestTemporalDimension(TestBase):
         tg = td.get_grouping([[3,4,5]])
         self.assertEqual(tg.value[0],dt(2005,4,16))
     
+    def test_get_grouping(self):
+        dates = get_date_list(dt(2011,12,1),dt(2013,2,28),1)
+        td = TemporalDimension(value=dates)
+        tg = td.get_grouping(['year','month'])
+        self.assertEqual(len(tg.value),15)
+        self.assertEqual(tuple(tg.date_parts[0]),(2011,12,None,None,None,None,None))
+        self.assertEqual(tuple(tg.date_parts[-1]),(2013,2,None,None,None,None,None))
+        for dp,dgrp,bounds in zip(tg.date_parts,tg.dgroups,tg.bounds):
+            selected = td.value[dgrp]
+            self.assertEqual(set([(d.year,d.month) for d in selected]),set([(dp['year'],dp['month'])]))
+            self.assertEqual(bounds.tolist(),[selected.min(),selected.max()])
+        self.assertEqual(sum([dgrp.sum() for dgrp in tg.dgroups]),td.shape[0])
+        
+        ## groups are ordered by date part position regardless of the grouping order
+        tg = td.get_grouping(['month','year'])
+        self.assertEqual(tuple(tg.date_parts[1]),(2012,1,None,None,None,None,None))
+        tg = td.get_grouping(['month'])
+        self.assertEqual([dp['month'] for dp in tg.date_parts],range(1,13))
+        self.assertEqual(tg.dgroups[11].sum(),62)
+        self.assertNumpyAll(tg.dgroups.get_indices(0),np.arange(31,62))
+        self.assertEqual(tg.dgroups.get_selection(0),slice(31,62))
+    
+    def test_get_date_parts(self):
+        dates = np.array([dt(2012,2,29,23,59,58,7),dt(1901,1,1)])
+        self.assertEqual(get_date_parts(dates).tolist(),[[2012,2,29,23,59,58,7],[1901,1,1,0,0,0,0]])
+        ## datetimes for non-standard calendars are extracted by attribute
+        dates = nc.num2date([0,359.5],'days since 2000-1-1',calendar='360_day')
+        self.assertEqual(get_date_parts(dates).tolist(),[[2000,1,1,0,0,0,0],[2000,12,30,12,0,0,0]])
+    
+    def test_get_datetime_from_parts(self):
+        dates = np.array([dt(2012,2,29,23,59,58,7),dt(1901,1,1)])
+        self.assertEqual(get_datetime_from_parts(get_date_parts(dates)).tolist(),dates.tolist())
+        ## dates not in the gregorian calendar are not converted
+        self.assertIsNone(get_datetime_from_parts(np.array([[2001,2,30,0,0,0,0]])))
+        self.assertIsNone(get_datetime_from_parts(np.array([[0,1,1,0,0,0,0]])))
+    
+    def test_date_parts(self):
+        value = np.array([dt(2000,1,16,12),dt(2000,2,15)])
+        bounds = np.array([[dt(2000,1,1),dt(2000,2,1)],[dt(2000,2,1),dt(2000,3,1)]])
+        td = TemporalDimension(value=value,bounds=bounds)
+        self.assertEqual(td.value_date_parts.tolist(),get_date_parts(value).tolist())
+        self.assertEqual(td.bounds_date_parts.shape,(2,2,7))
+        self.assertEqual(td.bounds_date_parts[1,1].tolist(),[2000,3,1,0,0,0,0])
+        self.assertIsNone(TemporalDimension(value=value).bounds_date_parts)
+    
     def test_get_time_region_value_only(self):
         dates = get_date_list(dt(2002,1,31),dt(2009,12,31),1)
         td = TemporalDimension(value=dates)
@@ -75,6 +122,24 @@ class TestTemporalDimension(TestBase):
         self.assertEqual(ret.shape,indices.shape)
         
         self.assertEqual(ret.extent,(datetime.datetime(2003,9,20),datetime.datetime(2003,10,31)))
+        
+    def test_get_time_region_bounds(self):
+        value = np.array([dt(2000,month,15) for month in range(1,13)]*2)
+        for ii in range(12,24):
+            value[ii] = value[ii].replace(year=2001)
+        bounds = np.array([[v.replace(day=1),(v.replace(day=28)+datetime.timedelta(days=4)).replace(day=1)] for v in value])
+        td = TemporalDimension(value=value,bounds=bounds)
+        
+        ## the upper bound month is excluded
+        ret,indices = td.get_time_region({'month':[6,7]},return_indices=True)
+        self.assertNumpyAll(indices,np.array([5,6,17,18]))
+        self.assertEqual([d.month for d in ret.value],[6,7,6,7])
+        ## december 2000 ends on the excluded upper bound
+        ret,indices = td.get_time_region({'year':[2001]},return_indices=True)
+        self.assertNumpyAll(indices,np.arange(12,24))
+        self.assertEqual(ret.shape,(12,))
+        ret,indices = td.get_time_region({'year':[2001],'month':[1,2]},return_indices=True)
+        self.assertNumpyAll(indices,np.array([12,13]))
 
 
 class TestTemporalGroupDimension(TestBase):
@@ -86,3 +151,30 @@ class TestTemporalGroupDimension(TestBase):
         self.assertEqual(tuple(tgd.date_parts[0]),(None,1,None,None,None,None,None))
         self.assertTrue(tgd.dgroups[0].all())
         self.assertNumpyAll(tgd.uid,np.array([1]))
+
+
+class TestTemporalGroupIndex(TestBase):
+    
+    def test_from_labels(self):
+        gidx = TemporalGroupIndex.from_labels(np.array([1,1,-1,0,1,0]),2)
+        self.assertEqual(len(gidx),2)
+        self.assertNumpyAll(gidx.get_indices(0),np.array([3,5]))
+        self.assertNumpyAll(gidx.get_indices(1),np.array([0,1,4]))
+        self.assertNumpyAll(gidx[0],np.array([False,False,False,True,False,True]))
+        self.assertEqual(len(list(gidx)),2)
+        ## only contiguous groups are slices
+        self.assertNumpyAll(gidx.get_selection(1),np.array([0,1,4]))
+        gidx = TemporalGroupIndex.from_labels(np.array([0,0,1,1,1]),2)
+        self.assertEqual([gidx.get_selection(ii) for ii in range(2)],[slice(0,2),slice(2,5)])
+        
+    def test_from_masks(self):
+        masks = [np.array([True,False,True]),np.array([False,True,False])]
+        gidx = TemporalGroupIndex.from_masks(masks)
+        for ii,mask in enumerate(masks):
+            self.assertNumpyAll(gidx[ii],mask)
+        td = TemporalDimension(value=get_date_list(dt(2012,1,1),dt(2012,1,3),1))
+        tgd = td.get_grouping(['day'])
+        tgd2 = TemporalGroupDimension(grouping=tgd.grouping,date_parts=tgd.date_parts,
+                                      dgroups=list(tgd.dgroups),value=tgd.value)
+        self.assertIsInstance(tgd2.dgroups,TemporalGroupIndex)
+        self.assertNumpyAll(tgd2.dgroups.order,tgd.dgroups.order)
@@ -5,7 +5,8 @@ from ocgis.interface.base.dimension.base import VectorDimension
 import datetime
 from ocgis.interface.base.dimension.spatial import SpatialGridDimension,\
     SpatialDimension
-from ocgis.interface.base.field import Field, DerivedField
+from ocgis.interface.base.field import Field, DerivedField, _weights_cache,\
+ _weights_memory
 import numpy as np
 import itertools
 from ocgis.test.base import TestBase
@@ -15,6 +16,8 @@ from shapely.ops import cascaded_union
 from ocgis.interface.base.variable import Variable, VariableCollection
 from ocgis.interface.base.dimension.temporal import TemporalDimension
 from copy import deepcopy
+from ocgis import env
+import hashlib
 
 
 class AbstractTestField(TestBase):
@@ -245,6 +248,63 @@ class TestField(AbstractTestField):
         self.assertAlmostEqual(to_test.area,single.area)
         self.assertAlmostEqual(to_test.bounds,single.bounds)
         self.assertAlmostEqual(to_test.exterior.length,single.exterior.length)
+
+    def test_get_clip_aggregated(self):
+        single = wkt.loads('POLYGON((-99.894355 40.230645,-98.725806 40.196774,-97.726613 40.027419,-97.032258 39.942742,-97.681452 39.626613,-97.850806 39.299194,-98.178226 39.643548,-98.844355 39.920161,-99.894355 40.230645))')
+        clipped = self.get_field(with_value=True).get_clip(single)
+        actual = clipped.get_spatially_aggregated(new_spatial_uid=5)
+        _weights_memory.clear()
+        env.DIR_CACHE = self._test_dir
+        ## the first request populates the cache and the second uses it
+        for _ in range(2):
+            agg = self.get_field(with_value=True).get_clip_aggregated(single,new_spatial_uid=5)
+            self.assertEqual(agg.shape,(2,31,2,1,1))
+            self.assertEqual(agg.spatial.uid,np.array([[5]]))
+            self.assertIsNone(agg.spatial.grid)
+            self.assertTrue(agg.spatial.geom.polygon.value[0,0].almost_equals(actual.spatial.geom.polygon.value[0,0]))
+            self.assertTrue(agg.spatial.geom.point.value[0,0].equals(actual.spatial.geom.point.value[0,0]))
+            self.assertNumpyAllClose(agg.variables['tmax'].value,actual.variables['tmax'].value)
+        ## only weights for selected cells are stored
+        entry = _weights_cache.get((self.get_field().spatial.get_fingerprint(),hashlib.sha1(single.wkb).hexdigest()))
+        self.assertEqual(len(entry['rows']),clipped.spatial.weights.count())
+        
+        ## without a cache directory weights are cached in memory
+        _weights_memory.clear()
+        env.DIR_CACHE = None
+        for _ in range(2):
+            agg = self.get_field(with_value=True).get_clip_aggregated(single,new_spatial_uid=5)
+            self.assertNumpyAllClose(agg.variables['tmax'].value,actual.variables['tmax'].value)
+        self.assertEqual(len(_weights_memory),1)
+        
+    def test_get_clip_aggregated_raw(self):
+        ## raw values loaded after a cached clip are masked and weighted as for a clip
+        _weights_memory.clear()
+        polygon = wkt.loads('POLYGON((260 30,266 44,274 32,260 30))')
+        rd = self.test_data.get_rd('cancm4_tas')
+        clipped = rd.get()[:,0:2,:,:,:].get_clip(polygon)
+        for _ in range(2):
+            agg = rd.get()[:,0:2,:,:,:].get_clip_aggregated(polygon)
+            raw = agg._raw
+            self.assertNumpyAll(raw.variables['tas'].value.mask,clipped.variables['tas'].value.mask)
+            self.assertNumpyAll(raw.spatial.get_mask(),clipped.spatial.get_mask())
+            self.assertNumpyAllClose(raw.spatial.weights,clipped.spatial.weights)
+        self.assertEqual(len(_weights_memory),1)
+
+    def test_set_new_value_mask(self):
+        field = self.get_field(with_value=True)
+        value = field.variables['tmax'].value
+        value.mask = np.ma.nomask
+        mask = np.zeros(field.shape[-2:],dtype=bool)
+        mask[1,2] = True
+        field._set_new_value_mask_(field,mask)
+        self.assertEqual(value.mask.shape,field.shape)
+        self.assertTrue(value.mask[:,:,:,1,2].all())
+        self.assertEqual(value.mask.sum(),np.prod(field.shape[0:3]))
+        ## existing masked values are kept
+        value.mask[0,0,0,0,0] = True
+        field._set_new_value_mask_(field,mask)
+        self.assertTrue(value.mask[0,0,0,0,0])
+        self.assertFalse(value.mask[0,0,0,0,1])
             
     def test_get_aggregated_all(self):
         for wv in [True,False]:
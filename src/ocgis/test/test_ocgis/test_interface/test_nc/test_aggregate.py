@@ -0,0 +1,115 @@
+from ocgis.test.base import TestBase
+from ocgis.interface.nc import aggregate
+from ocgis.interface.nc.aggregate import NcAggregatedDataset
+from ocgis import env
+from ocgis.interface.metadata import NcMetadata
+from ocgis.api.request.nc import NcRequestDataset
+import netCDF4 as nc
+import numpy as np
+import os
+import datetime
+
+
+class TestNcAggregatedDataset(TestBase):
+
+    def get_files(self):
+        ## three years of monthly values with the time units changing by file
+        ret = []
+        for ii,year in enumerate([2001,2002,2003]):
+            path = os.path.join(self._test_dir,'foo_{0}.nc'.format(year))
+            ds = nc.Dataset(path,'w',format='NETCDF4')
+            try:
+                ds.createDimension('time')
+                ds.createDimension('bounds',2)
+                ds.createDimension('y',2)
+                ds.createDimension('x',2)
+                units = 'days since {0}-1-1'.format(2001 if ii == 0 else year)
+                dates = [datetime.datetime(year,month,15) for month in range(1,13)]
+                time = ds.createVariable('time',float,('time',))
+                time.units = units
+                time.calendar = 'standard'
+                time.bounds = 'time_bnds'
+                time.axis = 'T'
+                time[:] = nc.date2num(dates,units,calendar='standard')
+                time_bnds = ds.createVariable('time_bnds',float,('time','bounds'))
+                time_bnds[:] = np.array([time[:]-1,time[:]+1]).T
+                for name in ['y','x']:
+                    dim = ds.createVariable(name,float,(name,))
+                    dim.axis = name.upper()
+                    dim[:] = [1,2]
+                foo = ds.createVariable('foo',float,('time','y','x'))
+                foo[:] = np.arange(ii*48,(ii+1)*48).reshape(12,2,2)
+                ds.history = 'created'
+            finally:
+                ds.close()
+            ret.append(path)
+        return(ret)
+
+    def test_read(self):
+        uris = self.get_files()
+        ds = NcAggregatedDataset(uris)
+        try:
+            self.assertEqual(ds.dimension,'time')
+            self.assertEqual(len(ds.dimensions['time']),36)
+            self.assertEqual(ds.history,'created')
+            self.assertEqual(ds.variables['foo'].shape,(36,2,2))
+            self.assertEqual(ds.variables['x'][:].tolist(),[1.,2.])
+
+            ## values are concatenated across files
+            self.assertNumpyAll(ds.variables['foo'][:],np.arange(144,dtype=float).reshape(36,2,2))
+            self.assertNumpyAll(ds.variables['foo'][10:14,1,1],np.array([43.,47.,51.,55.]))
+            self.assertEqual(ds.variables['foo'][12,0,0],48.)
+            self.assertNumpyAll(ds.variables['foo'][np.array([0,35]),0,:],np.array([[0.,1.],[140.,141.]]))
+
+            ## time values are converted to the units of the first file
+            time = ds.variables['time']
+            dates = nc.num2date(time[:],time.units,calendar=time.calendar)
+            self.assertEqual(dates[12],datetime.datetime(2002,1,15))
+            self.assertEqual(dates[-1],datetime.datetime(2003,12,15))
+            self.assertNumpyAll(ds.variables['time_bnds'][24,:],time[24]+np.array([-1.,1.]))
+
+            ## metadata may be parsed
+            metadata = NcMetadata(ds)
+            self.assertEqual(metadata['dimensions']['time']['len'],36)
+            self.assertTrue(metadata['dimensions']['time']['isunlimited'])
+        finally:
+            ds.close()
+
+    def test_file_pruning(self):
+        uris = self.get_files()
+        aggregate._index_memory.clear()
+        
+        ## count the files opened
+        opened = []
+        original = nc.Dataset
+        def Dataset(path,*args,**kwds):
+            opened.append(path)
+            return(original(path,*args,**kwds))
+        nc.Dataset = Dataset
+        try:
+            ## the time index is built by opening each file once
+            NcAggregatedDataset(uris).close()
+            self.assertEqual(opened,uris)
+            
+            ## the indexed files are not opened again without a cache directory
+            self.assertIsNone(env.DIR_CACHE)
+            del opened[:]
+            ds = NcAggregatedDataset(uris)
+            try:
+                self.assertEqual(opened,[uris[0]])
+                ds.variables['time'][:]
+                self.assertEqual(opened,[uris[0]])
+                ds.variables['foo'][13:15,:,:]
+                self.assertEqual(opened,[uris[0],uris[1]])
+                self.assertEqual(sorted(ds._files.keys()),[0,1])
+            finally:
+                ds.close()
+        finally:
+            nc.Dataset = original
+
+    def test_request_dataset(self):
+        uris = self.get_files()
+        rd = NcRequestDataset(uri=uris,variable='foo',time_range=[datetime.datetime(2002,1,1),datetime.datetime(2002,12,31)])
+        field = rd.get()
+        self.assertEqual(field.shape,(1,12,1,2,2))
+        self.assertNumpyAll(field.variables['foo'].value.data.flatten(),np.arange(48,96,dtype=float))
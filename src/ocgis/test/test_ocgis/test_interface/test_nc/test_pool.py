@@ -0,0 +1,95 @@
+from ocgis.test.base import TestBase
+from ocgis.interface.nc.pool import NcDatasetPool, PooledDataset
+import netCDF4 as nc
+import os
+import time
+
+
+class TestNcDatasetPool(TestBase):
+
+    def get_file(self,name='foo.nc',value=1):
+        path = os.path.join(self._test_dir,name)
+        ds = nc.Dataset(path,'w')
+        try:
+            ds.createDimension('x',3)
+            var = ds.createVariable('foo',int,('x',))
+            var[:] = value
+        finally:
+            ds.close()
+        return(path)
+
+    def test_open(self):
+        uri = self.get_file()
+        pool = NcDatasetPool(size=2)
+        events = []
+        pool.hooks.append(lambda event,key: events.append((event,key)))
+
+        ds = pool.open(uri)
+        self.assertIsInstance(ds,PooledDataset)
+        self.assertEqual(ds.variables['foo'][:].tolist(),[1,1,1])
+        ds.close()
+        ## closing twice only releases once
+        ds.close()
+        ds2 = pool.open(uri)
+        self.assertEqual(ds2.variables['foo'][:].tolist(),[1,1,1])
+        ds2.close()
+        self.assertEqual(events,[('miss',uri),('hit',uri)])
+        stats = pool.get_stats()
+        self.assertEqual(stats['hits'],1)
+        self.assertEqual(stats['misses'],1)
+        self.assertEqual(stats['hit_rate'],0.5)
+        self.assertEqual(stats['open'],1)
+
+    def test_eviction(self):
+        uris = [self.get_file(name='foo{0}.nc'.format(ii)) for ii in range(3)]
+        pool = NcDatasetPool(size=2)
+        for uri in uris:
+            pool.open(uri).close()
+        self.assertEqual(len(pool),2)
+        self.assertEqual(pool.get_stats()['evictions'],1)
+        ## the least recently used handle is evicted
+        self.assertNotIn(uris[0],pool._storage)
+
+        ## handles in use are not evicted
+        in_use = [pool.open(uri) for uri in uris]
+        self.assertEqual(len(pool),3)
+        for ds in in_use:
+            ds.close()
+        self.assertEqual(len(pool),2)
+
+        self.assertEqual(pool.evict(uris[-1]),1)
+        self.assertEqual(len(pool),1)
+        pool.clear()
+        self.assertEqual(len(pool),0)
+
+    def test_invalidate(self):
+        uri = self.get_file()
+        pool = NcDatasetPool(size=2)
+        ds = pool.open(uri)
+        ds.close()
+        ## ensure the modification time changes
+        time.sleep(0.01)
+        os.remove(uri)
+        self.get_file(value=2)
+        ds = pool.open(uri)
+        self.assertEqual(ds.variables['foo'][:].tolist(),[2,2,2])
+        ds.close()
+        self.assertEqual(pool.get_stats()['invalidations'],1)
+
+    def test_process(self):
+        uri = self.get_file()
+        pool = NcDatasetPool(size=2)
+        pool.open(uri).close()
+        self.assertEqual(len(pool),1)
+        ## simulate access from a forked process
+        pool._pid = -1
+        self.assertEqual(len(pool),0)
+        self.assertEqual(pool.get_stats()['misses'],0)
+
+    def test_disabled(self):
+        uri = self.get_file()
+        pool = NcDatasetPool(size=0)
+        ds = pool.open(uri)
+        self.assertIsInstance(ds,nc.Dataset)
+        ds.close()
+        self.assertEqual(len(pool),0)
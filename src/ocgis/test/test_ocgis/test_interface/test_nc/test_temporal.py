@@ -0,0 +1,64 @@
+from ocgis.test.base import TestBase
+from ocgis.interface.nc import temporal
+from ocgis.interface.nc.temporal import NcTemporalDimension, get_date_parts_from_num,\
+ get_datetime_from_num
+import netCDF4 as nc
+import numpy as np
+import datetime
+
+
+class TestNcTemporalDimension(TestBase):
+
+    def test_get_date_parts_from_num(self):
+        values = np.array([-0.5,0,59,365.25,1000.75])
+        for units in ['days since 2000-1-1','days since 2000-01-01 00:00:00','hours since 2000-01-01T00:00:00Z']:
+            factor = 24 if units.startswith('hours') else 1
+            for calendar in ['standard','proleptic_gregorian','noleap','365_day','all_leap','360_day']:
+                parts = get_date_parts_from_num(values*factor,units,calendar)
+                dates = nc.num2date(values*factor,units,calendar=calendar)
+                actual = [[d.year,d.month,d.day,d.hour,d.minute,d.second] for d in dates]
+                self.assertEqual(parts[:,0:6].tolist(),actual)
+
+        ## unsupported units, calendars, and julian dates are not decoded
+        self.assertIsNone(get_date_parts_from_num(values,'months since 2000-1-1','standard'))
+        self.assertIsNone(get_date_parts_from_num(values,'days since 2000-1-1','julian'))
+        self.assertIsNone(get_date_parts_from_num(values,'days since 1500-1-1','standard'))
+        self.assertIsNotNone(get_date_parts_from_num(values,'days since 1500-1-1','proleptic_gregorian'))
+
+    def test_get_datetime(self):
+        temporal._decode_cache.clear()
+        value = np.array([15.5,45.,74.5])
+        bounds = np.array([[0.,31.],[31.,59.],[59.,90.]])
+        td = NcTemporalDimension(value=value,bounds=bounds,units='days since 2001-1-1',calendar='noleap')
+        self.assertEqual(td.value_datetime.tolist(),[datetime.datetime(2001,1,16,12),datetime.datetime(2001,2,15),
+                                                     datetime.datetime(2001,3,16,12)])
+        self.assertEqual(td.bounds_datetime[1].tolist(),[datetime.datetime(2001,2,1),datetime.datetime(2001,3,1)])
+        self.assertEqual(len(temporal._decode_cache),2)
+
+        ## copied dimensions reuse the decoded values
+        td2 = NcTemporalDimension(value=value.copy(),bounds=bounds,units='days since 2001-1-1',calendar='noleap')
+        td2.value_datetime
+        self.assertEqual(len(temporal._decode_cache),2)
+        ## the cache holds date parts which are exposed on the dimension
+        self.assertEqual(td2.value_date_parts[0].tolist(),[2001,1,16,12,0,0,0])
+        self.assertEqual(td2.bounds_date_parts.shape,(3,2,7))
+        self.assertTrue(all(v.shape[-1] == 7 for v in temporal._decode_cache.values()))
+        self.assertEqual(len(temporal._decode_cache),2)
+        ## sliced dimensions keep the parsed parts
+        self.assertEqual(td2[1:].bounds_date_parts[0,1].tolist(),[2001,3,1,0,0,0,0])
+        
+        ## datetimes are truncated to whole seconds for both conversions
+        ret = get_datetime_from_num(np.array([1500.5]),'milliseconds since 2001-1-1','standard')
+        self.assertEqual(ret[0],datetime.datetime(2001,1,1,0,0,1))
+        ret = get_datetime_from_num(np.array([1.5]),'seconds since 2001-1-1','julian')
+        self.assertEqual(ret[0],datetime.datetime(2001,1,1,0,0,1))
+        td = NcTemporalDimension(value=np.array([0.25,1.75]),units='seconds since 2001-1-1',calendar='noleap')
+        self.assertEqual(td.value_date_parts[:,5:].tolist(),[[0,0],[1,0]])
+
+        ## a date not in the gregorian calendar falls back to the original conversion
+        with self.assertRaises(ValueError):
+            get_datetime_from_num(np.array([59.]),'days since 2001-1-1','360_day')
+        ## returned arrays are not the cached arrays
+        ret = get_datetime_from_num(value,'days since 2001-1-1','noleap')
+        ret[:] = None
+        self.assertEqual(get_datetime_from_num(value,'days since 2001-1-1','noleap')[0],datetime.datetime(2001,1,16,12))
@@ -0,0 +1,88 @@
+from ocgis.test.base import TestBase
+from ocgis.util import cache
+from ocgis.util.cache import OcgCache, get_file_signature
+from ocgis import env
+from ocgis.api.request.nc import NcRequestDataset
+import ocgis
+import os
+import shutil
+import numpy as np
+
+
+class TestOcgCache(TestBase):
+
+    def setUp(self):
+        super(TestOcgCache,self).setUp()
+        env.DIR_CACHE = self._test_dir
+
+    def test_get_set(self):
+        c = OcgCache('foo')
+        self.assertIsNone(c.get(('a',1)))
+        self.assertEqual(c.get(('a',1),default=5),5)
+        c.set(('a',1),{'value':np.array([1,2])})
+        value = c.get(('a',1))
+        self.assertEqual(value['value'].tolist(),[1,2])
+        ## returned values are copies
+        value['value'][:] = 3
+        self.assertEqual(c.get(('a',1))['value'].tolist(),[1,2])
+        ## namespaces are separate
+        self.assertIsNone(OcgCache('bar').get(('a',1)))
+        self.assertTrue(os.path.exists(c.path))
+
+    def test_persistence(self):
+        c = OcgCache('foo')
+        c.set('a',[1,2])
+        ## values are read from disk when not in memory
+        cache._MEMORY.clear()
+        cache._MEMORY_SIZE = 0
+        self.assertEqual(OcgCache('foo').get('a'),[1,2])
+        c.clear()
+        self.assertIsNone(c.get('a'))
+
+    def test_disabled(self):
+        env.DIR_CACHE = None
+        c = OcgCache('foo')
+        self.assertFalse(c.enabled)
+        c.set('a',1)
+        self.assertIsNone(c.get('a'))
+
+    def test_get_file_signature(self):
+        path = os.path.join(self._test_dir,'foo.txt')
+        with open(path,'w') as f:
+            f.write('foo')
+        signature = get_file_signature(path)
+        self.assertEqual(signature[0][0:2],(os.path.abspath(path),3))
+        self.assertEqual(len(get_file_signature([path,path])),2)
+        self.assertIsNone(get_file_signature('http://foo.nc'))
+
+    def test_request_dataset(self):
+        ## a copy of the test data is modified
+        uri = os.path.join(self._test_dir,'tas.nc')
+        shutil.copy2(self.test_data.get_uri('cancm4_tas'),uri)
+        rd = ocgis.RequestDataset(uri=uri,variable='tas')
+        metadata = rd._source_metadata
+        
+        ## count the datasets opened to parse metadata
+        opened = []
+        original = NcRequestDataset.__dict__['_open_']
+        def _open_(self):
+            opened.append(self.uri)
+            return(original(self))
+        NcRequestDataset._open_ = _open_
+        try:
+            ## a second request dataset does not open the source
+            rd2 = ocgis.RequestDataset(uri=uri,variable='tas')
+            self.assertEqual(rd2._source_metadata['dim_map'],metadata['dim_map'])
+            self.assertEqual(rd2._source_metadata['variables'].keys(),metadata['variables'].keys())
+            self.assertEqual(len(opened),0)
+            
+            ## a changed file is parsed again
+            mtime = os.path.getmtime(uri)+1
+            os.utime(uri,(mtime,mtime))
+            ocgis.RequestDataset(uri=uri,variable='tas')._source_metadata
+            self.assertEqual(opened,[uri])
+        finally:
+            NcRequestDataset._open_ = original
+        
+        field = ocgis.RequestDataset(uri=uri,variable='tas').get()
+        self.assertEqual(field.shape,rd.get().shape)
@@ -1,6 +1,8 @@
 from ocgis.test.base import TestBase
 import ocgis
-from ocgis.util.large_array import compute
+from ocgis.util.large_array import compute, get_tiling, _get_fill_time_indices_,\
+ _compute_tile_, _init_tile_worker_
+from ocgis.api.operations import OcgOperations
 import netCDF4 as nc
 import numpy as np
 from ocgis.calc import tile
@@ -52,7 +54,113 @@ class Test(TestBase):
             
             tile_ds.close()
         std_ds.close()
-    
+
+    @longrunning
+    def test_compute_parallel(self):
+        rd = RequestDatasetCollection(self.test_data.get_rd('cancm4_tasmax_2011'))
+        calc = [{'func':'mean','name':'my_mean'},
+                {'func':'freq_perc','name':'perc_90','kwds':{'percentile':90,}}]
+        calc_grouping = ['month']
+
+        serial_file = compute(rd,calc,calc_grouping,25,prefix='serial',serial=True)
+        parallel_file = compute(rd,calc,calc_grouping,25,prefix='parallel',serial=False,
+                                nprocs=3)
+        self.assertNotEqual(serial_file,parallel_file)
+        self.assertNcEqual(serial_file,parallel_file)
+        
+    @longrunning
+    def test_compute_parallel_env_not_serial(self):
+        rd = RequestDatasetCollection(self.test_data.get_rd('cancm4_tasmax_2011'))
+        calc = [{'func':'mean','name':'my_mean'}]
+        calc_grouping = ['month']
+
+        serial_file = compute(rd,calc,calc_grouping,25,prefix='serial',serial=True)
+        ## workers subset serially regardless of the environment
+        ocgis.env.SERIAL = False
+        parallel_file = compute(rd,calc,calc_grouping,25,prefix='parallel',serial=False,
+                                nprocs=2)
+        self.assertFalse(ocgis.env.SERIAL)
+        self.assertNcEqual(serial_file,parallel_file)
+
+    def test_compute_tile(self):
+        rd = RequestDatasetCollection(self.test_data.get_rd('cancm4_tasmax_2011'))
+        calc = [{'func':'mean','name':'my_mean'}]
+        ocgis.env.SERIAL = False
+        ocgis.env.MEMORY_LIMIT = 1
+        ## tile operations are not planned for the interpreter's memory check
+        def get_plan(*args,**kwds):
+            raise(AssertionError('tile operations were planned'))
+        original = OcgOperations.__dict__['get_plan']
+        OcgOperations.get_plan = get_plan
+        _init_tile_worker_(rd,calc,['month'])
+        try:
+            indices,values = _compute_tile_({'row':[0,2],'col':[0,3]})
+        finally:
+            OcgOperations.get_plan = original
+            _init_tile_worker_(None,None,None)
+        self.assertEqual(values[0][1].shape,(1,12,1,2,3))
+        ## the worker restores the environment
+        self.assertFalse(ocgis.env.SERIAL)
+        self.assertEqual(ocgis.env.MEMORY_LIMIT,1)
+
+    @longrunning
+    def test_compute_memory_limit(self):
+        rd = RequestDatasetCollection(self.test_data.get_rd('cancm4_tasmax_2011'))
+        calc = [{'func':'mean','name':'my_mean'}]
+        calc_grouping = ['month','year']
+
+        std_file = ocgis.OcgOperations(dataset=rd,output_format='nc',calc=calc,
+                                       calc_grouping=calc_grouping,prefix='std').execute()
+        ## a limit requiring time blocks
+        ocgis.env.MEMORY_LIMIT = 2
+        tile_file = compute(rd,calc,calc_grouping,prefix='tile')
+        self.assertNcEqual(std_file,tile_file)
+
+    def test_get_fill_time_indices(self):
+        fill_time = np.array([15.,45.,74.,105.])
+        self.assertEqual(_get_fill_time_indices_(fill_time,np.array([74.,15.])).tolist(),[2,0])
+        self.assertEqual(_get_fill_time_indices_(fill_time[::-1],np.array([105.+1e-9])).tolist(),[0])
+        with self.assertRaises(ValueError):
+            _get_fill_time_indices_(fill_time,np.array([45.,60.]))
+
+    def test_get_tiling(self):
+        rd = RequestDatasetCollection(self.test_data.get_rd('cancm4_tasmax_2011'))
+        field = rd[0].get()
+        calc = [{'func':'mean','name':'my_mean'}]
+        ntime = field.shape[1]
+
+        ## no memory limit
+        self.assertEqual(get_tiling(rd,field,calc,['month'],tile_dimension=10),(10,None))
+        with self.assertRaises(ValueError):
+            compute(rd,calc,['month'])
+
+        ## the whole time series fits but the spatial dimension is limited
+        ocgis.env.MEMORY_LIMIT = 10
+        tile_dimension,time_blocks = get_tiling(rd,field,calc,['month'])
+        self.assertIsNone(time_blocks)
+        self.assertTrue(tile_dimension*tile_dimension*ntime*4*4 <= 10*1024**2)
+
+        ## time blocks contain whole years and cover the time axis
+        ocgis.env.MEMORY_LIMIT = 2
+        tile_dimension,time_blocks = get_tiling(rd,field,calc,['month','year'])
+        self.assertTrue(len(time_blocks) > 1)
+        self.assertEqual(time_blocks[0][0],0)
+        self.assertEqual(time_blocks[-1][1],ntime)
+        ## years are read from date parts without creating datetime objects
+        self.assertIsNone(field.temporal._value_datetime)
+        years = [dt.year for dt in field.temporal.value_datetime]
+        for time_block in time_blocks[1:]:
+            self.assertNotEqual(years[time_block[0]-1],years[time_block[0]])
+
+        ## seasonal groups are not contiguous in time
+        tile_dimension,time_blocks = get_tiling(rd,field,calc,[[12,1,2]])
+        self.assertIsNone(time_blocks)
+
+        ## memory limit too small
+        ocgis.env.MEMORY_LIMIT = 0.0001
+        with self.assertRaises(ValueError):
+            get_tiling(rd,field,calc,['month'])
+
     def get_random_integer(self,low=1,high=100):
         return(int(np.random.random_integers(low,high)))
 
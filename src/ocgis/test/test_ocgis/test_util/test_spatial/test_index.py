@@ -0,0 +1,52 @@
+from ocgis.test.base import TestBase
+from ocgis.util.spatial.index import SpatialIndex
+from ocgis.util.helpers import make_poly
+from ocgis.interface.base.dimension.spatial import SpatialDimension
+from ocgis.interface.base.dimension.base import VectorDimension
+from ocgis import env
+from shapely.geometry.multipolygon import MultiPolygon
+import numpy as np
+
+
+class TestSpatialIndex(TestBase):
+
+    def get_boxes(self,n=20):
+        ## a grid of unit boxes
+        x,y = np.meshgrid(np.arange(n),np.arange(n))
+        x,y = x.flatten().astype(float),y.flatten().astype(float)
+        return(np.column_stack((x,y,x+1,y+1)))
+
+    def test_query(self):
+        boxes = self.get_boxes()
+        for capacity in [2,4,16,1000]:
+            index = SpatialIndex(boxes,capacity=capacity)
+            self.assertEqual(index.size,400)
+            for bounds in [(0.5,0.5,0.75,0.75),(3.2,4.5,7.1,5.5),(-10,-10,-5,-5),(-1,-1,100,100),(1,1,1,1)]:
+                minx,miny,maxx,maxy = bounds
+                actual = np.nonzero((boxes[:,0] <= maxx) & (boxes[:,2] >= minx) & (boxes[:,1] <= maxy) & (boxes[:,3] >= miny))[0]
+                self.assertNumpyAll(index.query(bounds),actual)
+
+    def test_empty(self):
+        index = SpatialIndex(np.zeros((0,4)))
+        self.assertEqual(index.query((0,0,1,1)).shape,(0,))
+
+    def test_intersects_masked(self):
+        ## the indexed and legacy intersects masks are equivalent
+        value = np.arange(-10.,10.)
+        bounds = np.column_stack((value-0.5,value+0.5))
+        row = VectorDimension(value=value,bounds=bounds,name='row')
+        col = VectorDimension(value=value,bounds=bounds,name='col')
+        polygons = [make_poly((-3.2,4.1),(-7.5,2.5)),
+                    MultiPolygon([make_poly((-9,-8),(-9,-8)),make_poly((5.5,7.25),(0.1,0.2))]),
+                    make_poly((-3.2,4.1),(-7.5,2.5)).buffer(2)]
+        for polygon in polygons:
+            masks = []
+            for use in [True,False]:
+                env.USE_SPATIAL_INDEX = use
+                for target in ['point','polygon']:
+                    sdim = SpatialDimension(row=row,col=col)
+                    dim = getattr(sdim.geom,target)
+                    masks.append(dim.get_intersects_masked(polygon).mask)
+            self.assertNumpyAll(masks[0],masks[2])
+            self.assertNumpyAll(masks[1],masks[3])
+            self.assertFalse(masks[1].all())
@@ -0,0 +1,60 @@
+from ocgis.test.base import TestBase
+from ocgis.util.spatial.scanline import get_rectilinear_intersects, get_segments
+from ocgis.util.helpers import make_poly
+from shapely.geometry.polygon import Polygon
+from shapely.geometry.multipolygon import MultiPolygon
+from shapely.geometry.point import Point
+import numpy as np
+
+
+class TestScanline(TestBase):
+
+    def get_polygons(self):
+        ring = make_poly((-4,4),(-4,4))
+        hole = Polygon(ring.exterior.coords,[make_poly((-1.3,1.3),(-1.3,1.3)).exterior.coords])
+        ret = [make_poly((-2.2,3.7),(-5.5,1.5)),
+               Point(0.3,0.1).buffer(4.7),
+               hole,
+               MultiPolygon([make_poly((-9,-8),(-9,-8)),Polygon([(2,2),(7,3),(4,8)])]),
+               ## edges on cell boundaries
+               make_poly((-2.5,2.5),(-2.5,2.5))]
+        return(ret)
+
+    def test_get_rectilinear_intersects(self):
+        value = np.arange(-10.,10.)
+        for rvalue in [value,value[::-1]]:
+            row_bounds = np.column_stack((rvalue-0.5,rvalue+0.5))
+            col_bounds = np.column_stack((value-0.5,value+0.5))
+            for polygon in self.get_polygons():
+                inside,boundary = get_rectilinear_intersects(row_bounds,col_bounds,polygon)
+                self.assertFalse(np.logical_and(inside,boundary).any())
+                for ii,jj in np.ndindex(*inside.shape):
+                    cell = make_poly(row_bounds[ii],col_bounds[jj])
+                    if inside[ii,jj]:
+                        self.assertTrue(polygon.contains(cell))
+                    elif not boundary[ii,jj]:
+                        self.assertFalse(polygon.intersects(cell))
+                    if cell.intersects(polygon.boundary):
+                        self.assertTrue(boundary[ii,jj])
+
+    def test_points(self):
+        value = np.arange(-10.,10.)
+        bounds = np.column_stack((value,value))
+        polygon = self.get_polygons()[1]
+        inside,boundary = get_rectilinear_intersects(bounds,bounds,polygon)
+        for ii,jj in np.ndindex(*inside.shape):
+            point = Point(value[jj],value[ii])
+            if inside[ii,jj]:
+                self.assertTrue(polygon.contains(point))
+            elif not boundary[ii,jj]:
+                self.assertFalse(polygon.intersects(point))
+
+    def test_not_monotonic(self):
+        bounds = np.array([[0,1],[1,2],[-1,3]])
+        with self.assertRaises(ValueError):
+            get_rectilinear_intersects(bounds,bounds,make_poly((0,1),(0,1)))
+
+    def test_get_segments(self):
+        segments = get_segments(make_poly((0,1),(0,2)))
+        self.assertEqual(segments.shape,(4,4))
+        self.assertNumpyAll(segments[:,0:2],segments[[3,0,1,2],2:4])
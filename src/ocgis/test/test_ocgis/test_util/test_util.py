@@ -1,7 +1,8 @@
 #from ocgis.interface.shp import ShpDataset
 import numpy as np
 from ocgis.util.helpers import format_bool, iter_array, validate_time_subset,\
-    get_formatted_slice, get_is_date_between
+    get_formatted_slice, get_is_date_between, get_contiguous_runs,\
+    get_hyperslab_value, get_weighted_average
 import itertools
 from ocgis.test.base import TestBase
 #from ocgis.util.spatial.wrap import Wrapper
@@ -24,6 +25,79 @@ class TestHelpers(TestBase):
         upper = dt(2013, 1, 2, 0, 0)
         self.assertTrue(get_is_date_between(lower,upper,year=2013))
             
+    def test_get_contiguous_runs(self):
+        self.assertEqual(get_contiguous_runs(np.array([1,2,3,7,8,10])),[[1,4],[7,9],[10,11]])
+        self.assertEqual(get_contiguous_runs(np.arange(5)),[[0,5]])
+        self.assertEqual(get_contiguous_runs(np.array([4])),[[4,5]])
+        self.assertEqual(get_contiguous_runs(np.array([3,2])),[[3,4],[2,3]])
+        self.assertEqual(get_contiguous_runs(np.array([],dtype=int)),[])
+            
+    def test_get_hyperslab_value(self):
+        
+        class Variable(object):
+            
+            def __init__(self,value):
+                self.value = value
+                self.shape = value.shape
+                self.reads = []
+                
+            def __getitem__(self,slc):
+                self.reads.append(slc)
+                return(self.value[np.ix_(*[np.arange(s)[x] for s,x in zip(self.shape,slc)])])
+        
+        arr = np.ma.array(np.arange(60).reshape(5,3,4),mask=False)
+        arr.mask[4,0,0] = True
+        var = Variable(arr)
+        indices = [np.array([0,1,3,4]),slice(0,2),np.array([2,3])]
+        actual = arr[np.ix_(np.array([0,1,3,4]),np.arange(2),np.array([2,3]))]
+        ret = get_hyperslab_value(var,indices)
+        self.assertTrue(np.all(ret == actual))
+        self.assertEqual(len(var.reads),2)
+        self.assertTrue(all([isinstance(s,slice) for s in var.reads[0]]))
+        
+        ## masks are preserved
+        ret = get_hyperslab_value(var,[np.array([0,4]),np.array([0]),np.array([0])])
+        self.assertEqual(ret.mask.tolist(),[[[False]],[[True]]])
+        
+        ## contiguous indices are read once
+        var.reads = []
+        ret = get_hyperslab_value(var,[np.array([1,2,3]),slice(None),slice(None)])
+        self.assertEqual(var.reads,[(slice(1,4),slice(None),slice(None))])
+        self.assertEqual(ret.shape,(3,3,4))
+        
+        ## too many reads falls back to index arrays
+        var.reads = []
+        ret = get_hyperslab_value(var,[np.array([0,2,4]),slice(None),np.array([0,2])],max_reads=3)
+        self.assertEqual(len(var.reads),2)
+        self.assertIsInstance(var.reads[0][0],np.ndarray)
+        self.assertTrue(np.all(ret == arr[np.ix_([0,2,4],np.arange(3),[0,2])]))
+        
+        ## plain arrays are returned for unmasked sources
+        ret = get_hyperslab_value(np.arange(10),[np.array([1,5,6])])
+        self.assertNotIsInstance(ret,np.ma.MaskedArray)
+        self.assertEqual(ret.tolist(),[1,5,6])
+        
+        with self.assertRaises(ValueError):
+            get_hyperslab_value(var,[slice(None)])
+            
+    def test_get_weighted_average(self):
+        value = np.ma.array(np.random.rand(2,5,1,3,4),mask=False)
+        value.mask[0,1,0,1,2] = True
+        value.mask[1,3,0,:,:] = True
+        weights = np.ma.array(np.random.rand(3,4),mask=False)
+        weights.mask[2,0] = True
+        ## small chunks produce the same averages
+        for chunk_size in [None,13]:
+            ret = get_weighted_average(value,weights,chunk_size=chunk_size)
+            self.assertEqual(ret.shape,(2,5,1))
+            for idx in itertools.product(*[range(s) for s in ret.shape]):
+                actual = np.ma.average(value[idx],weights=weights)
+                if actual is np.ma.masked:
+                    self.assertTrue(ret.mask[idx])
+                else:
+                    self.assertAlmostEqual(ret[idx],actual)
+        self.assertEqual(ret.mask.sum(),1)
+            
     def test_get_formatted_slc(self):
         ret = get_formatted_slice(slice(None,None,None),10)
         self.assertEqual(ret,[slice(None,None,None)]*10)
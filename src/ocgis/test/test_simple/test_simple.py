@@ -440,6 +440,24 @@ class TestSimple(TestSimpleBase):
             self.assertEqual(ref.shape,(1,2,2,1,1))
             self.assertEqual(ref.flatten().mean(),2.5)
             
+    def test_parallel(self):
+        geom = [{'geom':make_poly((37.5,39.5),(-104.5,-102.5)),'properties':{'UGID':1}},
+                {'geom':make_poly((38.5,40.5),(-103.5,-101.5)),'properties':{'UGID':2}},
+                {'geom':make_poly((37.5,38.5),(-102.5,-101.5)),'properties':{'UGID':3}}]
+        for calc in [None,[{'func':'mean','name':'my_mean'}]]:
+            kwds = {'geom':geom,'calc':calc,'calc_grouping':['month'] if calc else None}
+            serial = self.get_ret(kwds=deepcopy(kwds))
+            env.SERIAL = False
+            env.CORES = 2
+            try:
+                parallel = self.get_ret(kwds=deepcopy(kwds))
+            finally:
+                env.SERIAL = True
+            self.assertEqual(serial.keys(),parallel.keys())
+            alias = 'foo' if calc is None else 'my_mean_foo'
+            for ugid in serial.keys():
+                self.assertNumpyAll(serial.gvu(ugid,alias),parallel.gvu(ugid,alias))
+
     def test_calc_multivariate(self):
         rd1 = self.get_dataset()
         rd1['alias'] = 'var1'
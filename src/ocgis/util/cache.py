@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import hashlib
+import cPickle
+import logging
+from collections import OrderedDict
+from ocgis import env, constants
+from ocgis.util.logging_ocgis import ocgis_lh
+
+
+## in-memory layer of pickled values shared by all caches in the process
+_MEMORY = OrderedDict()
+_MEMORY_SIZE = 0
+
+
+class OcgCache(object):
+    '''
+    A persistent key-value store backed by a SQLite database in :attr:`ocgis.env.DIR_CACHE`.
+    Values are pickled. Recently used values are also held in memory up to
+    :attr:`ocgis.constants.cache_memory_size` bytes. Caching is
+    disabled if :attr:`ocgis.env.DIR_CACHE` is None.
+
+    .. warning:: Values read from the cache database are unpickled and unpickling
+       may execute arbitrary code. :attr:`ocgis.env.DIR_CACHE` must be a private
+       directory writable only by the current user. Never point it at a shared or
+       world-writable location.
+
+    Keys must have a stable :func:`repr` (i.e. tuples of strings and numbers). Keys
+    for values derived from files should include the file signature as returned
+    by :func:`~ocgis.util.cache.get_file_signature`.
+
+    >>> cache = OcgCache('foo')
+    >>> cache.set(('a',1),{'value':5})
+    >>> cache.get(('a',1))
+    {'value': 5}
+
+    :param str namespace: The name separating this cache's keys from other caches.
+    '''
+
+    def __init__(self,namespace):
+        self.namespace = namespace
+
+    @property
+    def enabled(self):
+        return(env.DIR_CACHE is not None)
+
+    @property
+    def path(self):
+        return(os.path.join(env.DIR_CACHE,constants.cache_filename))
+
+    def clear(self):
+        '''
+        Remove all values for the namespace from memory and disk.
+        '''
+        global _MEMORY_SIZE
+        for key in _MEMORY.keys():
+            if key[1] == self.namespace:
+                _MEMORY_SIZE -= len(_MEMORY.pop(key))
+        if self.enabled:
+            self._execute_('DELETE FROM cache WHERE namespace = ?',(self.namespace,))
+
+    def get(self,key,default=None):
+        '''
+        :param key: The value's key.
+        :param default: The value to return if the key is not found.
+        '''
+        if not self.enabled:
+            return(default)
+
+        hkey = self._get_hashed_key_(key)
+        mkey = (self.path,self.namespace,hkey)
+        try:
+            blob = _MEMORY.pop(mkey)
+            _MEMORY[mkey] = blob
+        except KeyError:
+            rows = self._execute_('SELECT value FROM cache WHERE namespace = ? AND key = ?',
+                                  (self.namespace,hkey))
+            if rows:
+                blob = str(rows[0][0])
+                self._set_memory_(mkey,blob)
+            else:
+                return(default)
+        ## values are unpickled for each access so callers may modify them
+        return(cPickle.loads(blob))
+
+    def set(self,key,value):
+        '''
+        :param key: The value's key.
+        :param value: Any picklable object.
+        '''
+        if not self.enabled:
+            return
+
+        hkey = self._get_hashed_key_(key)
+        blob = cPickle.dumps(value,cPickle.HIGHEST_PROTOCOL)
+        self._set_memory_((self.path,self.namespace,hkey),blob)
+        self._execute_('INSERT OR REPLACE INTO cache (namespace,key,value) VALUES (?,?,?)',
+                       (self.namespace,hkey,sqlite3.Binary(blob)))
+
+    def _execute_(self,sql,args):
+        ## a connection is opened for each statement so connections are never
+        ## shared by forked processes.
+        ret = []
+        try:
+            conn = sqlite3.connect(self.path,timeout=constants.cache_timeout)
+            try:
+                conn.execute('CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value BLOB, PRIMARY KEY (namespace,key))')
+                ret = conn.execute(sql,args).fetchall()
+                conn.commit()
+            finally:
+                conn.close()
+        ## caching failures should never fail an operation
+        except sqlite3.Error as e:
+            ocgis_lh(msg='cache access failed: {0}'.format(e),logger='cache',level=logging.WARN)
+        return(ret)
+
+    def _get_hashed_key_(self,key):
+        return(hashlib.sha1(repr(key)).hexdigest())
+
+    def _set_memory_(self,mkey,blob):
+        global _MEMORY_SIZE
+        if mkey in _MEMORY:
+            _MEMORY_SIZE -= len(_MEMORY.pop(mkey))
+        _MEMORY[mkey] = blob
+        _MEMORY_SIZE += len(blob)
+        ## remove the least recently used values
+        while _MEMORY_SIZE > constants.cache_memory_size and len(_MEMORY) > 0:
+            _MEMORY_SIZE -= len(_MEMORY.popitem(last=False)[1])
+
+
+def get_file_signature(uri):
+    '''
+    :param uri: A path or sequence of paths.
+    :type uri: str or sequence
+    :returns: A tuple of absolute path, size, and modification time for each file.
+     None is returned if any path is not a local file.
+    :rtype: tuple
+    '''
+    uris = [uri] if isinstance(uri,basestring) else uri
+    ret = []
+    for u in uris:
+        if not os.path.isfile(u):
+            return(None)
+        st = os.stat(u)
+        ret.append((os.path.abspath(u),st.st_size,st.st_mtime))
+    return(tuple(ret))
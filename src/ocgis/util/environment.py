@@ -19,6 +19,10 @@ class Environment(object):
         self.ENABLE_FILE_LOGGING = EnvParm('ENABLE_FILE_LOGGING',True,formatter=self._format_bool_)
         self.DEBUG = EnvParm('DEBUG',False,formatter=self._format_bool_)
         self.DIR_BIN = EnvParm('DIR_BIN',None)
+        self.MEMORY_LIMIT = EnvParm('MEMORY_LIMIT',None,formatter=float)
+        self.NC_POOL_SIZE = EnvParm('NC_POOL_SIZE',8,formatter=int)
+        self.DIR_CACHE = EnvParm('DIR_CACHE',None)
+        self.USE_SPATIAL_INDEX = EnvParm('USE_SPATIAL_INDEX',True,formatter=self._format_bool_)
         
         self.ops = None
         self._optimize_store = {}
@@ -77,15 +77,101 @@ class FionaMaker(object):
     
 
 def project_shapely_geometry(geom,from_sr,to_sr):
+    from ocgis.interface.base.crs import crs_registry
+    
     if from_sr.IsSame(to_sr) == 1:
         ret = geom
     else:
         ogr_geom = CreateGeometryFromWkb(geom.wkb)
-        ogr_geom.AssignSpatialReference(from_sr)
-        ogr_geom.TransformTo(to_sr)
+        ogr_geom.Transform(crs_registry.get_transformation(from_sr,to_sr))
         ret = wkb_loads(ogr_geom.ExportToWkb())
     return(ret)
 
+def get_transformed_coordinates(x,y,from_sr,to_sr):
+    '''
+    Transform coordinate arrays with a single call to :meth:`osgeo.osr.CoordinateTransformation.TransformPoints`.
+    
+    :param x: The x coordinates.
+    :type x: :class:`numpy.ndarray`
+    :param y: The y coordinates with the shape of ``x``.
+    :type y: :class:`numpy.ndarray`
+    :type from_sr: :class:`osgeo.osr.SpatialReference`
+    :type to_sr: :class:`osgeo.osr.SpatialReference`
+    :returns: The transformed x and y coordinates with the shape of ``x``.
+    :rtype: tuple
+    '''
+    x = np.asarray(x,dtype=float)
+    y = np.asarray(y,dtype=float)
+    if x.size == 0:
+        return(x.copy(),y.copy())
+    from ocgis.interface.base.crs import crs_registry
+    transform = crs_registry.get_transformation(from_sr,to_sr)
+    points = np.column_stack((x.ravel(),y.ravel())).tolist()
+    ret = np.array(transform.TransformPoints(points),dtype=float)
+    return(ret[:,0].reshape(x.shape),ret[:,1].reshape(x.shape))
+
+def get_transformed_geometries(geoms,from_sr,to_sr):
+    '''
+    Transform geometries using a single batched coordinate transformation. Geometries
+    are rebuilt from the transformed coordinates.
+    
+    :param geoms: A sequence of points, polygons, and their multi-part equivalents.
+    :type geoms: sequence
+    :type from_sr: :class:`osgeo.osr.SpatialReference`
+    :type to_sr: :class:`osgeo.osr.SpatialReference`
+    :returns: The transformed geometries in the order of ``geoms``.
+    :rtype: list
+    :raises: NotImplementedError
+    '''
+    from shapely.geometry.point import Point
+    from shapely.geometry.multipoint import MultiPoint
+    
+    ## collect the coordinate sequences of each geometry. polygons are stored as
+    ## a list of rings with the exterior first.
+    sequences = []
+    def _add_(coords):
+        sequences.append(np.array(coords)[:,0:2])
+        return(len(sequences)-1)
+    def _add_polygon_(polygon):
+        return([_add_(polygon.exterior.coords)]+[_add_(ring.coords) for ring in polygon.interiors])
+    
+    structure = []
+    for geom in geoms:
+        geom_type = geom.geom_type
+        if geom.is_empty:
+            structure.append((None,geom))
+        elif geom_type == 'Point':
+            structure.append((geom_type,_add_(geom.coords)))
+        elif geom_type == 'MultiPoint':
+            structure.append((geom_type,[_add_(part.coords) for part in geom]))
+        elif geom_type == 'Polygon':
+            structure.append((geom_type,_add_polygon_(geom)))
+        elif geom_type == 'MultiPolygon':
+            structure.append((geom_type,[_add_polygon_(part) for part in geom]))
+        else:
+            raise(NotImplementedError(geom_type))
+    
+    if len(sequences) > 0:
+        stacked = np.vstack(sequences)
+        x,y = get_transformed_coordinates(stacked[:,0],stacked[:,1],from_sr,to_sr)
+        splits = np.cumsum([seq.shape[0] for seq in sequences])[:-1]
+        sequences = np.split(np.column_stack((x,y)),splits)
+    
+    ret = []
+    for geom_type,idx in structure:
+        if geom_type is None:
+            geom = idx
+        elif geom_type == 'Point':
+            geom = Point(*sequences[idx][0])
+        elif geom_type == 'MultiPoint':
+            geom = MultiPoint([tuple(sequences[ii][0]) for ii in idx])
+        elif geom_type == 'Polygon':
+            geom = Polygon(sequences[idx[0]],[sequences[ii] for ii in idx[1:]])
+        else:
+            geom = MultiPolygon([Polygon(sequences[part[0]],[sequences[ii] for ii in part[1:]]) for part in idx])
+        ret.append(geom)
+    return(ret)
+
 def assert_raise(test,**kwds):
     try:
         assert(test)
@@ -141,6 +227,145 @@ def get_reduced_slice(arr):
     ret = slice(arr_min,arr_max+1)
     return(ret)
 
+def get_contiguous_runs(arr):
+    '''
+    :param arr: A one-dimensional array of integer indices.
+    :type arr: :class:`numpy.ndarray`
+    :returns: A list of ``[start,stop]`` pairs for each run of consecutive increasing
+     indices. ``stop`` is exclusive.
+    :rtype: list
+    
+    >>> get_contiguous_runs(np.array([1,2,3,7,8,10]))
+    [[1, 4], [7, 9], [10, 11]]
+    '''
+    arr = np.atleast_1d(arr)
+    if arr.size == 0:
+        return([])
+    breaks = np.nonzero(np.diff(arr) != 1)[0]+1
+    starts = np.concatenate(([0],breaks))
+    stops = np.concatenate((breaks,[arr.shape[0]]))
+    ret = [[int(arr[start]),int(arr[stop-1])+1] for start,stop in zip(starts,stops)]
+    return(ret)
+
+def get_hyperslab_value(variable,indices,max_reads=None):
+    '''
+    Read from a variable using contiguous hyperslabs. Integer index arrays are split
+    into runs of consecutive indices and each combination of runs is read as a slice.
+    This avoids the element-wise reads performed by :class:`netCDF4.Variable` for
+    index arrays.
+    
+    >>> value = get_hyperslab_value(ds.variables['tas'],[np.array([0,1,2,10,11]),slice(0,5),slice(0,5)])
+    
+    :param variable: The sliceable source variable.
+    :type variable: :class:`netCDF4.Variable` or :class:`numpy.ndarray`
+    :param indices: A slice or one-dimensional integer index array for each dimension
+     of ``variable``.
+    :type indices: sequence
+    :param int max_reads: The maximum number of reads. If exceeded, axes with the most
+     runs are read using their index arrays. If None, use :attr:`ocgis.constants.hyperslab_max_reads`.
+    :raises: ValueError
+    :rtype: :class:`numpy.ma.MaskedArray` or :class:`numpy.ndarray`
+    '''
+    from ocgis import constants
+    
+    if len(indices) != len(variable.shape):
+        raise(ValueError('{0} indices provided for a variable with {1} dimensions.'.format(len(indices),len(variable.shape))))
+    max_reads = max_reads or constants.hyperslab_max_reads
+    
+    runs = []
+    for idx in indices:
+        if isinstance(idx,slice):
+            runs.append([idx])
+        else:
+            runs.append([slice(start,stop) for start,stop in get_contiguous_runs(idx)])
+    
+    ## fall back to index arrays for the axes with the most runs
+    nreads = reduce(lambda x,y: x*y,[len(r) for r in runs],1)
+    for ii in sorted(range(len(runs)),key=lambda x: len(runs[x]),reverse=True):
+        if nreads <= max_reads:
+            break
+        nreads /= len(runs[ii])
+        runs[ii] = [np.atleast_1d(indices[ii])]
+    
+    if nreads == 1:
+        return(variable[tuple([r[0] for r in runs])])
+    
+    ## pair each read with its location in the output
+    axes = []
+    for r,length in zip(runs,variable.shape):
+        entries = []
+        start = 0
+        for read in r:
+            if isinstance(read,slice):
+                size = len(xrange(*read.indices(length)))
+            else:
+                size = read.shape[0]
+            entries.append((read,slice(start,start+size)))
+            start += size
+        axes.append(entries)
+    shape = [entries[-1][1].stop for entries in axes]
+    
+    ret = None
+    masked = False
+    for block in itertools.product(*axes):
+        value = variable[tuple([b[0] for b in block])]
+        if ret is None:
+            ret = np.ma.array(np.empty(shape,dtype=value.dtype),mask=False)
+        if isinstance(value,np.ma.MaskedArray):
+            if not masked:
+                ret.fill_value = value.fill_value
+            masked = True
+        ret[tuple([b[1] for b in block])] = value
+    ## match the return type of a single read
+    if not masked:
+        ret = ret.data
+    return(ret)
+
+def get_weighted_average(value,weights,chunk_size=None):
+    '''
+    Weighted average over the last two axes of a masked array. This is equivalent
+    to calling :func:`numpy.ma.average` for each two-dimensional slab but computed
+    as a single weighted sum in chunks along the leading axes.
+    
+    >>> value = np.ma.array(np.random.rand(2,10,1,3,4))
+    >>> get_weighted_average(value,np.ones((3,4))).shape
+    (2, 10, 1)
+    
+    :param value: The array to average with at least two dimensions.
+    :type value: :class:`numpy.ma.MaskedArray`
+    :param weights: Weights with the shape of the last two axes of ``value``. Masked
+     weights are excluded.
+    :type weights: :class:`numpy.ma.MaskedArray`
+    :param int chunk_size: The maximum number of elements of ``value`` reduced at once.
+     If None, use :attr:`ocgis.constants.aggregation_chunk_size`.
+    :returns: The averages with shape ``value.shape[:-2]``. Slabs with no unmasked
+     values or zero total weight are masked.
+    :rtype: :class:`numpy.ma.MaskedArray`
+    '''
+    from ocgis import constants
+    
+    chunk_size = chunk_size or constants.aggregation_chunk_size
+    shp = value.shape
+    ncell = shp[-2]*shp[-1]
+    nslab = int(np.prod(shp[:-2]))
+    
+    weights = np.ma.filled(np.ma.array(weights,dtype=float),0).reshape(ncell)
+    data = np.ma.getdata(value).reshape(nslab,ncell)
+    mask = np.ma.getmaskarray(value).reshape(nslab,ncell)
+    
+    numerator = np.zeros(nslab,dtype=float)
+    denominator = np.zeros(nslab,dtype=float)
+    step = max(1,chunk_size//max(ncell,1))
+    for start in xrange(0,nslab,step):
+        valid = np.invert(mask[start:start+step])
+        numerator[start:start+step] = np.dot(np.where(valid,data[start:start+step],0),weights)
+        denominator[start:start+step] = np.dot(valid,weights)
+    
+    empty = denominator == 0
+    denominator[empty] = 1
+    ret = np.ma.array(numerator/denominator,mask=empty)
+    return(ret.reshape(shp[:-2]))
+
 def get_formatted_slice(slc,n_dims):
     
     def _format_(slc):
@@ -4,18 +4,38 @@ import netCDF4 as nc
 from ocgis.util.helpers import ProgressBar
 from ocgis.api.request.base import RequestDatasetCollection
 import numpy as np
+from multiprocessing import Pool
+from itertools import imap
+from ocgis import constants
 
 
-def compute(dataset,calc,calc_grouping,tile_dimension,verbose=False,prefix=None):
+def compute(dataset,calc,calc_grouping,tile_dimension=None,verbose=False,prefix=None,
+            serial=None,nprocs=None):
     '''
     :type dataset: RequestDatasetCollection
+    :param tile_dimension: The row and column length of a square tile. If None,
+     the tile dimension is derived from :attr:`ocgis.env.MEMORY_LIMIT`.
+    :type tile_dimension: int
+    :param serial: If False, tiles are computed by a pool of worker processes.
+     Only the parent process writes to the output file. Defaults to
+     :attr:`ocgis.env.SERIAL`.
+    :type serial: bool
+    :param nprocs: The number of worker processes. Defaults to :attr:`ocgis.env.CORES`.
+    :type nprocs: int
     '''
     assert(isinstance(dataset,RequestDatasetCollection))
     assert(type(calc) in (list,tuple))
     
-    tile_dimension = int(tile_dimension)
-    if tile_dimension <= 0:
-        raise(ValueError('"tile_dimension" must be greater than 0'))
+    if tile_dimension is None:
+        if ocgis.env.MEMORY_LIMIT is None:
+            raise(ValueError('"tile_dimension" is required if "env.MEMORY_LIMIT" is None'))
+    else:
+        tile_dimension = int(tile_dimension)
+        if tile_dimension <= 0:
+            raise(ValueError('"tile_dimension" must be greater than 0'))
+    
+    serial = ocgis.env.SERIAL if serial is None else serial
+    nprocs = ocgis.env.CORES if nprocs is None else nprocs
     
     orig_oc = ocgis.env.OPTIMIZE_FOR_CALC
     ocgis.env.OPTIMIZE_FOR_CALC = False
@@ -25,51 +45,60 @@ def compute(dataset,calc,calc_grouping,tile_dimension,verbose=False,prefix=None)
         ## tell the software we are optimizing for calculations   
         ocgis.env.OPTIMIZE_FOR_CALC = True
         ods = dataset[0].get()
-#        ods = NcDataset(request_dataset=dataset[0])
         shp = ods.shape[-2:]
 
         if verbose: print('getting schema...')
+        tile_dimension,time_blocks = get_tiling(dataset,ods,calc,calc_grouping,
+                                                tile_dimension=tile_dimension)
         schema = tile.get_tile_schema(shp[0],shp[1],tile_dimension)
+        if time_blocks is not None:
+            schema = _get_time_blocked_schema_(schema,time_blocks)
+        if verbose: print('tile dimension: {0}, time blocks: {1}'.format(tile_dimension,
+                          1 if time_blocks is None else len(time_blocks)))
         if verbose: print('getting fill file...')
         fill_file = ocgis.OcgOperations(dataset=dataset,file_only=True,
                                       calc=calc,calc_grouping=calc_grouping,
                                       output_format='nc',prefix=prefix).execute()
         if verbose: print('output file is: {0}'.format(fill_file))
+        lschema = len(schema)
         if verbose:
-            lschema = len(schema)
             print('tile count: {0}'.format(lschema))
         fds = nc.Dataset(fill_file,'a')
+        if time_blocks is None:
+            fill_time = None
+        else:
+            fill_time = fds.variables[ods.meta['dim_map']['T']['variable']][:]
         if verbose:
             progress = ProgressBar('tiles progress')
-        for ctr,indices in enumerate(schema.itervalues(),start=1):
-            row = indices['row']
-            col = indices['col']
-            ret = ocgis.OcgOperations(dataset=dataset,slice=[None,None,None,row,col],
-                                calc=calc,calc_grouping=calc_grouping).execute()
-            for field_map in ret.itervalues():
-                for field in field_map.itervalues():
-                    for alias,variable in field.variables.iteritems():
-                        vref = fds.variables[alias]
-                        if len(vref.shape) == 3:
-                            vref[:,row[0]:row[1],col[0]:col[1]] = np.squeeze(variable.value)
-                        elif len(vref.shape) == 4:
-                            vref[:,:,row[0]:row[1],col[0]:col[1]] = np.squeeze(variable.value)
-                        else:
-                            raise(NotImplementedError(vref.shape))
-                        fds.sync()
-#                        import ipdb;ipdb.set_trace()
-#            for vref,v in iter_variable_values(ret[1],fds):
-#                if len(vref.shape) == 3:
-#                    vref[:,row[0]:row[1],col[0]:col[1]] = v
-#                elif len(vref.shape) == 4:
-#                    vref[:,:,row[0]:row[1],col[0]:col[1]] = v
-#                else:
-#                    raise(NotImplementedError(vref.shape))
-#                fds.sync()
-            if verbose:
-                progress.progress(int((float(ctr)/lschema)*100))
-                
-        fds.close()
+        
+        ## the worker state is set before the pool is created so forked processes
+        ## inherit it.
+        _init_tile_worker_(dataset,calc,calc_grouping)
+        if serial or nprocs <= 1 or lschema <= 1:
+            pool = None
+            itr = imap(_compute_tile_,schema.itervalues())
+        else:
+            pool = Pool(processes=min(nprocs,lschema))
+            ## the writer does not care about tile order
+            itr = pool.imap_unordered(_compute_tile_,schema.itervalues())
+            
+        try:
+            for ctr,(indices,values) in enumerate(itr,start=1):
+                _write_tile_(fds,indices,values,fill_time=fill_time)
+                if verbose:
+                    progress.progress(int((float(ctr)/lschema)*100))
+        except:
+            if pool is not None:
+                pool.terminate()
+            raise
+        else:
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.join()
+            _init_tile_worker_(None,None,None)
+            fds.close()
     finally:
         ocgis.env.OPTIMIZE_FOR_CALC = orig_oc
     if verbose:
@@ -77,16 +106,185 @@ def compute(dataset,calc,calc_grouping,tile_dimension,verbose=False,prefix=None)
         print('complete.')
     return(fill_file)
 
-#def iter_variable_values(coll,fds):
-#    if type(coll) == CalcCollection:
-#        for variable in coll.variables.iterkeys():
-#            ref = coll.calc[variable]
-#            for k,v in ref.iteritems():
-#                vref = fds.variables[k]
-#                yield(vref,v)
-#    elif type(coll) == MultivariateCalcCollection:
-#        for calc_name,calc_value in coll.calc.iteritems():
-#            vref = fds.variables[calc_name]
-#            yield(vref,calc_value)
-#    else:
-#        raise(NotImplementedError(type(coll)))
+
+def get_tiling(dataset,field,calc,calc_grouping,tile_dimension=None):
+    '''
+    Derive the tiling for a computation from :attr:`ocgis.env.MEMORY_LIMIT`. The
+    working memory of a tile is estimated from the field's shape, the data types
+    of the request datasets, and the number of calculations.
+    
+    The time axis is only divided if every calculation group is contiguous in
+    time (i.e. "year" is part of a date part grouping). Time blocks always
+    contain whole years so no group is split between blocks.
+    
+    :type dataset: RequestDatasetCollection
+    :param field: The field of the first request dataset.
+    :type field: :class:`ocgis.interface.base.field.Field`
+    :param tile_dimension: If provided, this tile dimension is used and only the
+     time blocks are derived.
+    :type tile_dimension: int
+    :returns: A tuple with the first element the tile dimension and the second
+     element a list of time index ranges (``[start,stop]``) or None if the entire
+     time axis is processed by each tile.
+    :rtype: tuple
+    :raises: ValueError
+    '''
+    if ocgis.env.MEMORY_LIMIT is None:
+        return(tile_dimension,None)
+    
+    nreal,ntime,nlevel,nrow,ncol = field.shape
+    
+    ## the number of elements that fit within the memory limit
+    itemsize = sum([np.dtype(rd._source_metadata['variables'][rd.variable]['dtype']).itemsize for rd in dataset])
+    element_bytes = itemsize*(constants.large_array_working_set_factor + len(calc))
+    nelements = (float(ocgis.env.MEMORY_LIMIT)*1024**2)/element_bytes
+    
+    ## time blocks may only be used if groups do not cross years
+    if all([isinstance(g,basestring) for g in calc_grouping]) and 'year' in calc_grouping:
+        years = field.temporal.value_date_parts[:,0]
+        year_bounds = np.concatenate(([0],np.nonzero(np.diff(years))[0]+1,[ntime]))
+    else:
+        year_bounds = None
+        
+    if year_bounds is None:
+        if tile_dimension is None:
+            tile_dimension = int(np.sqrt(nelements/(nreal*ntime*nlevel)))
+            if tile_dimension < 1:
+                msg = 'The memory limit ({0} MB) is too small to hold the time series of a single grid cell.'
+                raise(ValueError(msg.format(ocgis.env.MEMORY_LIMIT)))
+        time_blocks = None
+    else:
+        ## size the tiles to hold at least the longest year
+        if tile_dimension is None:
+            max_year = np.diff(year_bounds).max()
+            tile_dimension = int(np.sqrt(nelements/(nreal*max_year*nlevel)))
+            if tile_dimension < 1:
+                msg = 'The memory limit ({0} MB) is too small to hold a year of a single grid cell.'
+                raise(ValueError(msg.format(ocgis.env.MEMORY_LIMIT)))
+        tile_dimension = min(tile_dimension,max(nrow,ncol))
+        ## fill each time block with as many years as fit
+        max_steps = nelements/(nreal*nlevel*min(tile_dimension,nrow)*min(tile_dimension,ncol))
+        time_blocks = []
+        start = 0
+        for idx in range(1,len(year_bounds)):
+            if year_bounds[idx]-year_bounds[start] > max_steps and idx-1 > start:
+                time_blocks.append([int(year_bounds[start]),int(year_bounds[idx-1])])
+                start = idx-1
+        time_blocks.append([int(year_bounds[start]),int(year_bounds[-1])])
+        if len(time_blocks) == 1:
+            time_blocks = None
+            
+    tile_dimension = min(tile_dimension,max(nrow,ncol))
+    
+    return(tile_dimension,time_blocks)
+
+
+def _get_time_blocked_schema_(schema,time_blocks):
+    ret = {}
+    tile_id = 0
+    for time_block in time_blocks:
+        for indices in schema.itervalues():
+            ret[tile_id] = {'row':indices['row'],'col':indices['col'],'time':time_block}
+            tile_id += 1
+    return(ret)
+
+
+## operations arguments shared with the tile workers
+_TILE_WORKER = {}
+
+
+def _init_tile_worker_(dataset,calc,calc_grouping):
+    _TILE_WORKER.update({'dataset':dataset,'calc':calc,'calc_grouping':calc_grouping})
+
+
+def _compute_tile_(indices):
+    '''
+    :param dict indices: A tile schema entry with keys "row" and "col".
+     An optional "time" key limits the time range of the tile.
+    :returns: A tuple with the first element the tile indices and the second a
+     list of tuples of variable alias, computed value, and the value of the
+     output temporal dimension.
+    :rtype: tuple
+    '''
+    row = indices['row']
+    col = indices['col']
+    time = indices.get('time')
+    ## tiles are always subset serially. pool workers are daemonic and may not
+    ## create their own pools. the changed setting is restored for the process.
+    ## tile operations are not planned so the interpreter does not check them
+    ## against the memory limit.
+    orig_serial = ocgis.env.SERIAL
+    ocgis.env.SERIAL = True
+    try:
+        ret = ocgis.OcgOperations(dataset=_TILE_WORKER['dataset'],slice=[None,time,None,row,col],
+                                  calc=_TILE_WORKER['calc'],
+                                  calc_grouping=_TILE_WORKER['calc_grouping']).execute()
+    finally:
+        ocgis.env.SERIAL = orig_serial
+    values = []
+    for field_map in ret.itervalues():
+        for field in field_map.itervalues():
+            for alias,variable in field.variables.iteritems():
+                values.append((alias,variable.value,field.temporal.value))
+    return(indices,values)
+
+
+def _write_tile_(fds,indices,values,fill_time=None):
+    '''
+    :param fds: The open fill dataset.
+    :type fds: :class:`netCDF4.Dataset`
+    :param dict indices: A tile schema entry with keys "row" and "col".
+    :param list values: Tuples as returned by :func:`~ocgis.util.large_array._compute_tile_`.
+    :param fill_time: The time values of the fill dataset. Required for tiles
+     with a time range to locate the tile's groups in the output.
+    :type fill_time: :class:`numpy.ndarray`
+    '''
+    row = slice(*indices['row'])
+    col = slice(*indices['col'])
+    for alias,value,time_value in values:
+        vref = fds.variables[alias]
+        if indices.get('time') is None:
+            time = slice(None)
+        else:
+            ## match the tile's groups to the output groups and order them for
+            ## writing
+            time = _get_fill_time_indices_(fill_time,time_value)
+            order = np.argsort(time)
+            time = time[order]
+            value = value[:,order]
+            if np.all(np.diff(time) == 1):
+                time = slice(time[0],time[-1]+1)
+        if len(vref.shape) == 3:
+            vref[time,row,col] = value[0,:,0,:,:]
+        elif len(vref.shape) == 4:
+            vref[time,:,row,col] = value[0,:,:,:,:]
+        else:
+            raise(NotImplementedError(vref.shape))
+
+
+def _get_fill_time_indices_(fill_time,time_value,tolerance=1e-6):
+    '''
+    :param fill_time: The time values of the fill dataset.
+    :type fill_time: :class:`numpy.ndarray`
+    :param time_value: The time values of a tile's groups.
+    :type time_value: :class:`numpy.ndarray`
+    :param float tolerance: The maximum absolute difference between matching time
+     values.
+    :returns: The index in ``fill_time`` of each value in ``time_value``.
+    :rtype: :class:`numpy.ndarray`
+    :raises: ValueError
+    '''
+    fill_time = np.asarray(fill_time).reshape(-1)
+    time_value = np.asarray(time_value).reshape(-1)
+    order = np.argsort(fill_time,kind='mergesort')
+    sorted_fill = fill_time[order]
+    ## the nearest value is at or just below the insertion position
+    upper = np.clip(np.searchsorted(sorted_fill,time_value),0,sorted_fill.shape[0]-1)
+    lower = np.clip(upper-1,0,sorted_fill.shape[0]-1)
+    use_lower = np.abs(sorted_fill[lower]-time_value) < np.abs(sorted_fill[upper]-time_value)
+    pos = np.where(use_lower,lower,upper)
+    mismatch = np.abs(sorted_fill[pos]-time_value) > tolerance
+    if mismatch.any():
+        msg = 'Tile time values are not in the fill dataset: {0}'
+        raise(ValueError(msg.format(time_value[mismatch].tolist())))
+    return(order[pos])
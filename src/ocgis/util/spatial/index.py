@@ -1,6 +1,96 @@
 import numpy as np
 from shapely.geometry.multipolygon import MultiPolygon
 from ocgis.util.helpers import make_poly
+from ocgis import constants
+
+
+class SpatialIndex(object):
+    '''
+    A bulk-loaded Sort-Tile-Recursive (STR) tree of bounding boxes. Each level of
+    the tree is held in arrays and queried with vectorized box comparisons.
+    
+    >>> index = SpatialIndex(np.array([[0,0,1,1],[2,0,3,1]]))
+    >>> index.query((0.5,0.5,0.75,0.75))
+    array([0])
+    
+    :param bounds: Array of shape (n,4) holding the minimum x, minimum y, maximum x,
+     and maximum y of each item.
+    :type bounds: :class:`numpy.ndarray`
+    :param int capacity: The maximum number of children for each node. If None, use
+     :attr:`ocgis.constants.spatial_index_capacity`.
+    '''
+    
+    def __init__(self,bounds,capacity=None):
+        bounds = np.asarray(bounds,dtype=float).reshape(-1,4)
+        self.capacity = capacity or constants.spatial_index_capacity
+        self.size = bounds.shape[0]
+        self._levels = self._build_(bounds)
+        
+    def query(self,bounds):
+        '''
+        :param bounds: The minimum x, minimum y, maximum x, and maximum y of the
+         query box.
+        :type bounds: sequence
+        :returns: Sorted indices of the items with boxes intersecting or touching
+         the query box.
+        :rtype: :class:`numpy.ndarray`
+        '''
+        ## descend the tree keeping the children of intersecting nodes
+        candidates = np.arange(self._levels[0]['bounds'].shape[0])
+        for level in self._levels:
+            hit = candidates[get_box_intersects(level['bounds'][candidates],bounds)]
+            if 'start' in level:
+                candidates = [np.arange(start,stop) for start,stop in zip(level['start'][hit],level['stop'][hit])]
+                candidates = np.concatenate(candidates) if len(candidates) > 0 else hit
+        ret = np.sort(self._levels[-1]['ids'][hit])
+        return(ret)
+    
+    def _build_(self,bounds):
+        ## the leaf level holds the items in tree order
+        order = self._get_str_order_(bounds)
+        levels = [{'bounds':bounds[order],'ids':order}]
+        ## group consecutive nodes into parents until the top level fits in a node
+        while levels[-1]['bounds'].shape[0] > self.capacity:
+            children = levels[-1]['bounds']
+            starts = np.arange(0,children.shape[0],self.capacity)
+            stops = np.append(starts[1:],children.shape[0])
+            parents = np.empty((starts.shape[0],4),dtype=float)
+            for idx,func in zip(range(4),[np.minimum,np.minimum,np.maximum,np.maximum]):
+                parents[:,idx] = func.reduceat(children[:,idx],starts)
+            order = self._get_str_order_(parents)
+            levels.append({'bounds':parents[order],'start':starts[order],'stop':stops[order]})
+        levels.reverse()
+        return(levels)
+    
+    def _get_str_order_(self,bounds):
+        ## sort by x into vertical slices then by y within each slice
+        n = bounds.shape[0]
+        if n == 0:
+            return(np.arange(0))
+        cx = (bounds[:,0]+bounds[:,2])/2.0
+        cy = (bounds[:,1]+bounds[:,3])/2.0
+        nnodes = int(np.ceil(float(n)/self.capacity))
+        nslices = int(np.ceil(np.sqrt(nnodes)))
+        rank = np.empty(n,dtype=int)
+        rank[np.argsort(cx,kind='mergesort')] = np.arange(n)
+        slice_id = rank//(nslices*self.capacity)
+        return(np.lexsort((cy,slice_id)))
+
+
+def get_box_intersects(boxes,bounds):
+    '''
+    :param boxes: Array of shape (n,4) holding box bounds.
+    :type boxes: :class:`numpy.ndarray`
+    :param bounds: The query box bounds.
+    :type bounds: sequence
+    :returns: Boolean array indicating boxes intersecting or touching the query box.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    minx,miny,maxx,maxy = bounds
+    ret = np.logical_and(boxes[:,0] <= maxx,boxes[:,2] >= minx)
+    ret = np.logical_and(ret,boxes[:,1] <= maxy)
+    ret = np.logical_and(ret,boxes[:,3] >= miny)
+    return(ret)
 
     
 def shapely_grid(dim,rtup,ctup,target=None):
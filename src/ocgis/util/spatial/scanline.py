@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def get_rectilinear_intersects(row_bounds,col_bounds,polygon):
+    '''
+    Classify the cells of a rectilinear grid against a polygon using its edges.
+    Cells touched by the polygon boundary are ambiguous and require an exact test.
+    The remaining cells are entirely inside or outside the polygon and are
+    classified by the even-odd rule at their centers.
+
+    >>> inside,boundary = get_rectilinear_intersects(row_bounds,col_bounds,polygon)
+
+    :param row_bounds: Array of shape (nrow,2) holding the y bounds of each row.
+     Rows with zero height (i.e. points) are allowed.
+    :type row_bounds: :class:`numpy.ndarray`
+    :param col_bounds: Array of shape (ncol,2) holding the x bounds of each column.
+    :type col_bounds: :class:`numpy.ndarray`
+    :param polygon: The selection geometry.
+    :type polygon: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    :returns: Two boolean arrays of shape (nrow,ncol). The first is True for cells
+     inside the polygon and not touched by its boundary. The second is True for
+     cells touched by the boundary.
+    :rtype: tuple
+    :raises: ValueError
+    '''
+    row_bounds = np.asarray(row_bounds,dtype=float)
+    col_bounds = np.asarray(col_bounds,dtype=float)
+
+    ## order the rows and columns by their bounds. lower and upper bounds must
+    ## increase together.
+    bounds = []
+    for b in [row_bounds,col_bounds]:
+        bmin,bmax = b.min(axis=1),b.max(axis=1)
+        order = np.argsort(bmin,kind='mergesort')
+        bmin,bmax = bmin[order],bmax[order]
+        if np.any(np.diff(bmax) < 0):
+            raise(ValueError('Bounds are not monotonic.'))
+        bounds.append((order,bmin,bmax))
+    (rorder,rmin,rmax),(corder,cmin,cmax) = bounds
+
+    segments = get_segments(polygon)
+    boundary = get_boundary_cells(segments,rmin,rmax,cmin,cmax)
+    inside = get_inside_centers(segments,(rmin+rmax)/2.0,(cmin+cmax)/2.0)
+    inside = np.logical_and(inside,np.invert(boundary))
+
+    ## return to the grid ordering
+    ret = []
+    for arr in [inside,boundary]:
+        fill = np.empty_like(arr)
+        fill[np.ix_(rorder,corder)] = arr
+        ret.append(fill)
+    return(tuple(ret))
+
+
+def get_boundary_cells(segments,rmin,rmax,cmin,cmax):
+    '''
+    :param segments: Array of shape (n,4) holding the start x, start y, end x, and
+     end y of each polygon edge.
+    :type segments: :class:`numpy.ndarray`
+    :param rmin: Sorted lower row bounds. ``rmax``, ``cmin``, and ``cmax`` are the
+     corresponding upper row bounds and column bounds.
+    :type rmin: :class:`numpy.ndarray`
+    :returns: Boolean array of shape (nrow,ncol) that is True for cells with an edge
+     intersecting or touching the cell.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    x0,y0,x1,y1 = segments.T
+    ## pad the edge extents so floating point error cannot exclude a touched cell
+    tol = np.finfo(float).eps*1e4*max(1.0,np.abs(segments).max())
+    ylo = np.minimum(y0,y1)-tol
+    yhi = np.maximum(y0,y1)+tol
+
+    ## expand each edge to the rows it crosses
+    start = np.searchsorted(rmax,ylo,side='left')
+    stop = np.searchsorted(rmin,yhi,side='right')
+    seg,row = _expand_(start,stop)
+
+    ## the x extent of each edge within each row band
+    sx0,sy0,sx1,sy1 = x0[seg],y0[seg],x1[seg],y1[seg]
+    dy = sy1-sy0
+    horizontal = dy == 0
+    dy[horizontal] = 1.0
+    ya = np.clip(np.maximum(ylo[seg],rmin[row]),np.minimum(sy0,sy1),np.maximum(sy0,sy1))
+    yb = np.clip(np.minimum(yhi[seg],rmax[row]),np.minimum(sy0,sy1),np.maximum(sy0,sy1))
+    xa = sx0+(ya-sy0)*(sx1-sx0)/dy
+    xb = sx0+(yb-sy0)*(sx1-sx0)/dy
+    xlo = np.where(horizontal,np.minimum(sx0,sx1),np.minimum(xa,xb))-tol
+    xhi = np.where(horizontal,np.maximum(sx0,sx1),np.maximum(xa,xb))+tol
+
+    ## expand each edge portion to the columns it crosses
+    start = np.searchsorted(cmax,xlo,side='left')
+    stop = np.searchsorted(cmin,xhi,side='right')
+    idx,col = _expand_(start,stop)
+
+    ret = np.zeros((rmin.shape[0],cmin.shape[0]),dtype=bool)
+    ret[row[idx],col] = True
+    return(ret)
+
+
+def get_inside_centers(segments,ycenters,xcenters):
+    '''
+    :param segments: See :func:`~ocgis.util.spatial.scanline.get_boundary_cells`.
+    :param ycenters: The y coordinate of each row center.
+    :type ycenters: :class:`numpy.ndarray`
+    :param xcenters: The x coordinate of each column center.
+    :type xcenters: :class:`numpy.ndarray`
+    :returns: Boolean array of shape (nrow,ncol) that is True for centers inside the
+     polygon by the even-odd rule.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    x0,y0,x1,y1 = segments.T
+    ret = np.zeros((ycenters.shape[0],xcenters.shape[0]),dtype=bool)
+    for ii,yc in enumerate(ycenters.flat):
+        ## edges crossing the scanline with each vertex counted once
+        crosses = (y0 <= yc) != (y1 <= yc)
+        if not crosses.any():
+            continue
+        cx0,cy0,cx1,cy1 = x0[crosses],y0[crosses],x1[crosses],y1[crosses]
+        xs = np.sort(cx0+(yc-cy0)*(cx1-cx0)/(cy1-cy0))
+        ## centers with an odd number of crossings to the left are inside
+        ret[ii,:] = np.searchsorted(xs,xcenters,side='left')%2 == 1
+    return(ret)
+
+
+def get_segments(polygon):
+    '''
+    :param polygon: The target geometry.
+    :type polygon: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    :returns: Array of shape (n,4) holding the start x, start y, end x, and end y of
+     each edge of all exterior and interior rings.
+    :rtype: :class:`numpy.ndarray`
+    '''
+    try:
+        parts = polygon.geoms
+    except AttributeError:
+        parts = [polygon]
+    ret = []
+    for part in parts:
+        for ring in [part.exterior]+list(part.interiors):
+            coords = np.array(ring.coords)[:,0:2]
+            ret.append(np.hstack((coords[:-1],coords[1:])))
+    return(np.vstack(ret))
+
+
+def _expand_(start,stop):
+    ## return the source position and each index in the half-open ranges
+    counts = np.maximum(stop-start,0)
+    src = np.repeat(np.arange(start.shape[0]),counts)
+    offsets = np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts,counts)
+    return(src,start[src]+offsets)